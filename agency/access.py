@@ -0,0 +1,150 @@
+# access.py
+import threading
+import time
+from collections import OrderedDict
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+
+class AllAgencies:
+    """Access of an admin: every agency, present and future."""
+
+    def __contains__(self, agency_id):
+        return True
+
+    def __and__(self, agency_ids):
+        return frozenset(agency_ids)
+
+    __rand__ = __and__
+
+    def __repr__(self):
+        return "ALL_AGENCIES"
+
+
+ALL_AGENCIES = AllAgencies()
+
+
+class AccessMap:
+    """
+    Which agencies each user may act on, cached per process as a frozenset
+    of agency ids per user id: every agency for admins, the StaffAgency
+    assignments for staff, the agencies whose user_id is theirs for agents,
+    nothing otherwise. Entries are dropped by the receivers below when the
+    rows behind them change in this process, and expire after
+    ACCESS_MAP_TTL seconds so changes made by other workers show up within
+    that delay. At most ACCESS_MAP_MAX_USERS users are kept. Every
+    invalidation bumps a generation counter, and a load is only cached if
+    no invalidation happened while it ran, so it cannot store rows read
+    before the change it missed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generation = 0
+
+    def _settings(self):
+        return (
+            getattr(settings, "ACCESS_MAP_TTL", 60),
+            getattr(settings, "ACCESS_MAP_MAX_USERS", 10000),
+        )
+
+    def _load(self, user_id):
+        Account = apps.get_model("authentication", "Account")
+        User = apps.get_model("authentication", "User")
+        role = User.objects.filter(pk=user_id).values_list("account__account_role", flat=True).first()
+        if role == Account.ADMIN:
+            return ALL_AGENCIES
+        if role == Account.STAFF:
+            StaffAgency = apps.get_model("agency", "StaffAgency")
+            return frozenset(StaffAgency.objects.filter(staff_id=user_id).values_list("agency_id", flat=True))
+        if role == Account.AGENT:
+            Agency = apps.get_model("agency", "Agency")
+            return frozenset(Agency.objects.filter(user_id=user_id).values_list("agency_id", flat=True))
+        return frozenset()
+
+    def agency_ids(self, user_id):
+        """frozenset of the agency ids `user_id` may act on, or ALL_AGENCIES."""
+        ttl, max_users = self._settings()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[1] < ttl:
+                self._entries.move_to_end(user_id)
+                return entry[0]
+            generation = self._generation
+        agency_ids = self._load(user_id)
+        with self._lock:
+            if generation != self._generation:
+                return agency_ids
+            self._entries[user_id] = (agency_ids, now)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > max_users:
+                self._entries.popitem(last=False)
+        return agency_ids
+
+    def can_access(self, user_id, agency_id):
+        return agency_id in self.agency_ids(user_id)
+
+    def allowed(self, user_id, agency_ids):
+        """The subset of `agency_ids` the user may act on."""
+        return self.agency_ids(user_id) & frozenset(agency_ids)
+
+    def restrict(self, user_id, queryset, field="agency_id"):
+        """Filter a queryset to the rows whose `field` is an agency the user may act on."""
+        agency_ids = self.agency_ids(user_id)
+        if agency_ids is ALL_AGENCIES:
+            return queryset
+        return queryset.filter(**{f"{field}__in": agency_ids})
+
+    def invalidate(self, user_ids=None):
+        """Drop the given users (everyone by default); their next check reloads them."""
+        with self._lock:
+            self._generation += 1
+            if user_ids is None:
+                self._entries.clear()
+                return
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+
+access_map = AccessMap()
+
+
+def _invalidate_on_commit(user_ids, using):
+    # Dropped only once the change is visible, so no concurrent reload caches the old rows.
+    transaction.on_commit(lambda: access_map.invalidate(user_ids), using=using)
+
+
+def _invalidate_account(sender, instance, using, **kwargs):
+    # A role change affects every user of the account.
+    User = apps.get_model("authentication", "User")
+    user_ids = list(User.objects.using(using).filter(account_id=instance.pk).values_list("pk", flat=True))
+    _invalidate_on_commit(user_ids, using)
+
+
+def _invalidate_user(sender, instance, using, **kwargs):
+    _invalidate_on_commit([instance.pk], using)
+
+
+def _invalidate_staff_agency(sender, instance, using, **kwargs):
+    _invalidate_on_commit([instance.staff_id], using)
+
+
+def _invalidate_agency(sender, instance, using, **kwargs):
+    user_ids = {instance.user_id, getattr(instance, "_loaded_user_id", None)} - {None}
+    instance._loaded_user_id = instance.user_id
+    if user_ids:
+        _invalidate_on_commit(user_ids, using)
+
+
+def connect_signals():
+    """Connect the invalidation receivers (called from AgencyConfig.ready)."""
+    for signal in (post_save, post_delete):
+        signal.connect(_invalidate_account, sender="authentication.Account", dispatch_uid="access_map_account")
+        signal.connect(_invalidate_user, sender="authentication.User", dispatch_uid="access_map_user")
+        signal.connect(_invalidate_staff_agency, sender="agency.StaffAgency", dispatch_uid="access_map_staff_agency")
+        signal.connect(_invalidate_agency, sender="agency.Agency", dispatch_uid="access_map_agency")
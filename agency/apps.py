@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class AgencyConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "agency"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .access import connect_signals
+        connect_signals()
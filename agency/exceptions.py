@@ -0,0 +1,18 @@
+# exceptions.py
+
+
+class DebtPostingError(ValueError):
+    def __init__(self, agency_id, amount, message):
+        self.agency_id = agency_id
+        self.amount = amount
+        super().__init__(message)
+
+
+class DebtLimitExceeded(DebtPostingError):
+    def __init__(self, agency_id, amount):
+        super().__init__(agency_id, amount, "Vượt quá giới hạn nợ cho phép của đại lý!")
+
+
+class PaymentExceedsDebt(DebtPostingError):
+    def __init__(self, agency_id, amount):
+        super().__init__(agency_id, amount, "Số tiền thu vượt quá số nợ của đại lý!")
@@ -0,0 +1,25 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from agency.models import DebtSnapshot
+
+
+class Command(BaseCommand):
+    help = "Write every agency's debt balance at a period end (run after each month closes)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="Period end (YYYY-MM-DD), defaults to the last day of the previous month.")
+
+    def handle(self, *args, **options):
+        day = None
+        if options["date"]:
+            try:
+                day = date.fromisoformat(options["date"])
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['date']}")
+        try:
+            written = DebtSnapshot.objects.take(day)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} debt snapshot(s)."))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from agency.models import DebtRollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold pending debt rollup deltas into one row per district/agency type (schedule this, e.g. hourly), "
+        "or rebuild them from scratch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true", help="Recompute the rollups from the agency table.")
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            rows = DebtRollup.objects.rebuild()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} debt rollup row(s)."))
+        else:
+            rows = DebtRollup.objects.compact()
+            self.stdout.write(self.style.SUCCESS(f"Compacted debt rollups into {rows} row(s)."))
@@ -1,10 +1,469 @@
 # managers.py
-from django.db import models
-from django.db.models import F
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.db import connections, models, transaction
+from django.db.models import Case, Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .access import access_map
+from .exceptions import DebtLimitExceeded, PaymentExceedsDebt
+
+logger = logging.getLogger(__name__)
+
 
 class AgencyQuerySet(models.QuerySet):
     def in_debt(self):
         return self.filter(debt_amount__gt=0)
 
     def over_limit(self):
-        return self.filter(debt_amount__gt=F("agency_type__max_debt"))
\ No newline at end of file
+        return self.filter(debt_amount__gt=F("agency_type__max_debt"))
+
+
+class AgencyManager(models.Manager.from_queryset(AgencyQuerySet)):
+    """
+    The only place agency debt is changed. Issues post positive amounts,
+    payments negative ones; both go through post_debt (one event) or
+    post_debts (a batch), so every event updates the debt exactly once.
+    """
+
+    def post_debt(self, agency_id, amount):
+        """
+        Add `amount` to the agency's debt in a single conditional UPDATE and
+        return the new balance. Increases that would exceed the agency type's
+        max_debt raise DebtLimitExceeded, decreases below zero raise
+        PaymentExceedsDebt. The row lock is held for this one statement only.
+        """
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        agency_table = quote(self.model._meta.db_table)
+        type_table = quote(self.model._meta.get_field("agency_type").related_model._meta.db_table)
+        # The sign picks the check here rather than in SQL, where SQLite would compare the amount as text.
+        if amount <= 0:
+            limit = "debt_amount + %s >= 0"
+        else:
+            limit = (
+                f"debt_amount + %s <= (SELECT t.max_debt FROM {type_table} t "
+                f"WHERE t.agency_type_id = {agency_table}.agency_type_id)"
+            )
+        sql = (
+            f"UPDATE {agency_table} SET debt_amount = debt_amount + %s "
+            f"WHERE agency_id = %s AND {limit} RETURNING debt_amount, district_id, agency_type_id"
+        )
+        with transaction.atomic(using=self.db):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [amount, agency_id, amount])
+                row = cursor.fetchone()
+            if row is None:
+                if not self.filter(pk=agency_id).exists():
+                    raise self.model.DoesNotExist(f"Agency {agency_id} does not exist.")
+                if amount <= 0:
+                    raise PaymentExceedsDebt(agency_id, amount)
+                raise DebtLimitExceeded(agency_id, amount)
+            new_debt, district_id, agency_type_id = row
+            self._rollups().record([
+                ((district_id, agency_type_id, new_debt - amount), (district_id, agency_type_id, new_debt)),
+            ])
+        return new_debt
+
+    def lock_debts(self, agency_ids):
+        """
+        Lock the agencies with a single SELECT ... FOR UPDATE ordered by
+        agency_id and return {agency_id: (debt_amount, max_debt, district_id,
+        agency_type_id)}. Must be called inside a transaction.
+        """
+        rows = (
+            self.select_for_update(of=("self",)).filter(pk__in=agency_ids).order_by("agency_id")
+            .values_list("agency_id", "debt_amount", "agency_type__max_debt", "district_id", "agency_type_id")
+        )
+        return {agency_id: tuple(row) for agency_id, *row in rows}
+
+    def post_debts(self, amounts, locked=None):
+        """
+        Apply {agency_id: amount} in one transaction: lock all agencies with
+        lock_debts (unless the caller passes the rows it already locked in the
+        same transaction as `locked`), check every limit, then write all
+        balances with one UPDATE. Either every amount is posted or none is.
+        Returns the new balances and the batch timings.
+        """
+        amounts = {agency_id: amount for agency_id, amount in amounts.items() if amount}
+        started = time.perf_counter()
+        with transaction.atomic(using=self.db):
+            if locked is None:
+                locked = self.lock_debts(amounts)
+            balances = {}
+            changes = []
+            for agency_id in sorted(set(amounts) & set(locked)):
+                debt_amount, max_debt, district_id, agency_type_id = locked[agency_id]
+                amount = amounts[agency_id]
+                new_debt = debt_amount + amount
+                if amount > 0 and new_debt > max_debt:
+                    raise DebtLimitExceeded(agency_id, amount)
+                if amount < 0 and new_debt < 0:
+                    raise PaymentExceedsDebt(agency_id, amount)
+                balances[agency_id] = new_debt
+                changes.append(((district_id, agency_type_id, debt_amount), (district_id, agency_type_id, new_debt)))
+            missing = sorted(set(amounts) - set(balances))
+            if missing:
+                raise self.model.DoesNotExist(f"Agencies {missing} do not exist.")
+            locked_at = time.perf_counter()
+
+            if amounts:
+                delta = Case(
+                    *[When(pk=agency_id, then=Value(amount)) for agency_id, amount in amounts.items()],
+                    output_field=DecimalField(max_digits=15, decimal_places=2),
+                )
+                self.filter(pk__in=amounts).update(debt_amount=F("debt_amount") + delta)
+                self._rollups().record(changes)
+            finished = time.perf_counter()
+
+        timings = {"lock": locked_at - started, "update": finished - locked_at, "total": finished - started}
+        logger.info("Posted debt for %d agencies in %.3fs (lock %.3fs, update %.3fs)",
+                    len(amounts), timings["total"], timings["lock"], timings["update"])
+        return {"balances": balances, "timings": timings}
+
+    def _rollups(self):
+        return apps.get_model("agency", "DebtRollup").objects.db_manager(self.db)
+
+
+class DebtRollupManager(models.Manager):
+    """
+    Debt rollups per district and agency type, kept as append-only delta rows
+    so that posting debt never waits on a shared summary row. totals() sums
+    the rows of a scope; compact() folds them back to one row per key.
+    totals() reads every row written since the last compact(), so run
+    `manage.py refresh_debt_rollups` periodically (hourly from cron, say).
+    """
+
+    def record(self, changes):
+        """
+        Append the rollup deltas for [(old_state, new_state), ...] where a
+        state is (district_id, agency_type_id, debt_amount) or None for an
+        agency that did not exist before / does not exist any more.
+        """
+        deltas = defaultdict(lambda: [0, 0, Decimal(0)])
+        for old_state, new_state in changes:
+            for state, sign in ((old_state, -1), (new_state, 1)):
+                if state is None:
+                    continue
+                district_id, agency_type_id, debt_amount = state
+                for key in ((self.model.DISTRICT, district_id), (self.model.AGENCY_TYPE, agency_type_id)):
+                    deltas[key][0] += sign
+                    deltas[key][1] += sign * (debt_amount > 0)
+                    deltas[key][2] += sign * debt_amount
+        now = timezone.now()
+        return self.bulk_create([
+            self.model(scope=scope, scope_id=scope_id, agency_count=count, debtor_count=debtors,
+                       total_debt=debt, created_at=now)
+            for (scope, scope_id), (count, debtors, debt) in deltas.items()
+            if count or debtors or debt
+        ])
+
+    def totals(self, scope):
+        return list(
+            self.filter(scope=scope).order_by("scope_id").values("scope_id").annotate(
+                agency_count=Sum("agency_count"),
+                debtor_count=Sum("debtor_count"),
+                total_debt=Sum("total_debt"),
+            )
+        )
+
+    def compact(self):
+        """Fold every delta row into one row per (scope, scope_id) in a single statement."""
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        sql = (
+            f"WITH folded AS (DELETE FROM {table} RETURNING scope, scope_id, agency_count, debtor_count, total_debt) "
+            f"INSERT INTO {table} (scope, scope_id, agency_count, debtor_count, total_debt, created_at) "
+            f"SELECT scope, scope_id, SUM(agency_count), SUM(debtor_count), SUM(total_debt), %s "
+            f"FROM folded GROUP BY scope, scope_id"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [timezone.now()])
+            return cursor.rowcount
+
+    def rebuild(self):
+        """Recompute all rollups from the agency table."""
+        Agency = apps.get_model("agency", "Agency")
+        connection = connections[self.db]
+        now = timezone.now()
+        rows = []
+        with transaction.atomic(using=self.db):
+            # Hold back concurrent postings so none of their deltas is lost or counted twice.
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LOCK TABLE {connection.ops.quote_name(self.model._meta.db_table)} IN EXCLUSIVE MODE")
+            for scope, field in ((self.model.DISTRICT, "district_id"), (self.model.AGENCY_TYPE, "agency_type_id")):
+                grouped = (
+                    Agency.objects.using(self.db).order_by().values(field).annotate(
+                        agency_count=Count("pk"),
+                        debtor_count=Count("pk", filter=Q(debt_amount__gt=0)),
+                        total_debt=Sum("debt_amount"),
+                    )
+                )
+                rows.extend(
+                    self.model(scope=scope, scope_id=row[field], agency_count=row["agency_count"],
+                               debtor_count=row["debtor_count"], total_debt=row["total_debt"], created_at=now)
+                    for row in grouped
+                )
+            self.all().delete()
+            self.bulk_create(rows)
+        return len(rows)
+
+
+class StaffAgencyManager(models.Manager):
+    """
+    Bulk staff-to-agency assignment. Each operation reads the current rows it
+    touches once, diffs them against the wanted pairs, then inserts the new
+    pairs with one bulk_create(ignore_conflicts=True), leaving concurrent
+    duplicates to the unique_staff_agency constraint, and removes the old
+    ones with one delete, in a single transaction. With dry_run nothing is
+    written and the summary lists what would change.
+    """
+
+    def _current(self, staff_ids=None, agency_ids=None):
+        queryset = self.order_by()
+        if staff_ids is not None:
+            queryset = queryset.filter(staff_id__in=staff_ids)
+        if agency_ids is not None:
+            queryset = queryset.filter(agency_id__in=agency_ids)
+        rows = queryset.values_list("pk", "staff_id", "agency_id")
+        return {(staff_id, agency_id): pk for pk, staff_id, agency_id in rows}
+
+    def _validate(self, pairs):
+        Account = apps.get_model("authentication", "Account")
+        User = apps.get_model("authentication", "User")
+        Agency = apps.get_model("agency", "Agency")
+        staff_ids = {staff_id for staff_id, _ in pairs}
+        agency_ids = {agency_id for _, agency_id in pairs}
+        not_staff = staff_ids - set(
+            User.objects.using(self.db).filter(pk__in=staff_ids, account__account_role=Account.STAFF)
+            .values_list("pk", flat=True)
+        )
+        if not_staff:
+            raise ValidationError(f"Không phải nhân viên: {sorted(not_staff)}")
+        missing = agency_ids - set(Agency.objects.using(self.db).filter(pk__in=agency_ids).values_list("pk", flat=True))
+        if missing:
+            raise ValidationError(f"Đại lý không tồn tại: {sorted(missing)}")
+
+    def _apply(self, to_add, to_remove, current, dry_run):
+        to_add, to_remove = sorted(to_add), sorted(to_remove)
+        summary = {
+            "added": len(to_add), "removed": len(to_remove),
+            "to_add": to_add, "to_remove": to_remove, "dry_run": dry_run,
+        }
+        if to_add:
+            self._validate(to_add)
+        if dry_run or not (to_add or to_remove):
+            return summary
+        with transaction.atomic(using=self.db):
+            if to_remove:
+                self.filter(pk__in=[current[pair] for pair in to_remove]).delete()
+            if to_add:
+                self.bulk_create(
+                    [self.model(staff_id=staff_id, agency_id=agency_id) for staff_id, agency_id in to_add],
+                    ignore_conflicts=True, batch_size=1000,
+                )
+            # bulk_create sends no signals, so the access map is told here.
+            staff_ids = {staff_id for staff_id, _ in to_add + to_remove}
+            transaction.on_commit(lambda: access_map.invalidate(staff_ids), using=self.db)
+        return summary
+
+    def assign(self, pairs, dry_run=False):
+        """Add the (staff_id, agency_id) pairs that are not assigned yet."""
+        pairs = {(int(staff_id), int(agency_id)) for staff_id, agency_id in pairs}
+        current = self._current({staff_id for staff_id, _ in pairs}, {agency_id for _, agency_id in pairs})
+        return self._apply(pairs - set(current), (), current, dry_run)
+
+    def unassign(self, pairs, dry_run=False):
+        """Remove the (staff_id, agency_id) pairs that are assigned."""
+        pairs = {(int(staff_id), int(agency_id)) for staff_id, agency_id in pairs}
+        current = self._current({staff_id for staff_id, _ in pairs}, {agency_id for _, agency_id in pairs})
+        return self._apply((), pairs & set(current), current, dry_run)
+
+    def move(self, agency_ids, to_staff_id, from_staff_id=None, dry_run=False):
+        """
+        Assign the agencies to `to_staff_id`, taking them away from
+        `from_staff_id`, or from every other staff member if it is None.
+        """
+        agency_ids = {int(agency_id) for agency_id in agency_ids}
+        to_staff_id = int(to_staff_id)
+        from_staff_id = None if from_staff_id is None else int(from_staff_id)
+        current = self._current(None if from_staff_id is None else {from_staff_id, to_staff_id}, agency_ids)
+        wanted = {(to_staff_id, agency_id) for agency_id in agency_ids}
+        to_remove = {pair for pair in current if pair not in wanted}
+        return self._apply(wanted - set(current), to_remove, current, dry_run)
+
+    def sync(self, pairs, staff_ids=None, dry_run=False):
+        """
+        Make the assignments of `staff_ids` (by default the staff appearing in
+        `pairs`) exactly `pairs`: missing pairs are added, any other
+        assignment of those staff members is removed.
+        """
+        pairs = {(int(staff_id), int(agency_id)) for staff_id, agency_id in pairs}
+        if staff_ids is None:
+            staff_ids = {staff_id for staff_id, _ in pairs}
+        staff_ids = {int(staff_id) for staff_id in staff_ids}
+        outside = sorted(pair for pair in pairs if pair[0] not in staff_ids)
+        if outside:
+            raise ValidationError(f"Phân công ngoài phạm vi nhân viên được đồng bộ: {outside}")
+        current = self._current(staff_ids)
+        return self._apply(pairs - set(current), set(current) - pairs, current, dry_run)
+
+
+# (app, model, date field, amount field, sign on debt, archive doc_type)
+DEBT_DOCUMENTS = (
+    ("inventory", "Issue", "issue_date", "total_amount", 1, "issue"),
+    ("finance", "Payment", "payment_date", "amount_collected", -1, "payment"),
+)
+
+
+class DebtSnapshotManager(models.Manager):
+    """
+    Agency debt at the end of closed periods. A balance on any date starts
+    from the agency's nearest snapshot on or before it and adds the issues
+    minus the payments dated after the snapshot; an agency without one rolls
+    its current debt back by the documents dated after the date. Archived
+    documents are read from their monthly summaries, and only an archived
+    month cut by one of those dates is decompressed.
+    """
+
+    def _net_documents(self, after, until=None):
+        """Issues minus payments of the outer agency dated in (after, until]."""
+        DocumentArchive = apps.get_model("finance", "DocumentArchive")
+        output = DecimalField(max_digits=18, decimal_places=2)
+        net = Value(Decimal(0), output_field=output)
+        for app_label, model_name, date_field, amount_field, sign, doc_type in DEBT_DOCUMENTS:
+            model = apps.get_model(app_label, model_name)
+            sources = (
+                (model.objects.filter(**{f"{date_field}__gt": after}), date_field, amount_field),
+                (DocumentArchive.objects.filter(doc_type=doc_type, last_date__gt=after), "last_date", "total_amount"),
+            )
+            for queryset, field, amount in sources:
+                if until is not None:
+                    queryset = queryset.filter(**{f"{field}__lte": until})
+                total = (
+                    queryset.filter(agency_id=OuterRef("pk")).order_by().values("agency_id")
+                    .annotate(total=Sum(amount)).values("total")
+                )
+                net = net + Coalesce(Subquery(total), Value(Decimal(0)), output_field=output) * sign
+        return net
+
+    def annotate_balance(self, queryset, at, use_snapshots=True):
+        """
+        Annotate an Agency queryset with `balance`, its debt at the end of day
+        `at`, and `snapshot_date`, the snapshot it was built on (if any).
+        Archived months straddling a boundary are not split here; balances()
+        corrects them.
+        """
+        output = DecimalField(max_digits=18, decimal_places=2)
+        rolled_back = F("debt_amount") - self._net_documents(at)
+        if not use_snapshots:
+            return queryset.annotate(snapshot_date=Value(None, output_field=models.DateField()), balance=rolled_back)
+        latest = self.filter(agency=OuterRef("pk"), snapshot_date__lte=at).order_by("-snapshot_date")
+        return queryset.annotate(
+            snapshot_date=Subquery(latest.values("snapshot_date")[:1]),
+            snapshot_debt=Subquery(latest.values("debt_amount")[:1]),
+        ).annotate(
+            balance=Case(
+                When(snapshot_date__isnull=True, then=rolled_back),
+                default=F("snapshot_debt") + self._net_documents(OuterRef("snapshot_date"), at),
+                output_field=output,
+            )
+        )
+
+    def balances(self, queryset, at, fields=(), use_snapshots=True, chunk_size=2000):
+        """Yield (agency_id, balance, *fields) for every agency of `queryset` at the end of day `at`."""
+        rows = self.annotate_balance(queryset, at, use_snapshots).values_list("pk", "snapshot_date", "balance", *fields)
+        batch = []
+        for row in rows.iterator(chunk_size=chunk_size):
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                yield from self._corrected(batch, at)
+                batch = []
+        yield from self._corrected(batch, at)
+
+    def _corrected(self, rows, at):
+        corrections = self._archive_corrections({row[0]: row[1] for row in rows}, at) if rows else {}
+        for agency_id, _snapshot_date, balance, *fields in rows:
+            yield (agency_id, balance + corrections.get(agency_id, 0), *fields)
+
+    def _archive_corrections(self, snapshot_dates, at):
+        """
+        The balance query dates a whole archived month by its last document.
+        For the archive rows whose month straddles the snapshot date or `at`,
+        swap that for the exact sum of their documents inside the window.
+        """
+        DocumentArchive = apps.get_model("finance", "DocumentArchive")
+        signs = {doc_type: sign for *_, sign, doc_type in DEBT_DOCUMENTS}
+        straddling = Q()
+        for day in {at, *filter(None, snapshot_dates.values())}:
+            straddling |= Q(first_date__lte=day, last_date__gt=day)
+        archives = DocumentArchive.objects.using(self.db).filter(
+            straddling, agency_id__in=snapshot_dates, doc_type__in=signs
+        )
+        corrections = defaultdict(Decimal)
+        for archive in archives:
+            after = snapshot_dates[archive.agency_id]
+            documents = archive.documents()
+            if after is None:
+                # Current debt minus everything dated after `at`.
+                counted = archive.total_amount if archive.last_date > at else 0
+                exact = sum(document["amount"] for document in documents if document["date"] > at)
+                sign = -signs[archive.doc_type]
+            else:
+                # Snapshot plus everything dated in (snapshot_date, at].
+                counted = archive.total_amount if after < archive.last_date <= at else 0
+                exact = sum(document["amount"] for document in documents if after < document["date"] <= at)
+                sign = signs[archive.doc_type]
+            corrections[archive.agency_id] += sign * (exact - counted)
+        return corrections
+
+    def debt_as_of(self, agency_ids, at):
+        """
+        {agency_id: debt at the end of day `at`} for the given agencies, from
+        one balance query plus one lookup of archived months cut by the dates.
+        """
+        Agency = apps.get_model("agency", "Agency")
+        queryset = Agency.objects.using(self.db).filter(pk__in=agency_ids).order_by()
+        return {agency_id: balance for agency_id, balance in self.balances(queryset, at)}
+
+    def take(self, day=None, chunk_size=2000):
+        """
+        Write (or overwrite) every agency's debt at the end of `day`, which
+        defaults to the last day of the previous month. The balances are
+        rolled back from the current debts rather than built on older
+        snapshots, so retaking a period also picks up late documents.
+        """
+        Agency = apps.get_model("agency", "Agency")
+        today = timezone.localdate()
+        day = day or today.replace(day=1) - timedelta(days=1)
+        if day >= today:
+            raise ValueError("Chỉ có thể chốt nợ cho ngày đã kết thúc.")
+        now = timezone.now()
+        balances = self.balances(
+            Agency.objects.using(self.db).order_by(), day, use_snapshots=False, chunk_size=chunk_size
+        )
+        written = 0
+        batch = []
+        for agency_id, balance in balances:
+            batch.append(self.model(agency_id=agency_id, snapshot_date=day, debt_amount=balance, created_at=now))
+            if len(batch) >= chunk_size:
+                written += self._write(batch)
+                batch = []
+        if batch:
+            written += self._write(batch)
+        return written
+
+    def _write(self, batch):
+        self.bulk_create(
+            batch, update_conflicts=True,
+            unique_fields=["agency", "snapshot_date"], update_fields=["debt_amount", "created_at"],
+        )
+        return len(batch)
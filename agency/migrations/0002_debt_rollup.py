@@ -0,0 +1,63 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agency", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DebtRollup",
+            fields=[
+                (
+                    "rollup_id",
+                    models.BigAutoField(
+                        db_column="rollup_id", primary_key=True, serialize=False
+                    ),
+                ),
+                (
+                    "scope",
+                    models.CharField(
+                        choices=[
+                            ("district", "District"),
+                            ("agency_type", "Agency type"),
+                        ],
+                        db_column="scope",
+                        max_length=20,
+                    ),
+                ),
+                ("scope_id", models.IntegerField(db_column="scope_id")),
+                (
+                    "agency_count",
+                    models.IntegerField(db_column="agency_count", default=0),
+                ),
+                (
+                    "debtor_count",
+                    models.IntegerField(db_column="debtor_count", default=0),
+                ),
+                (
+                    "total_debt",
+                    models.DecimalField(
+                        db_column="total_debt",
+                        decimal_places=2,
+                        default=0,
+                        max_digits=18,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(db_column="created_at")),
+            ],
+            options={
+                "db_table": "debtrollup",
+                "ordering": ["scope", "scope_id"],
+                "indexes": [
+                    models.Index(
+                        fields=["scope", "scope_id"], name="debtrollup_scope_6b95e1_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agency", "0002_debt_rollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DebtSnapshot",
+            fields=[
+                (
+                    "snapshot_id",
+                    models.BigAutoField(
+                        db_column="snapshot_id", primary_key=True, serialize=False
+                    ),
+                ),
+                ("snapshot_date", models.DateField(db_column="snapshot_date")),
+                (
+                    "debt_amount",
+                    models.DecimalField(
+                        db_column="debt_amount", decimal_places=2, max_digits=15
+                    ),
+                ),
+                ("created_at", models.DateTimeField(db_column="created_at")),
+                (
+                    "agency",
+                    models.ForeignKey(
+                        db_column="agency_id",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="debt_snapshots",
+                        to="agency.agency",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "debtsnapshot",
+                "ordering": ["agency", "-snapshot_date"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("agency", "snapshot_date"),
+                        name="unique_agency_debt_snapshot",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.3 on 2026-10-16 23:14
+
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+
+def seed_debt_rollups(apps, schema_editor):
+    # The rollups only receive deltas from the moment they exist; start them from the agency table.
+    # Written against the historical models so later manager changes cannot break it.
+    alias = schema_editor.connection.alias
+    Agency = apps.get_model("agency", "Agency")
+    DebtRollup = apps.get_model("agency", "DebtRollup")
+    now = timezone.now()
+    rows = []
+    for scope, field in (("district", "district_id"), ("agency_type", "agency_type_id")):
+        grouped = (
+            Agency.objects.using(alias).order_by().values(field).annotate(
+                agency_count=Count("pk"),
+                debtor_count=Count("pk", filter=Q(debt_amount__gt=0)),
+                total_debt=Sum("debt_amount"),
+            )
+        )
+        rows.extend(
+            DebtRollup(scope=scope, scope_id=row[field], agency_count=row["agency_count"],
+                       debtor_count=row["debtor_count"], total_debt=row["total_debt"], created_at=now)
+            for row in grouped
+        )
+    DebtRollup.objects.using(alias).all().delete()
+    DebtRollup.objects.using(alias).bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agency", "0003_debt_snapshot"),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_debt_rollups, migrations.RunPython.noop),
+    ]
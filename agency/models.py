@@ -7,7 +7,7 @@
 # Feel free to rename the models, but don't rename db_table values or field names.
 from django.db import models
 from django.core.exceptions import ValidationError
-from .managers import AgencyQuerySet
+from .managers import AgencyManager, DebtRollupManager, DebtSnapshotManager, StaffAgencyManager
 
 class AgencyType(models.Model):
     agency_type_id = models.AutoField(primary_key=True, db_column="agency_type_id")
@@ -60,7 +60,7 @@ class Agency(models.Model):
     updated_at = models.DateTimeField(null=True, blank=True, db_column="updated_at")
     user_id = models.IntegerField(unique=True, null=True, blank=True, db_column="user_id")
 
-    objects = AgencyQuerySet.as_manager()
+    objects = AgencyManager()
 
     class Meta:
         db_table = "agency"
@@ -70,6 +70,23 @@ class Agency(models.Model):
             models.Index(fields=["district"]),
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_loaded_state()
+        # The access map drops the old owner too when user_id changes, and keeps this up to date after saves.
+        instance._loaded_user_id = instance.__dict__.get("user_id")
+        return instance
+
+    def remember_loaded_state(self):
+        # Used by the rollup signals to post what a save changed.
+        self._loaded_state = self.rollup_state()
+
+    def rollup_state(self):
+        if any(name not in self.__dict__ for name in ("district_id", "agency_type_id", "debt_amount")):
+            return None
+        return (self.district_id, self.agency_type_id, self.debt_amount)
+
     def __str__(self):
         return self.agency_name
 
@@ -82,6 +99,8 @@ class StaffAgency(models.Model):
         related_name="staff_agency"
     )
 
+    objects = StaffAgencyManager()
+
     class Meta:
         db_table = "staffagency"
         constraints = [
@@ -97,3 +116,55 @@ class StaffAgency(models.Model):
             raise ValidationError("Cặp staff–agency này đã tồn tại.")
 
 
+class DebtRollup(models.Model):
+    DISTRICT = 'district'
+    AGENCY_TYPE = 'agency_type'
+    SCOPE_CHOICES = [
+        (DISTRICT, 'District'),
+        (AGENCY_TYPE, 'Agency type'),
+    ]
+
+    rollup_id = models.BigAutoField(primary_key=True, db_column="rollup_id")
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES, db_column="scope")
+    scope_id = models.IntegerField(db_column="scope_id")
+    agency_count = models.IntegerField(default=0, db_column="agency_count")
+    debtor_count = models.IntegerField(default=0, db_column="debtor_count")
+    total_debt = models.DecimalField(max_digits=18, decimal_places=2, default=0, db_column="total_debt")
+    created_at = models.DateTimeField(db_column="created_at")
+
+    objects = DebtRollupManager()
+
+    class Meta:
+        db_table = "debtrollup"
+        ordering = ["scope", "scope_id"]
+        indexes = [
+            models.Index(fields=["scope", "scope_id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.scope_id}: {self.total_debt}"
+
+
+class DebtSnapshot(models.Model):
+    snapshot_id = models.BigAutoField(primary_key=True, db_column="snapshot_id")
+    agency = models.ForeignKey(
+        Agency,
+        on_delete=models.CASCADE,
+        db_column="agency_id",
+        related_name="debt_snapshots"
+    )
+    snapshot_date = models.DateField(db_column="snapshot_date")
+    debt_amount = models.DecimalField(max_digits=15, decimal_places=2, db_column="debt_amount")
+    created_at = models.DateTimeField(db_column="created_at")
+
+    objects = DebtSnapshotManager()
+
+    class Meta:
+        db_table = "debtsnapshot"
+        ordering = ["agency", "-snapshot_date"]
+        constraints = [
+            models.UniqueConstraint(fields=["agency", "snapshot_date"], name="unique_agency_debt_snapshot")
+        ]
+
+    def __str__(self):
+        return f"Debt of agency {self.agency_id} on {self.snapshot_date}: {self.debt_amount}"
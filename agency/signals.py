@@ -1,26 +1,42 @@
 # signals.py
-from django.db import transaction
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from apps.inventory.models import Issue
-from apps.finance.models import Payment
-from .models import Agency
+from inventory.models import Issue
+from finance.models import Payment
+from .models import Agency, DebtRollup
 
 @receiver(post_save, sender=Issue)
 def update_agency_debt_on_issue(sender, instance, created, **kwargs):
     if created:
-        with transaction.atomic():
-            agency = Agency.objects.select_for_update().get(pk=instance.agency_id)
-            new_debt = agency.debt_amount + instance.total_amount
-            if new_debt > agency.agency_type.max_debt:
-                raise ValueError("Vượt quá giới hạn nợ cho phép của đại lý!")
-            agency.debt_amount = new_debt
-            agency.save(update_fields=["debt_amount"])
+        Agency.objects.post_debt(instance.agency_id, instance.total_amount)
+
+@receiver(pre_delete, sender=Issue)
+def release_agency_debt_on_issue_delete(sender, instance, **kwargs):
+    # The details deleted with the issue take their line totals off the debt; this takes the rest.
+    row = (
+        Issue.objects.filter(pk=instance.pk).annotate(lines=Issue.objects.computed_total())
+        .values_list("agency_id", "total_amount", "lines").first()
+    )
+    if row is not None and row[1] != row[2]:
+        Agency.objects.post_debt(row[0], row[2] - row[1])
 
 @receiver(post_save, sender=Payment)
 def update_agency_debt_on_payment(sender, instance, created, **kwargs):
     if created:
-        with transaction.atomic():
-            agency = Agency.objects.select_for_update().get(pk=instance.agency_id)
-            agency.debt_amount = agency.debt_amount - instance.amount_collected
-            agency.save(update_fields=["debt_amount"])
\ No newline at end of file
+        Agency.objects.post_debt(instance.agency_id, -instance.amount_collected)
+
+@receiver(post_save, sender=Agency)
+def update_debt_rollup_on_save(sender, instance, created, **kwargs):
+    old_state = None if created else getattr(instance, "_loaded_state", None)
+    new_state = instance.rollup_state()
+    # Without a known before/after state the change cannot be posted; refresh_debt_rollups --rebuild repairs it.
+    if new_state is not None and (created or old_state is not None) and old_state != new_state:
+        DebtRollup.objects.record([(old_state, new_state)])
+    instance.remember_loaded_state()
+
+@receiver(post_delete, sender=Agency)
+def update_debt_rollup_on_delete(sender, instance, **kwargs):
+    old_state = getattr(instance, "_loaded_state", None) or instance.rollup_state()
+    if old_state is not None:
+        DebtRollup.objects.record([(old_state, None)])
+
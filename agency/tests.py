@@ -1,3 +1,286 @@
+import importlib
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
 from django.test import TestCase
 
-# Create your tests here.
+from authentication.models import Account, User
+from finance.models import Payment
+from inventory.models import Issue, Issuedetail, Item, Unit
+from .access import AccessMap, access_map
+from .exceptions import DebtLimitExceeded, PaymentExceedsDebt
+from .models import Agency, AgencyType, DebtRollup, DebtSnapshot, District, StaffAgency
+
+
+def create_agency(agency_type, district, name="Đại lý A", debt_amount=0, **fields):
+    return Agency.objects.create(
+        agency_name=name, agency_type=agency_type, district=district, phone_number="0900000000",
+        address="1 Lê Lợi", reception_date=date(2025, 1, 1), debt_amount=debt_amount, **fields,
+    )
+
+
+class AgencyDebtPostingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.agency_type = AgencyType.objects.create(type_name="Loại 1", max_debt=Decimal("1000"))
+        cls.district = District.objects.create(district_name="Quận 1", max_agencies=10)
+
+    def setUp(self):
+        self.agency = create_agency(self.agency_type, self.district, debt_amount=Decimal("500"))
+
+    def debt(self):
+        return Agency.objects.get(pk=self.agency.pk).debt_amount
+
+    def test_saved_payment_decreases_debt_once(self):
+        Payment.objects.create(
+            payment_date=date(2025, 2, 1), agency_id=self.agency.pk, user_id=1, amount_collected=Decimal("120")
+        )
+        self.assertEqual(self.debt(), Decimal("380"))
+
+    def test_saved_issue_increases_debt_once(self):
+        Issue.objects.create(issue_date=date(2025, 2, 1), agency_id=self.agency.pk, user_id=1, total_amount=Decimal("70"))
+        self.assertEqual(self.debt(), Decimal("570"))
+
+    def test_post_payments_accepts_a_generator(self):
+        amounts = (Decimal("100"), Decimal("50"))
+        result = Payment.objects.post_payments(
+            Payment(payment_date=date(2025, 2, 1), agency_id=self.agency.pk, user_id=1, amount_collected=amount)
+            for amount in amounts
+        )
+        self.assertEqual(len(result["payments"]), 2)
+        self.assertEqual(Payment.objects.count(), 2)
+        self.assertEqual(self.debt(), Decimal("350"))
+
+    def test_increase_beyond_the_type_limit_is_rejected(self):
+        with self.assertRaises(DebtLimitExceeded):
+            Agency.objects.post_debt(self.agency.pk, Decimal("500.01"))
+        self.assertEqual(self.debt(), Decimal("500"))
+        with self.assertRaises(DebtLimitExceeded):
+            Agency.objects.post_debts({self.agency.pk: Decimal("600")})
+        self.assertEqual(self.debt(), Decimal("500"))
+
+        self.assertEqual(Agency.objects.post_debt(self.agency.pk, Decimal("500")), Decimal("1000"))
+        self.assertEqual(self.debt(), Decimal("1000"))
+
+    def test_decreases_are_allowed_over_the_limit(self):
+        # The limit was lowered after the debt was taken on.
+        AgencyType.objects.filter(pk=self.agency_type.pk).update(max_debt=Decimal("100"))
+        self.assertEqual(Agency.objects.post_debt(self.agency.pk, Decimal("-50")), Decimal("450"))
+        with self.assertRaises(DebtLimitExceeded):
+            Agency.objects.post_debt(self.agency.pk, Decimal("1"))
+        with self.assertRaises(PaymentExceedsDebt):
+            Agency.objects.post_debt(self.agency.pk, Decimal("-450.01"))
+        self.assertEqual(self.debt(), Decimal("450"))
+
+    def test_payment_beyond_debt_is_rejected(self):
+        with self.assertRaises(PaymentExceedsDebt):
+            Payment.objects.post_payments([
+                Payment(payment_date=date(2025, 2, 1), agency_id=self.agency.pk, user_id=1, amount_collected=600)
+            ])
+        self.assertEqual(self.debt(), Decimal("500"))
+        self.assertFalse(Payment.objects.exists())
+
+
+class IssueLineDebtTests(TestCase):
+    """Issues edited line by line (admin, shell) move the agency debt with their total."""
+
+    @classmethod
+    def setUpTestData(cls):
+        agency_type = AgencyType.objects.create(type_name="Loại 1", max_debt=Decimal("1000"))
+        district = District.objects.create(district_name="Quận 1", max_agencies=10)
+        cls.agency = create_agency(agency_type, district)
+        unit = Unit.objects.create(unit_name="Thùng")
+        cls.item = Item.objects.create(item_name="Nước", unit=unit, price=Decimal("10.00"), stock_quantity=100)
+
+    def setUp(self):
+        self.issue = Issue.objects.create(issue_date=date(2025, 3, 1), agency_id=self.agency.pk, user_id=1,
+                                          total_amount=0)
+
+    def debt(self):
+        return Agency.objects.get(pk=self.agency.pk).debt_amount
+
+    def add_line(self, quantity):
+        Issuedetail.objects.create(issue=self.issue, item=self.item, quantity=quantity, unit_price=Decimal("10.00"),
+                                   line_total=Decimal("10.00") * quantity)
+        return Issuedetail.objects.get(issue=self.issue)
+
+    def test_lines_added_one_by_one_post_the_debt(self):
+        self.add_line(4)
+        self.assertEqual(self.debt(), Decimal("40"))
+        self.assertEqual(DebtSnapshot.objects.debt_as_of([self.agency.pk], date(2025, 2, 28)), {self.agency.pk: 0})
+
+    def test_edited_and_deleted_lines_move_the_debt(self):
+        detail = self.add_line(4)
+        detail.quantity, detail.line_total = 6, Decimal("60.00")
+        detail.save()
+        self.assertEqual(self.debt(), Decimal("60"))
+
+        detail.delete()
+        self.assertEqual(self.debt(), 0)
+
+    def test_deleting_an_issue_takes_its_whole_total_off(self):
+        self.add_line(4)
+        header_only = Issue.objects.create(issue_date=date(2025, 3, 2), agency_id=self.agency.pk, user_id=1,
+                                           total_amount=Decimal("25"))
+        self.assertEqual(self.debt(), Decimal("65"))
+
+        Issue.objects.get(pk=self.issue.pk).delete()
+        self.assertEqual(self.debt(), Decimal("25"))
+        header_only.delete()
+        self.assertEqual(self.debt(), 0)
+        self.assertEqual(DebtRollup.objects.totals(DebtRollup.DISTRICT)[0]["total_debt"], 0)
+
+
+class DebtRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.agency_type = AgencyType.objects.create(type_name="Loại 1", max_debt=Decimal("1000"))
+        cls.district = District.objects.create(district_name="Quận 1", max_agencies=10)
+        cls.other_district = District.objects.create(district_name="Quận 2", max_agencies=10)
+
+    def totals(self, scope):
+        return {
+            row["scope_id"]: (row["agency_count"], row["debtor_count"], row["total_debt"])
+            for row in DebtRollup.objects.totals(scope)
+            if row["agency_count"]
+        }
+
+    def test_agency_changes_keep_the_rollups_current(self):
+        first = create_agency(self.agency_type, self.district, debt_amount=Decimal("100"))
+        create_agency(self.agency_type, self.district, name="Đại lý B")
+        Payment.objects.create(payment_date=date(2025, 2, 1), agency_id=first.pk, user_id=1, amount_collected=40)
+        self.assertEqual(self.totals(DebtRollup.DISTRICT), {self.district.pk: (2, 1, Decimal("60"))})
+
+        first = Agency.objects.get(pk=first.pk)
+        first.district = self.other_district
+        first.save()
+        self.assertEqual(self.totals(DebtRollup.DISTRICT), {
+            self.district.pk: (1, 0, Decimal("0")),
+            self.other_district.pk: (1, 1, Decimal("60")),
+        })
+
+        first.delete()
+        self.assertEqual(self.totals(DebtRollup.DISTRICT), {self.district.pk: (1, 0, Decimal("0"))})
+        self.assertEqual(self.totals(DebtRollup.AGENCY_TYPE), {self.agency_type.pk: (1, 0, Decimal("0"))})
+
+    def test_rebuild_matches_the_incremental_rollups(self):
+        create_agency(self.agency_type, self.district, debt_amount=Decimal("100"))
+        create_agency(self.agency_type, self.other_district, name="Đại lý B", debt_amount=Decimal("25"))
+        incremental = self.totals(DebtRollup.DISTRICT), self.totals(DebtRollup.AGENCY_TYPE)
+        DebtRollup.objects.rebuild()
+        self.assertEqual((self.totals(DebtRollup.DISTRICT), self.totals(DebtRollup.AGENCY_TYPE)), incremental)
+
+    def test_seed_migration_starts_from_the_agency_table(self):
+        create_agency(self.agency_type, self.district, debt_amount=Decimal("100"))
+        DebtRollup.objects.all().delete()
+        migration = importlib.import_module("agency.migrations.0004_seed_debt_rollups")
+        # Run against the models as they were when the migration was written.
+        loader = MigrationExecutor(connection).loader
+        state = loader.project_state(("agency", "0004_seed_debt_rollups"), at_end=False)
+        migration.seed_debt_rollups(state.apps, connection.schema_editor())
+        self.assertEqual(self.totals(DebtRollup.DISTRICT), {self.district.pk: (1, 1, Decimal("100"))})
+
+
+class DebtSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        agency_type = AgencyType.objects.create(type_name="Loại 1", max_debt=Decimal("1000"))
+        district = District.objects.create(district_name="Quận 1", max_agencies=10)
+        cls.agency = create_agency(agency_type, district, debt_amount=Decimal("100"))
+        Issue.objects.create(issue_date=date(2025, 2, 5), agency_id=cls.agency.pk, user_id=1, total_amount=Decimal("30"))
+        Payment.objects.create(
+            payment_date=date(2025, 3, 3), agency_id=cls.agency.pk, user_id=1, amount_collected=Decimal("20")
+        )
+        cls.expected = {date(2025, 1, 31): Decimal("100"), date(2025, 2, 28): Decimal("130"),
+                        date(2025, 3, 31): Decimal("110")}
+
+    def balances(self):
+        return {day: DebtSnapshot.objects.debt_as_of([self.agency.pk], day)[self.agency.pk] for day in self.expected}
+
+    def test_balances_roll_back_the_current_debt_without_snapshots(self):
+        self.assertEqual(self.balances(), self.expected)
+
+    def test_balances_build_on_the_nearest_snapshot(self):
+        DebtSnapshot.objects.take(date(2025, 1, 31))
+        DebtSnapshot.objects.take(date(2025, 2, 28))
+        self.assertEqual(
+            dict(DebtSnapshot.objects.filter(agency=self.agency).values_list("snapshot_date", "debt_amount")),
+            {date(2025, 1, 31): Decimal("100"), date(2025, 2, 28): Decimal("130")},
+        )
+        self.assertEqual(self.balances(), self.expected)
+
+        # Later days start from the snapshot, not from the current debt.
+        DebtSnapshot.objects.filter(agency=self.agency, snapshot_date=date(2025, 2, 28)).update(debt_amount=Decimal("0"))
+        self.assertEqual(DebtSnapshot.objects.debt_as_of([self.agency.pk], date(2025, 3, 31)),
+                         {self.agency.pk: Decimal("-20")})
+
+
+class AccessMapTests(TestCase):
+    def test_load_overlapping_an_invalidation_is_not_cached(self):
+        access = AccessMap()
+        loads = iter([frozenset({1}), frozenset({2}), frozenset({3})])
+
+        def load(user_id):
+            agency_ids = next(loads)
+            if agency_ids == {1}:
+                # The assignment changes and commits while the old rows are being read.
+                access.invalidate([user_id])
+            return agency_ids
+
+        with mock.patch.object(access, "_load", side_effect=load):
+            self.assertEqual(access.agency_ids(7), {1})
+            self.assertEqual(access.agency_ids(7), {2})
+            self.assertEqual(access.agency_ids(7), {2})
+
+    def test_reassigned_agency_is_dropped_from_the_previous_agent(self):
+        access_map.invalidate()
+        self.addCleanup(access_map.invalidate)
+        first, second = (
+            User.objects.create(
+                account=Account.objects.create(username=f"dl{i}", password_hash="!", account_role=Account.AGENT),
+                full_name=f"Đại lý {i}",
+            )
+            for i in range(2)
+        )
+        agency_type = AgencyType.objects.create(type_name="Loại 1", max_debt=Decimal("1000"))
+        district = District.objects.create(district_name="Quận 1", max_agencies=10)
+        agency_id = create_agency(agency_type, district, user_id=first.pk).pk
+        agency = Agency.objects.get(pk=agency_id)
+        self.assertTrue(access_map.can_access(first.pk, agency_id))
+        self.assertFalse(access_map.can_access(second.pk, agency_id))
+
+        for owner, previous in ((second, first), (first, second)):
+            with self.subTest(owner=owner.pk), self.captureOnCommitCallbacks(execute=True):
+                agency.user_id = owner.pk
+                agency.save()
+            self.assertTrue(access_map.can_access(owner.pk, agency_id))
+            self.assertFalse(access_map.can_access(previous.pk, agency_id))
+
+
+class StaffAssignmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        agency_type = AgencyType.objects.create(type_name="Loại 1", max_debt=Decimal("1000"))
+        district = District.objects.create(district_name="Quận 1", max_agencies=10)
+        cls.agency = create_agency(agency_type, district)
+        cls.staff = [
+            User.objects.create(
+                account=Account.objects.create(username=f"nv{i}", password_hash="!", account_role=Account.STAFF),
+                full_name=f"Nhân viên {i}",
+            )
+            for i in range(2)
+        ]
+
+    def test_move_accepts_string_staff_ids(self):
+        first, second = self.staff
+        StaffAgency.objects.assign([(first.pk, self.agency.pk)])
+
+        summary = StaffAgency.objects.move([str(self.agency.pk)], str(second.pk), from_staff_id=str(first.pk))
+        self.assertEqual((summary["added"], summary["removed"]), (1, 1))
+        self.assertEqual(list(StaffAgency.objects.values_list("staff_id", flat=True)), [second.pk])
+
+        summary = StaffAgency.objects.move([self.agency.pk], str(second.pk))
+        self.assertEqual((summary["added"], summary["removed"]), (0, 0))
@@ -0,0 +1,40 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from agency_management.partitioning import PARTITIONED_TABLES, detach_partition, ensure_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-create the monthly partitions of the issue, receipt and payment tables "
+        "(run monthly), or detach an old month."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months-ahead", type=int, default=3, help="Months to create beyond the current one.")
+        parser.add_argument("--table", choices=sorted(PARTITIONED_TABLES), help="Only this table.")
+        parser.add_argument("--detach", metavar="YYYY-MM", help="Detach this month's partition instead.")
+
+    def handle(self, *args, **options):
+        tables = [options["table"]] if options["table"] else sorted(PARTITIONED_TABLES)
+        if options["detach"]:
+            if not options["table"]:
+                raise CommandError("--detach needs --table.")
+            try:
+                month = date.fromisoformat(f"{options['detach']}-01")
+            except ValueError:
+                raise CommandError(f"Invalid month: {options['detach']}")
+            name = detach_partition(options["table"], month)
+            self.stdout.write(self.style.SUCCESS(f"Detached {name}."))
+            return
+
+        for table in tables:
+            try:
+                with transaction.atomic():
+                    created = ensure_partitions(table, options["months_ahead"])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(f"{table}: {', '.join(created) or 'up to date'}")
+        self.stdout.write(self.style.SUCCESS("Partitions ready."))
@@ -0,0 +1,251 @@
+# partitioning.py
+from datetime import date
+
+from django.db import connections
+from django.utils import timezone
+
+# table -> (partition key column, primary key column)
+PARTITIONED_TABLES = {
+    "issue": ("issue_date", "issue_id"),
+    "receipt": ("receipt_date", "receipt_id"),
+    "payment": ("payment_date", "payment_id"),
+}
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_{month:%Y_%m}"
+
+
+def _table_schema(cursor, table):
+    cursor.execute(
+        "SELECT n.nspname, c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.oid = to_regclass(%s)",
+        [table],
+    )
+    return cursor.fetchone()
+
+
+def is_partitioned(table, using="default"):
+    with connections[using].cursor() as cursor:
+        found = _table_schema(cursor, table)
+    return bool(found) and found[1] == "p"
+
+
+def _create_partition(cursor, quote, schema, table, month):
+    name = partition_name(table, month)
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {quote(schema)}.{quote(name)} "
+        f"PARTITION OF {quote(schema)}.{quote(table)} FOR VALUES FROM (%s) TO (%s)",
+        [month, add_months(month, 1)],
+    )
+    return name
+
+
+def _dependent_views(cursor, schema, table):
+    """The views and materialized views reading `table` directly, as (schema, name, kind, options, definition)."""
+    cursor.execute(
+        "SELECT DISTINCT n.nspname, c.relname, c.relkind, array_to_string(c.reloptions, ', '), pg_get_viewdef(c.oid) "
+        "FROM pg_depend d JOIN pg_rewrite r ON r.oid = d.objid "
+        "JOIN pg_class c ON c.oid = r.ev_class JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE d.classid = 'pg_rewrite'::regclass AND d.refclassid = 'pg_class'::regclass "
+        "AND d.refobjid = to_regclass(%s) AND r.ev_class <> d.refobjid ORDER BY 1, 2",
+        [f"{schema}.{table}"],
+    )
+    return cursor.fetchall()
+
+
+def _rebind_views(cursor, quote, views, indexes):
+    """
+    Point the captured views at the new parent. Plain views are replaced
+    in place, which keeps their grants, comments and the views built on
+    them; materialized views were dropped and are created again, with
+    their indexes.
+    """
+    for schema, name, kind, options, definition in views:
+        # Options hold a view's check option and security_barrier, or a materialized view's storage settings.
+        target = f"{quote(schema)}.{quote(name)}{f' WITH ({options})' if options else ''}"
+        query = definition.strip().rstrip(";")
+        if kind == "m":
+            cursor.execute(f"CREATE MATERIALIZED VIEW {target} AS {query}")
+            for index_definition in indexes.get((schema, name), ()):
+                cursor.execute(index_definition)
+        else:
+            cursor.execute(f"CREATE OR REPLACE VIEW {target} AS {query}")
+
+
+def _add_unique_id_guard(cursor, quote, schema, table, pk):
+    """
+    The (pk, date) primary key only makes an id unique within its month,
+    so a trigger rejects a second row with the same id in any partition.
+    Ids from the sequence never collide; this catches explicit ids. The
+    advisory lock serializes writers of one id, so under READ COMMITTED the
+    later one sees the earlier row once it commits.
+    """
+    function = f"{quote(schema)}.{quote(f'{table}_unique_{pk}')}"
+    qualified = f"{quote(schema)}.{quote(table)}"
+    cursor.execute(
+        f"CREATE OR REPLACE FUNCTION {function}() RETURNS trigger LANGUAGE plpgsql AS $$ "
+        f"BEGIN "
+        f"  PERFORM pg_advisory_xact_lock(hashtextextended('{table}:' || NEW.{quote(pk)}, 0)); "
+        f"  IF (SELECT count(*) FROM {qualified} WHERE {quote(pk)} = NEW.{quote(pk)}) > 1 THEN "
+        f"    RAISE unique_violation USING MESSAGE = format('duplicate {table}.{pk} %s', NEW.{quote(pk)}); "
+        f"  END IF; "
+        f"  RETURN NULL; "
+        f"END $$"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER {quote(f'{table}_unique_{pk}')} AFTER INSERT OR UPDATE OF {quote(pk)} ON {qualified} "
+        f"FOR EACH ROW EXECUTE FUNCTION {function}()"
+    )
+
+
+def convert_to_partitioned(table, using="default", months_ahead=3):
+    """
+    Rebuild `table` as a table range-partitioned by month on its date
+    column: rename the old table, create the partitioned one with the same
+    columns and a (pk, date) primary key, add a partition for every month
+    from the oldest row to `months_ahead` months from now plus a DEFAULT
+    partition, copy the rows, move the id sequence over, point the views
+    reading the table at the new parent, drop the old table and recreate
+    its secondary indexes on the new parent.
+
+    The primary key no longer makes the id unique on its own, so a trigger
+    guards it (see _add_unique_id_guard), and foreign keys to the table
+    cannot be enforced by the database (the detail models use
+    db_constraint=False).
+
+    PostgreSQL only. Rewrites the whole table under an exclusive lock, so
+    run it in a maintenance window. Returns False if already partitioned.
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    column, pk = PARTITIONED_TABLES[table]
+    legacy = f"{table}_unpartitioned"
+    with connection.cursor() as cursor:
+        schema, kind = _table_schema(cursor, table)
+        if kind == "p":
+            return False
+        qualified = f"{quote(schema)}.{quote(table)}"
+        qualified_legacy = f"{quote(schema)}.{quote(legacy)}"
+
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes i "
+            "WHERE schemaname = %s AND tablename = %s AND NOT EXISTS ("
+            "  SELECT 1 FROM pg_constraint WHERE conname = i.indexname AND contype = 'p')",
+            [schema, table],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT attidentity FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attname = %s",
+            [f"{schema}.{table}", pk],
+        )
+        identity = cursor.fetchone()[0] != ""
+        cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", [f"{schema}.{table}", pk])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'",
+            [f"{schema}.{table}"],
+        )
+        primary_key = cursor.fetchone()[0]
+
+        cursor.execute(f"LOCK TABLE {qualified} IN ACCESS EXCLUSIVE MODE")
+        # Captured before the rename, so the definitions still name `table`.
+        views = _dependent_views(cursor, schema, table)
+        view_indexes = {}
+        for view_schema, name, kind, _, _ in views:
+            if kind == "m":
+                cursor.execute(
+                    "SELECT indexdef FROM pg_indexes WHERE schemaname = %s AND tablename = %s", [view_schema, name]
+                )
+                view_indexes[view_schema, name] = [row[0] for row in cursor.fetchall()]
+                cursor.execute(f"DROP MATERIALIZED VIEW {quote(view_schema)}.{quote(name)}")
+        cursor.execute(f"SELECT MIN({quote(column)}) FROM {qualified}")
+        oldest = cursor.fetchone()[0]
+        cursor.execute(f"ALTER TABLE {qualified} RENAME TO {quote(legacy)}")
+        cursor.execute(
+            f"ALTER TABLE {qualified_legacy} RENAME CONSTRAINT {quote(primary_key)} TO {quote(primary_key + '_old')}"
+        )
+        cursor.execute(
+            f"CREATE TABLE {qualified} (LIKE {qualified_legacy} "
+            f"INCLUDING DEFAULTS INCLUDING CONSTRAINTS{' INCLUDING IDENTITY' if identity else ''}) "
+            f"PARTITION BY RANGE ({quote(column)})"
+        )
+        # A partitioned table's primary key has to include the partition key.
+        cursor.execute(
+            f"ALTER TABLE {qualified} ADD CONSTRAINT {quote(primary_key)} PRIMARY KEY ({quote(pk)}, {quote(column)})"
+        )
+
+        first = month_start(oldest or timezone.localdate())
+        last = add_months(month_start(timezone.localdate()), months_ahead)
+        month = first
+        while month <= last:
+            _create_partition(cursor, quote, schema, table, month)
+            month = add_months(month, 1)
+        cursor.execute(
+            f"CREATE TABLE {quote(schema)}.{quote(table + '_default')} PARTITION OF {qualified} DEFAULT"
+        )
+
+        cursor.execute(f"INSERT INTO {qualified} SELECT * FROM {qualified_legacy}")
+        if identity:
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, %s), COALESCE(MAX({quote(pk)}), 0) + 1, false) "
+                f"FROM {qualified}",
+                [f"{schema}.{table}", pk],
+            )
+        elif sequence:
+            # serial column: keep the existing sequence alive past the DROP below.
+            cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {qualified}.{quote(pk)}")
+        _rebind_views(cursor, quote, views, view_indexes)
+        cursor.execute(f"DROP TABLE {qualified_legacy}")
+        for _, definition in indexes:
+            # Indexes created on the parent cascade to every partition, existing and future.
+            cursor.execute(definition)
+        _add_unique_id_guard(cursor, quote, schema, table, pk)
+    return True
+
+
+def ensure_partitions(table, months_ahead=3, using="default"):
+    """
+    Create the monthly partitions of `table` from the current month up to
+    `months_ahead` months ahead that do not exist yet. Returns their names.
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    created = []
+    with connection.cursor() as cursor:
+        schema, kind = _table_schema(cursor, table)
+        if kind != "p":
+            raise ValueError(f"Table {table} is not partitioned.")
+        month = month_start(timezone.localdate())
+        for _ in range(months_ahead + 1):
+            cursor.execute("SELECT to_regclass(%s)", [f"{schema}.{partition_name(table, month)}"])
+            if cursor.fetchone()[0] is None:
+                created.append(_create_partition(cursor, quote, schema, table, month))
+            month = add_months(month, 1)
+    return created
+
+
+def detach_partition(table, month, using="default"):
+    """
+    Detach the partition holding `month` from `table`. The detached table
+    keeps its rows and can be archived or dropped on its own; queries
+    through the parent no longer see them.
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    name = partition_name(table, month_start(month))
+    with connection.cursor() as cursor:
+        schema, _ = _table_schema(cursor, table)
+        cursor.execute(
+            f"ALTER TABLE {quote(schema)}.{quote(table)} DETACH PARTITION {quote(schema)}.{quote(name)}"
+        )
+    return name
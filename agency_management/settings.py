@@ -43,10 +43,12 @@ INSTALLED_APPS = [
     "finance",
     "agency",
     "regulation",
+    "agency_management",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "authentication.middleware.TokenAuthenticationMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -0,0 +1,50 @@
+import unittest
+from unittest import mock
+
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+
+from .partitioning import PARTITIONED_TABLES, convert_to_partitioned, is_partitioned
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "partitioning is PostgreSQL only")
+class ConvertToPartitionedTests(TestCase):
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TABLE scratch_document ("
+                "  document_id serial PRIMARY KEY, document_date date NOT NULL, amount numeric(15, 2) NOT NULL)"
+            )
+            cursor.execute(
+                "INSERT INTO scratch_document (document_date, amount) "
+                "VALUES ('2025-01-05', 10), ('2025-01-20', 15), ('2025-02-03', 20)"
+            )
+            cursor.execute(
+                "CREATE VIEW scratch_monthly AS SELECT date_trunc('month', document_date)::date AS month, "
+                "SUM(amount) AS total FROM scratch_document GROUP BY 1"
+            )
+            cursor.execute("CREATE VIEW scratch_busy_months AS SELECT month FROM scratch_monthly WHERE total > 15")
+        patcher = mock.patch.dict(PARTITIONED_TABLES, {"scratch_document": ("document_date", "document_id")})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetch(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            return cursor.fetchall()
+
+    def test_rows_and_dependent_views_survive_the_conversion(self):
+        self.assertTrue(convert_to_partitioned("scratch_document"))
+
+        self.assertTrue(is_partitioned("scratch_document"))
+        self.assertIsNone(self.fetch("SELECT to_regclass('scratch_document_unpartitioned')")[0][0])
+        self.assertEqual(self.fetch("SELECT SUM(amount) FROM scratch_document")[0][0], 45)
+        self.assertEqual(len(self.fetch("SELECT * FROM scratch_monthly")), 2)
+        self.assertEqual(len(self.fetch("SELECT * FROM scratch_busy_months")), 2)
+        self.assertFalse(convert_to_partitioned("scratch_document"))
+
+    def test_ids_stay_unique_across_partitions(self):
+        convert_to_partitioned("scratch_document")
+        self.fetch("INSERT INTO scratch_document (document_date, amount) VALUES ('2025-03-01', 5) RETURNING 1")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.fetch("INSERT INTO scratch_document VALUES (1, '2025-02-10', 5) RETURNING 1")
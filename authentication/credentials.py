@@ -0,0 +1,200 @@
+# credentials.py
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password, make_password
+
+
+class CredentialServiceBusy(Exception):
+    """Raised instead of queueing when the hashing pool already has its maximum of pending work."""
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 with its work factor read from CREDENTIALS_PBKDF2_ITERATIONS.
+    Same algorithm name as Django's, so existing hashes keep verifying;
+    hashes with another iteration count are replaced on the next login.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, "CREDENTIALS_PBKDF2_ITERATIONS", PBKDF2PasswordHasher.iterations)
+
+
+class CredentialStats:
+    """Process-wide login latency and hashing pool saturation counters."""
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._mutex:
+            self.logins = 0
+            self.failed_logins = 0
+            self.rehashes = 0
+            self.login_seconds = 0.0
+            self.max_login_seconds = 0.0
+            self.tasks = 0
+            self.queue_wait_seconds = 0.0
+            self.pending = 0
+            self.peak_pending = 0
+            self.rejected = 0
+
+    def record_login(self, seconds, succeeded, rehashed):
+        with self._mutex:
+            self.logins += 1
+            self.failed_logins += not succeeded
+            self.rehashes += rehashed
+            self.login_seconds += seconds
+            self.max_login_seconds = max(self.max_login_seconds, seconds)
+
+    def try_enter(self, limit):
+        with self._mutex:
+            if self.pending >= limit:
+                self.rejected += 1
+                return False
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+            return True
+
+    def started(self, waited):
+        with self._mutex:
+            self.tasks += 1
+            self.queue_wait_seconds += waited
+
+    def leave(self):
+        with self._mutex:
+            self.pending -= 1
+
+    def snapshot(self):
+        with self._mutex:
+            return {
+                "logins": self.logins,
+                "failed_logins": self.failed_logins,
+                "rehashes": self.rehashes,
+                "avg_login_seconds": self.login_seconds / self.logins if self.logins else 0.0,
+                "max_login_seconds": self.max_login_seconds,
+                "tasks": self.tasks,
+                "avg_queue_wait_seconds": self.queue_wait_seconds / self.tasks if self.tasks else 0.0,
+                "pending": self.pending,
+                "peak_pending": self.peak_pending,
+                "rejected": self.rejected,
+            }
+
+
+credential_stats = CredentialStats()
+
+
+class CredentialService:
+    """
+    Hashes and verifies Account passwords on a bounded thread pool of
+    CREDENTIALS_WORKERS threads, so neither request threads nor ASGI event
+    loops run the hashing themselves. Work beyond CREDENTIALS_MAX_PENDING
+    pending tasks is refused with CredentialServiceBusy rather than queued.
+    A successful login whose hash uses another algorithm or work factor
+    than the current one is rehashed in place.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self.hasher = TunablePBKDF2PasswordHasher()
+
+    def _settings(self):
+        workers = getattr(settings, "CREDENTIALS_WORKERS", min(4, os.cpu_count() or 1))
+        return workers, getattr(settings, "CREDENTIALS_MAX_PENDING", workers * 8)
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                workers, _ = self._settings()
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="credentials")
+            return self._executor
+
+    def _submit(self, fn, *args):
+        if not credential_stats.try_enter(self._settings()[1]):
+            raise CredentialServiceBusy("Too many password hashing tasks pending.")
+        submitted = time.monotonic()
+
+        def run():
+            credential_stats.started(time.monotonic() - submitted)
+            try:
+                return fn(*args)
+            finally:
+                credential_stats.leave()
+
+        try:
+            return self._pool().submit(run)
+        except BaseException:
+            credential_stats.leave()
+            raise
+
+    def _hash(self, password):
+        return make_password(password, hasher=self.hasher)
+
+    def _check(self, password, encoded):
+        """(valid, new hash or None): a valid password stored with outdated parameters gets a new hash."""
+        upgraded = []
+        valid = check_password(password, encoded, setter=lambda raw: upgraded.append(self._hash(raw)),
+                               preferred=self.hasher)
+        return valid, upgraded[0] if upgraded else None
+
+    def hash_password(self, password):
+        return self._submit(self._hash, password).result()
+
+    async def ahash_password(self, password):
+        return await asyncio.wrap_future(self._submit(self._hash, password))
+
+    def hash_passwords(self, passwords):
+        """Hash several passwords in parallel on the pool, keeping their order."""
+        passwords = list(passwords)
+        # Leave half of the pending slots to logins.
+        window = max(1, self._settings()[1] // 2)
+        hashes = []
+        for start in range(0, len(passwords), window):
+            futures = [self._submit(self._hash, password) for password in passwords[start:start + window]]
+            hashes.extend(future.result() for future in futures)
+        return hashes
+
+    def authenticate(self, username, password):
+        """The Account with this username and password, or None."""
+        Account = apps.get_model("authentication", "Account")
+        started = time.monotonic()
+        account = Account.objects.filter(username=username).first()
+        if account is None:
+            # Spend the same hashing time as for a real account, so unknown usernames cannot be told apart.
+            self._submit(self._hash, password).result()
+            credential_stats.record_login(time.monotonic() - started, False, False)
+            return None
+        valid, new_hash = self._submit(self._check, password, account.password_hash).result()
+        if valid and new_hash:
+            Account.objects.filter(pk=account.pk, password_hash=account.password_hash).update(password_hash=new_hash)
+            account.password_hash = new_hash
+        credential_stats.record_login(time.monotonic() - started, valid, bool(valid and new_hash))
+        return account if valid else None
+
+    async def aauthenticate(self, username, password):
+        Account = apps.get_model("authentication", "Account")
+        started = time.monotonic()
+        account = await Account.objects.filter(username=username).afirst()
+        if account is None:
+            await asyncio.wrap_future(self._submit(self._hash, password))
+            credential_stats.record_login(time.monotonic() - started, False, False)
+            return None
+        valid, new_hash = await asyncio.wrap_future(self._submit(self._check, password, account.password_hash))
+        if valid and new_hash:
+            await Account.objects.filter(pk=account.pk, password_hash=account.password_hash).aupdate(
+                password_hash=new_hash
+            )
+            account.password_hash = new_hash
+        credential_stats.record_login(time.monotonic() - started, valid, bool(valid and new_hash))
+        return account if valid else None
+
+
+credentials = CredentialService()
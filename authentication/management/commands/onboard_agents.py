@@ -0,0 +1,56 @@
+import csv
+import json
+import sys
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.models import Account
+
+FORMATS = ("csv", "json", "jsonl")
+
+
+def read_rows(stream, fmt):
+    if fmt == "csv":
+        return [{key: value for key, value in row.items() if value != ""} for row in csv.DictReader(stream)]
+    if fmt == "jsonl":
+        return [json.loads(line) for line in stream if line.strip()]
+    return json.load(stream)
+
+
+class Command(BaseCommand):
+    help = "Create the accounts, users and agencies of a list of agents (CSV, JSON or JSON lines) in one transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input file, or - for stdin.")
+        parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension.")
+        parser.add_argument("--district-id", type=int, help="District for rows that have none.")
+        parser.add_argument("--agency-type-id", type=int, help="Agency type for rows that have none.")
+        parser.add_argument("--dry-run", action="store_true", help="Validate only, write nothing.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or path.rsplit(".", 1)[-1].lower()
+        if fmt not in FORMATS:
+            raise CommandError(f"Cannot infer the format of {path}, use --format.")
+
+        stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        try:
+            agents = read_rows(stream, fmt)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        try:
+            result = Account.objects.onboard_agents(
+                agents,
+                district_id=options["district_id"],
+                agency_type_id=options["agency_type_id"],
+                dry_run=options["dry_run"],
+            )
+        except ValidationError as exc:
+            raise CommandError("\n".join(exc.messages))
+        if options["dry_run"]:
+            self.stdout.write(self.style.SUCCESS(f"Validated {result} agent(s)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Onboarded {len(result)} agent(s)."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from authentication.models import RevokedToken
+
+
+class Command(BaseCommand):
+    help = "Delete the revocations of tokens that have expired anyway (run daily)."
+
+    def handle(self, *args, **options):
+        deleted = RevokedToken.objects.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} revoked token(s)."))
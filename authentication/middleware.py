@@ -0,0 +1,33 @@
+# middleware.py
+from django.http import JsonResponse
+
+from .tokens import InvalidToken, verify
+
+
+class TokenAuthenticationMiddleware:
+    """
+    Authenticates requests carrying "Authorization: Bearer <access token>"
+    from the signed token alone: request.account_id and request.account_role
+    come from its payload, without reading the session or Account tables.
+    Requests without the header fall through to session authentication.
+    """
+
+    keyword = "Bearer"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.token = None
+        header = request.headers.get("Authorization", "")
+        scheme, _, token = header.partition(" ")
+        if scheme == self.keyword and token:
+            try:
+                request.token = verify(token.strip())
+            except InvalidToken as exc:
+                return JsonResponse({"detail": str(exc)}, status=401, headers={"WWW-Authenticate": self.keyword})
+            request.account_id = request.token["sub"]
+            request.account_role = request.token["role"]
+            # A bearer token is not sent by the browser on its own, so CSRF does not apply.
+            request._dont_enforce_csrf_checks = True
+        return self.get_response(request)
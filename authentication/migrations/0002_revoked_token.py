@@ -0,0 +1,39 @@
+# Generated by Django 5.2.3 on 2026-10-16 23:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RevokedToken",
+            fields=[
+                (
+                    "jti",
+                    models.CharField(
+                        db_column="jti",
+                        max_length=32,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("account_id", models.IntegerField(db_column="account_id")),
+                ("expires_at", models.DateTimeField(db_column="expires_at")),
+                ("revoked_at", models.DateTimeField(db_column="revoked_at")),
+            ],
+            options={
+                "db_table": "revokedtoken",
+                "ordering": ["-revoked_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["expires_at"], name="revokedtoke_expires_209903_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -5,14 +5,26 @@
 #   * Make sure each ForeignKey and OneToOneField has `on_delete` set to the desired behavior
 #   * Remove `managed = False` lines if you wish to allow Django to create, modify, and delete the table
 # Feel free to rename the models, but don't rename db_table values or field names.
-from django.db import models
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.apps import apps
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.utils import timezone
+
+from .credentials import credentials
 
 
 class AccountManager(models.Manager):
-    def create_user(self, username, password_hash, account_role, **extra_fields):
+    def create_user(self, username, password_hash=None, account_role=None, password=None, **extra_fields):
         if not username:
             raise ValueError("Username is required")
+        if password is not None:
+            password_hash = credentials.hash_password(password)
+        if not password_hash:
+            raise ValueError("A password or password hash is required")
         if account_role not in dict(Account.ACCOUNT_ROLE_CHOICES):
             raise ValueError("Invalid account_role")
         account = self.model(
@@ -24,7 +36,157 @@ class AccountManager(models.Manager):
         account.save(using=self._db)
         return account
 
-    def create_superuser(self, username, password_hash, **extra_fields):
+    def onboard_agents(self, agents, district_id=None, agency_type_id=None, dry_run=False):
+        """
+        Create the Account, User and placeholder Agency of every agent in
+        `agents` (dicts with username, password_hash or password, full_name,
+        email and optionally phone_number, address, agency_name,
+        representative, district_id, agency_type_id, reception_date) with one
+        bulk insert per table in a single transaction. district_id /
+        agency_type_id are the defaults for agents that do not name their
+        own. The whole batch is validated up front, row by row against the
+        model fields and then with set-based queries, and rejected as a
+        whole; only then are plain passwords hashed, in parallel on the
+        credential pool (not at all with dry_run). Returns the created
+        accounts, or the validated count with dry_run.
+        """
+        User = apps.get_model("authentication", "User")
+        Agency = apps.get_model("agency", "Agency")
+        AgencyType = apps.get_model("agency", "AgencyType")
+        District = apps.get_model("agency", "District")
+        DebtRollup = apps.get_model("agency", "DebtRollup")
+
+        agents = [dict(agent) for agent in agents]
+        errors = []
+        for index, agent in enumerate(agents):
+            agent.setdefault("district_id", district_id)
+            agent.setdefault("agency_type_id", agency_type_id)
+            missing = [field for field in ("username", "full_name", "email", "district_id", "agency_type_id")
+                       if not agent.get(field)]
+            if not agent.get("password_hash") and not agent.get("password"):
+                missing.insert(1, "password_hash")
+            if missing:
+                errors.append(f"#{index}: missing {', '.join(missing)}")
+            for field in ("district_id", "agency_type_id"):
+                if field in missing:
+                    continue
+                try:
+                    agent[field] = int(agent[field])
+                except (TypeError, ValueError):
+                    errors.append(f"#{index}: {field} must be an integer, got {agent[field]!r}")
+            if not missing:
+                for field, messages in self._agent_field_errors(agent, User, Agency).items():
+                    errors.extend(f"#{index}: {field}: {message}" for message in messages)
+        if errors:
+            raise ValidationError(errors)
+
+        for field, sources in (("username", (self.model,)), ("email", (User, Agency))):
+            values = [agent[field] for agent in agents]
+            used = {value for value, count in Counter(values).items() if count > 1}
+            for model in sources:
+                used.update(model.objects.using(self._db).filter(**{f"{field}__in": values})
+                            .values_list(field, flat=True))
+            if used:
+                errors.append(f"{field} already used: {sorted(used)}")
+        for field, model in (("district_id", District), ("agency_type_id", AgencyType)):
+            wanted = {int(agent[field]) for agent in agents}
+            missing = wanted - set(model.objects.using(self._db).filter(pk__in=wanted).values_list("pk", flat=True))
+            if missing:
+                errors.append(f"{field} does not exist: {sorted(missing)}")
+        if errors:
+            raise ValidationError(errors)
+
+        if not dry_run:
+            # Hashing is the slow part, so it only starts once the whole batch is known to be valid.
+            to_hash = [agent for agent in agents if not agent.get("password_hash")]
+            hashes = credentials.hash_passwords(agent["password"] for agent in to_hash)
+            for agent, password_hash in zip(to_hash, hashes):
+                agent["password_hash"] = password_hash
+        now = timezone.now()
+        with transaction.atomic(using=self._db):
+            # Lock the districts so concurrent onboarding cannot overfill them.
+            added = Counter(int(agent["district_id"]) for agent in agents)
+            limits = dict(
+                District.objects.using(self._db).select_for_update().filter(pk__in=added)
+                .order_by("pk").values_list("pk", "max_agencies")
+            )
+            counts = dict(
+                Agency.objects.using(self._db).filter(district_id__in=added).order_by()
+                .values("district_id").annotate(count=models.Count("pk")).values_list("district_id", "count")
+            )
+            full = sorted(
+                district for district, count in added.items() if counts.get(district, 0) + count > limits[district]
+            )
+            if full:
+                raise ValidationError(f"Districts would exceed their maximum number of agencies: {full}")
+            if dry_run:
+                return len(agents)
+
+            accounts = self.bulk_create([
+                self.model(username=agent["username"], password_hash=agent["password_hash"],
+                           account_role=Account.AGENT, created_at=now)
+                for agent in agents
+            ])
+            users = User.objects.using(self._db).bulk_create([
+                User(account=account, full_name=agent["full_name"], email=agent["email"],
+                     phone_number=agent.get("phone_number"), address=agent.get("address"), created_at=now)
+                for account, agent in zip(accounts, agents)
+            ])
+            Agency.objects.using(self._db).bulk_create([
+                Agency(
+                    agency_name=agent.get("agency_name") or agent["full_name"],
+                    agency_type_id=agent["agency_type_id"],
+                    district_id=agent["district_id"],
+                    phone_number=agent.get("phone_number") or "",
+                    address=agent.get("address") or "",
+                    email=agent["email"],
+                    representative=agent.get("representative") or agent["full_name"],
+                    reception_date=agent.get("reception_date") or timezone.localdate(),
+                    debt_amount=0,
+                    created_at=now,
+                    user_id=user.pk,
+                )
+                for user, agent in zip(users, agents)
+            ])
+            # bulk_create skips the agency post_save receivers, so the new agencies are counted here.
+            DebtRollup.objects.db_manager(self._db).record(
+                [(None, (int(agent["district_id"]), int(agent["agency_type_id"]), 0)) for agent in agents]
+            )
+        return accounts
+
+    def _agent_field_errors(self, agent, User, Agency):
+        """
+        {field: [messages]} of one onboarding row, from the field validators
+        and clean() of the rows it becomes, since bulk_create runs neither.
+        Uniqueness and foreign keys are checked for the whole batch instead.
+        """
+        account = self.model(username=agent["username"], password_hash=agent.get("password_hash") or "!",
+                             account_role=Account.AGENT)
+        user = User(account=account, full_name=agent["full_name"], email=agent["email"],
+                    phone_number=agent.get("phone_number"), address=agent.get("address"))
+        # Phone number, address and email are copied from the user, which already checks them.
+        agency = Agency(agency_name=agent.get("agency_name") or agent["full_name"],
+                        representative=agent.get("representative") or agent["full_name"],
+                        reception_date=agent.get("reception_date") or timezone.localdate(), debt_amount=0)
+        errors = {}
+        for instance, exclude in (
+            (account, ["created_at", "updated_at"]),
+            (user, ["account", "created_at", "updated_at"]),
+            (agency, ["agency_type", "district", "phone_number", "address", "email", "created_at", "updated_at",
+                      "user_id"]),
+        ):
+            try:
+                instance.full_clean(exclude=exclude, validate_unique=False, validate_constraints=False)
+            except ValidationError as exc:
+                for field, messages in exc.message_dict.items():
+                    errors.setdefault(field, []).extend(messages)
+        try:
+            validate_email(agent["email"])
+        except ValidationError as exc:
+            errors.setdefault("email", []).extend(exc.messages)
+        return errors
+
+    def create_superuser(self, username, password_hash=None, **extra_fields):
         return self.create_user(
             username=username,
             password_hash=password_hash,
@@ -94,3 +256,59 @@ class User(models.Model):
 
     def get_full_name(self):
         return self.full_name
+
+
+class RevokedTokenManager(models.Manager):
+    """
+    Revoked token ids. A whole token family (every pair descended from one
+    login by refreshing) is revoked by a row whose jti is the family id,
+    kept until the longest-lived token of the family could expire.
+    """
+
+    def _revoke(self, jti, account_id, expires_at):
+        with transaction.atomic(using=self.db):
+            _, created = self.get_or_create(
+                jti=jti,
+                defaults={"account_id": account_id, "expires_at": expires_at, "revoked_at": timezone.now()},
+            )
+        return created
+
+    def revoke(self, payload):
+        """
+        Revoke a verified token payload until it would have expired anyway.
+        Returns False if it was already revoked, which for a refresh token
+        means it is being used a second time.
+        """
+        return self._revoke(
+            payload["jti"], payload["sub"], datetime.fromtimestamp(payload["exp"], tz=dt_timezone.utc)
+        )
+
+    def revoke_family(self, payload, lifetime):
+        """Revoke every token of the payload's family, for `lifetime` seconds from now."""
+        if not payload.get("fam"):
+            return False
+        return self._revoke(payload["fam"], payload["sub"], timezone.now() + timedelta(seconds=lifetime))
+
+    def purge_expired(self):
+        """Delete revocations of tokens that have expired, which no longer verify anyway."""
+        deleted, _ = self.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+
+class RevokedToken(models.Model):
+    jti = models.CharField(primary_key=True, max_length=32, db_column="jti")
+    account_id = models.IntegerField(db_column="account_id")
+    expires_at = models.DateTimeField(db_column="expires_at")
+    revoked_at = models.DateTimeField(db_column="revoked_at")
+
+    objects = RevokedTokenManager()
+
+    class Meta:
+        db_table = "revokedtoken"
+        ordering = ["-revoked_at"]
+        indexes = [
+            models.Index(fields=["expires_at"]),
+        ]
+
+    def __str__(self):
+        return f"Revoked token {self.jti} of account {self.account_id}"
@@ -1,3 +1,243 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from agency.models import Agency, AgencyType, District
+from .credentials import credential_stats, credentials
+from .models import Account, RevokedToken, User
+from .tokens import REFRESH, InvalidToken, issue_tokens, refresh, revocation_list, verify
+
+
+def agent(index, **fields):
+    return {
+        "username": f"daily{index}", "password_hash": "!", "full_name": f"Đại lý {index}",
+        "email": f"daily{index}@example.com", **fields,
+    }
+
+
+class OnboardAgentsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.agency_type = AgencyType.objects.create(type_name="Loại 1", max_debt=Decimal("1000"))
+        cls.district = District.objects.create(district_name="Quận 1", max_agencies=10)
+
+    def onboard(self, agents, **kwargs):
+        return Account.objects.onboard_agents(
+            agents, district_id=self.district.pk, agency_type_id=self.agency_type.pk, **kwargs
+        )
+
+    def test_creates_one_account_user_and_agency_per_agent(self):
+        accounts = self.onboard([agent(1), agent(2, district_id=str(self.district.pk))])
+
+        self.assertEqual(len(accounts), 2)
+        self.assertEqual(User.objects.filter(account__in=accounts).count(), 2)
+        self.assertEqual(
+            sorted(Agency.objects.values_list("agency_name", "district_id")),
+            [("Đại lý 1", self.district.pk), ("Đại lý 2", self.district.pk)],
+        )
+
+    def test_non_numeric_ids_are_reported_per_row(self):
+        with self.assertRaises(ValidationError) as raised:
+            self.onboard([agent(1), agent(2, district_id="quan-1"), agent(3, agency_type_id=[1])])
+
+        self.assertEqual(raised.exception.messages, [
+            "#1: district_id must be an integer, got 'quan-1'",
+            "#2: agency_type_id must be an integer, got [1]",
+        ])
+        self.assertFalse(Account.objects.exists())
+
+    def test_field_errors_are_reported_per_row(self):
+        with mock.patch.object(credentials, "hash_passwords") as hash_passwords:
+            with self.assertRaises(ValidationError) as raised:
+                self.onboard([
+                    agent(1),
+                    agent(2, email="daily2.example.com"),
+                    agent(3, phone_number="09-123"),
+                    agent(4, username="d" * 51, full_name="Đ" * 101, password="mat-khau", password_hash=None),
+                    agent(5, email=f"{'d' * 90}@example.com", phone_number="0" * 16),
+                    agent(6, reception_date="2025-02-30"),
+                ])
+        hash_passwords.assert_not_called()
+
+        self.assertEqual(raised.exception.messages, [
+            "#1: email: Enter a valid email address.",
+            "#2: phone_number: Phone number must be 10–15 digits.",
+            "#3: username: Ensure this value has at most 50 characters (it has 51).",
+            "#3: full_name: Ensure this value has at most 100 characters (it has 101).",
+            "#3: representative: Ensure this value has at most 100 characters (it has 101).",
+            "#4: email: Ensure this value has at most 100 characters (it has 102).",
+            "#4: phone_number: Ensure this value has at most 15 characters (it has 16).",
+            "#4: phone_number: Phone number must be 10–15 digits.",
+            "#5: reception_date: “2025-02-30” value has the correct format (YYYY-MM-DD) but it is an invalid date.",
+        ])
+        self.assertFalse(Account.objects.exists())
+
+    def test_saving_an_agent_user_creates_no_placeholder_agency(self):
+        account = Account.objects.create(username="daily9", password_hash="!", account_role=Account.AGENT)
+        User.objects.create(account=account, full_name="Đại lý 9")
+        self.assertFalse(Agency.objects.exists())
+
+    def test_invalid_batch_is_rejected_before_any_password_is_hashed(self):
+        Account.objects.create(username="daily1", password_hash="!", account_role=Account.AGENT)
+        batch = [agent(index, password="mat-khau", password_hash=None) for index in (1, 2)]
+        with mock.patch.object(credentials, "hash_passwords") as hash_passwords:
+            with self.assertRaises(ValidationError):
+                self.onboard(batch)
+            self.assertEqual(self.onboard(batch[1:], dry_run=True), 1)
+        hash_passwords.assert_not_called()
+
+    def test_plain_passwords_are_hashed_once_valid(self):
+        with mock.patch.object(credentials, "hash_passwords", return_value=["hashed"]) as hash_passwords:
+            account, = self.onboard([agent(1, password="mat-khau", password_hash=None)])
+        self.assertEqual(list(hash_passwords.call_args.args[0]), ["mat-khau"])
+        self.assertEqual(Account.objects.get(pk=account.pk).password_hash, "hashed")
+
+    @override_settings(CREDENTIALS_PBKDF2_ITERATIONS=1, CREDENTIALS_MAX_PENDING=4)
+    def test_passwords_hashed_on_the_pool_verify(self):
+        credential_stats.reset()
+        self.addCleanup(credential_stats.reset)
+        batch = [agent(index, password=f"mat-khau-{index}", password_hash=None) for index in range(3)]
+
+        with self.assertRaises(ValidationError):
+            self.onboard(batch + [agent(3, email="daily3")])
+        self.assertEqual(credential_stats.snapshot()["tasks"], 0)
+
+        accounts = self.onboard(batch)
+        self.assertEqual(credential_stats.snapshot()["tasks"], 3)
+        for index, account in enumerate(accounts):
+            password_hash = Account.objects.get(pk=account.pk).password_hash
+            self.assertTrue(password_hash.startswith("pbkdf2_sha256$1$"))
+            self.assertEqual(credentials.authenticate(f"daily{index}", f"mat-khau-{index}"), account)
+            self.assertIsNone(credentials.authenticate(f"daily{index}", f"mat-khau-{index + 1}"))
+
+
+@override_settings(TOKEN_REVOCATION_POLL_INTERVAL=3600)
+class TokenRefreshTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = Account.objects.create(username="nv1", password_hash="!", account_role=Account.STAFF)
+
+    def setUp(self):
+        revocation_list.invalidate()
+        self.addCleanup(revocation_list.invalidate)
+
+    def assertFamilyRevoked(self, tokens):
+        revocation_list.invalidate()
+        with self.assertRaises(InvalidToken):
+            verify(tokens["access"])
+        with self.assertRaises(InvalidToken):
+            verify(tokens["refresh"], REFRESH)
+        with self.assertRaises(InvalidToken):
+            refresh(tokens["refresh"])
+
+    def test_refresh_rotates_within_the_family(self):
+        login = issue_tokens(self.account)
+        with self.captureOnCommitCallbacks(execute=True):
+            rotated = refresh(login["refresh"])
+
+        self.assertEqual(verify(rotated["access"])["fam"], verify(login["access"])["fam"])
+        with self.assertRaises(InvalidToken):
+            verify(login["refresh"], REFRESH)
+
+    def test_replayed_refresh_token_revokes_its_family(self):
+        login = issue_tokens(self.account)
+        with self.captureOnCommitCallbacks(execute=True):
+            rotated = refresh(login["refresh"])
+        with self.assertRaises(InvalidToken):
+            refresh(login["refresh"])
+        self.assertFamilyRevoked(rotated)
+
+    def test_replay_is_caught_before_the_revocation_list_refreshes(self):
+        login = issue_tokens(self.account)
+        verify(login["access"])  # This worker has now cached an empty revocation list.
+        rotated = refresh(login["refresh"])  # Its on-commit invalidation never runs here.
+
+        with self.assertRaises(InvalidToken):
+            refresh(login["refresh"])
+        self.assertEqual(RevokedToken.objects.count(), 2)
+        self.assertFamilyRevoked(rotated)
+
+
+@override_settings(TOKEN_REVOCATION_POLL_INTERVAL=3600, CREDENTIALS_PBKDF2_ITERATIONS=1)
+class TokenViewTests(TestCase):
+    def setUp(self):
+        revocation_list.invalidate()
+        self.addCleanup(revocation_list.invalidate)
+        self.account = Account.objects.create(username="nv1", password_hash=credentials.hash_password("mat-khau"),
+                                              account_role=Account.STAFF)
+
+    def post(self, name, body, token=None):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse(name), body, content_type="application/json", headers=headers)
+
+    def login(self):
+        response = self.post("token_obtain", {"username": "nv1", "password": "mat-khau"})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_obtain_checks_the_credentials(self):
+        for body, status in (
+            ({"username": "nv1"}, 400),
+            ("not json", 400),
+            ({"username": "nv1", "password": "sai"}, 401),
+            ({"username": "nv2", "password": "mat-khau"}, 401),
+        ):
+            with self.subTest(body=body):
+                self.assertEqual(self.post("token_obtain", body).status_code, status)
+        self.assertEqual(verify(self.login()["access"])["sub"], self.account.pk)
+
+    def test_refresh_rejects_invalid_tokens(self):
+        tokens = self.login()
+        tampered = tokens["refresh"][:-1] + ("A" if tokens["refresh"][-1] != "A" else "B")
+        for token in ("", "garbage", 12, ["list"], {"refresh": "x"}, tokens["access"], tampered):
+            with self.subTest(token=token):
+                response = self.post("token_refresh", {"refresh": token})
+                self.assertEqual(response.status_code, 401)
+                self.assertIn("detail", response.json())
+
+    def test_replayed_refresh_token_is_rejected_and_revokes_its_family(self):
+        tokens = self.login()
+        rotated = self.post("token_refresh", {"refresh": tokens["refresh"]})
+        self.assertEqual(rotated.status_code, 200)
+
+        replayed = self.post("token_refresh", {"refresh": tokens["refresh"]})
+        self.assertEqual((replayed.status_code, replayed.json()), (401, {"detail": "Token has been revoked."}))
+        self.assertEqual(self.post("token_refresh", {"refresh": rotated.json()["refresh"]}).status_code, 401)
+
+    def test_revoke_logs_out_both_tokens(self):
+        tokens = self.login()
+        self.assertEqual(self.post("token_revoke", {"refresh": tokens["access"]}).status_code, 401)
+        self.assertEqual(self.post("token_revoke", {"refresh": 5}).status_code, 401)
+
+        response = self.post("token_revoke", {"refresh": tokens["refresh"]}, token=tokens["access"])
+        self.assertEqual((response.status_code, response.content), (205, b""))
+        self.assertEqual(self.post("token_refresh", {"refresh": tokens["refresh"]}).status_code, 401)
+        self.assertEqual(self.post("token_revoke", {"refresh": tokens["refresh"]}).status_code, 401)
+
+    def test_middleware_rejects_invalid_bearer_tokens(self):
+        tokens = self.login()
+        with override_settings(ACCESS_TOKEN_LIFETIME=-1):
+            expired = issue_tokens(self.account)["access"]
+        for token, detail in (
+            ("garbage", "Invalid token."),
+            (tokens["refresh"], "Invalid token."),
+            (expired, "Token has expired."),
+        ):
+            with self.subTest(detail=detail):
+                response = self.client.get(reverse("token_obtain"), headers={"Authorization": f"Bearer {token}"})
+                self.assertEqual((response.status_code, response.json()), (401, {"detail": detail}))
+                self.assertEqual(response.headers["WWW-Authenticate"], "Bearer")
+
+        # Valid tokens and other schemes reach the view, which only accepts POST.
+        for header in (f"Bearer {tokens['access']}", "Basic bnYxOm1hdC1raGF1"):
+            with self.subTest(header=header):
+                response = self.client.get(reverse("token_obtain"), headers={"Authorization": header})
+                self.assertEqual(response.status_code, 405)
+
+        self.post("token_revoke", {"refresh": tokens["refresh"]}, token=tokens["access"])
+        response = self.client.get(reverse("token_obtain"), headers={"Authorization": f"Bearer {tokens['access']}"})
+        self.assertEqual((response.status_code, response.json()), (401, {"detail": "Token has been revoked."}))
@@ -0,0 +1,167 @@
+# tokens.py
+import threading
+import time
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+ACCESS, REFRESH = "access", "refresh"
+SALTS = {ACCESS: "authentication.tokens.access", REFRESH: "authentication.tokens.refresh"}
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _lifetime(kind):
+    if kind == ACCESS:
+        return getattr(settings, "ACCESS_TOKEN_LIFETIME", 300)
+    return getattr(settings, "REFRESH_TOKEN_LIFETIME", 7 * 24 * 3600)
+
+
+class RevocationList:
+    """
+    The jti of every revoked, not yet expired token, and the id of every
+    revoked token family, cached per process.
+    Like the regulation cache, each worker polls a cheap version of the
+    table (row count and latest revoked_at) at most every
+    TOKEN_REVOCATION_POLL_INTERVAL seconds; revocations made in this process
+    apply as soon as they commit.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _read_version(self):
+        RevokedToken = apps.get_model("authentication", "RevokedToken")
+        version = RevokedToken.objects.aggregate(count=Count("pk"), revoked=Max("revoked_at"))
+        return (version["count"], version["revoked"])
+
+    def _load(self):
+        RevokedToken = apps.get_model("authentication", "RevokedToken")
+        return frozenset(RevokedToken.objects.filter(expires_at__gt=timezone.now()).values_list("jti", flat=True))
+
+    def jtis(self):
+        poll_interval = getattr(settings, "TOKEN_REVOCATION_POLL_INTERVAL", 5)
+        now = time.monotonic()
+        state = self._state
+        if state is not None and now - state["checked_at"] < poll_interval:
+            return state["jtis"]
+        with self._lock:
+            state = self._state
+            if state is not None and now - state["checked_at"] < poll_interval:
+                return state["jtis"]
+            version = self._read_version()
+            if state is None or state["version"] != version:
+                state = {"jtis": self._load(), "version": version}
+            state["checked_at"] = now
+            self._state = state
+            return state["jtis"]
+
+    def __contains__(self, jti):
+        return jti in self.jtis()
+
+    def invalidate(self):
+        with self._lock:
+            self._state = None
+
+
+revocation_list = RevocationList()
+
+
+def _issue(account_id, role, kind, family):
+    payload = {
+        "sub": account_id,
+        "role": role,
+        "typ": kind,
+        "jti": uuid.uuid4().hex,
+        "fam": family,
+        "exp": int(time.time()) + _lifetime(kind),
+    }
+    return signing.dumps(payload, salt=SALTS[kind], compress=True)
+
+
+def issue_tokens(account, family=None):
+    """
+    A new access/refresh token pair for the account, in `family` when it
+    comes from a refresh, or in a new family at login.
+    """
+    family = family or uuid.uuid4().hex
+    return {
+        "access": _issue(account.pk, account.account_role, ACCESS, family),
+        "refresh": _issue(account.pk, account.account_role, REFRESH, family),
+        "expires_in": _lifetime(ACCESS),
+    }
+
+
+def _decode(token, kind):
+    # Tokens come straight from request bodies and headers, so anything that is not one is just invalid.
+    if not isinstance(token, str):
+        raise InvalidToken("Invalid token.")
+    try:
+        payload = signing.loads(token, salt=SALTS[kind])
+    except (signing.BadSignature, TypeError, ValueError):
+        raise InvalidToken("Invalid token.")
+    if not isinstance(payload, dict) or payload.get("typ") != kind:
+        raise InvalidToken("Wrong token type.")
+    expires = payload.get("exp")
+    if not isinstance(expires, (int, float)) or expires <= time.time():
+        raise InvalidToken("Token has expired.")
+    return payload
+
+
+def verify(token, kind=ACCESS):
+    """
+    The payload of a valid, unexpired, unrevoked token of the given kind:
+    {'sub': account_id, 'role', 'typ', 'jti', 'fam', 'exp'}. Checks the
+    signature and the process-wide revocation list only, so no auth table
+    is read.
+    """
+    payload = _decode(token, kind)
+    revoked = revocation_list.jtis()
+    if payload["jti"] in revoked or payload.get("fam") in revoked:
+        raise InvalidToken("Token has been revoked.")
+    return payload
+
+
+def revoke(payload):
+    """
+    Revoke a verified token payload, in every worker within
+    TOKEN_REVOCATION_POLL_INTERVAL. Returns False if it already was.
+    """
+    RevokedToken = apps.get_model("authentication", "RevokedToken")
+    revoked = RevokedToken.objects.revoke(payload)
+    transaction.on_commit(revocation_list.invalidate)
+    return revoked
+
+
+def refresh(token):
+    """
+    Exchange a refresh token for a new pair, reading the account again so
+    role changes and deleted accounts take effect. The old refresh token is
+    revoked (rotation). Whether it was already revoked is decided by the
+    revocation insert, not the cached list, so a refresh token used twice
+    is caught even before other workers poll; its whole family is then
+    revoked, since one of its holders is not the client it was issued to.
+    """
+    RevokedToken = apps.get_model("authentication", "RevokedToken")
+    Account = apps.get_model("authentication", "Account")
+    payload = _decode(token, REFRESH)
+    if payload.get("fam") in revocation_list:
+        raise InvalidToken("Token has been revoked.")
+    account = Account.objects.filter(pk=payload["sub"]).only("account_id", "account_role").first()
+    if account is None:
+        raise InvalidToken("Account no longer exists.")
+    with transaction.atomic():
+        rotated = revoke(payload)
+        if not rotated:
+            RevokedToken.objects.revoke_family(payload, _lifetime(REFRESH))
+    if not rotated:
+        raise InvalidToken("Token has been revoked.")
+    return issue_tokens(account, payload.get("fam"))
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path("token/", views.token_obtain, name="token_obtain"),
+    path("token/refresh/", views.token_refresh, name="token_refresh"),
+    path("token/revoke/", views.token_revoke, name="token_revoke"),
+]
@@ -1,3 +1,56 @@
-from django.shortcuts import render
+import json
 
-# Create your views here.
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .credentials import CredentialServiceBusy, credentials
+from .tokens import REFRESH, InvalidToken, issue_tokens, refresh, revoke, verify
+
+
+def _body(request):
+    try:
+        body = json.loads(request.body or b"{}")
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+@csrf_exempt
+@require_POST
+def token_obtain(request):
+    body = _body(request)
+    username, password = body.get("username"), body.get("password")
+    if not username or not password:
+        return JsonResponse({"detail": "username and password are required."}, status=400)
+    try:
+        account = credentials.authenticate(username, password)
+    except CredentialServiceBusy as exc:
+        return JsonResponse({"detail": str(exc)}, status=503, headers={"Retry-After": "1"})
+    if account is None:
+        return JsonResponse({"detail": "Invalid username or password."}, status=401)
+    return JsonResponse(issue_tokens(account))
+
+
+@csrf_exempt
+@require_POST
+def token_refresh(request):
+    try:
+        return JsonResponse(refresh(_body(request).get("refresh", "")))
+    except InvalidToken as exc:
+        return JsonResponse({"detail": str(exc)}, status=401)
+
+
+@csrf_exempt
+@require_POST
+def token_revoke(request):
+    """Log out: revoke the refresh token in the body and the access token the request was made with, if any."""
+    try:
+        payload = verify(_body(request).get("refresh", ""), REFRESH)
+    except InvalidToken as exc:
+        return JsonResponse({"detail": str(exc)}, status=401)
+    revoke(payload)
+    if getattr(request, "token", None) is not None:
+        revoke(request.token)
+    # 205 Reset Content must not carry a body.
+    return HttpResponse(status=205)
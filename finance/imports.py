@@ -0,0 +1,51 @@
+# imports.py
+import csv
+import json
+
+FORMATS = ("csv", "json", "jsonl")
+
+
+class UnreadableRow:
+    """Stands in for a line that could not be parsed, so it is reported like any other invalid row."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def read_payment_rows(stream, fmt):
+    """
+    Yield (line number, row) pairs from a text stream without loading
+    CSV/JSON-lines input whole. A line that does not parse is yielded as an
+    UnreadableRow. A JSON document that does not parse or is not a list is
+    rejected with ValueError before any row is yielded.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as exc:
+                row = UnreadableRow(str(exc))
+            yield reader.line_num, row
+    elif fmt == "jsonl":
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                row = UnreadableRow(str(exc))
+            yield line_number, row
+    elif fmt == "json":
+        try:
+            rows = json.load(stream)
+        except ValueError as exc:
+            raise ValueError(f"Invalid JSON document: {exc}")
+        if not isinstance(rows, list):
+            raise ValueError("A JSON payment file must be a list of rows.")
+        yield from enumerate(rows, start=1)
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.managers import ARCHIVE_SOURCES, month_bounds
+from finance.models import DocumentArchive
+
+
+class Command(BaseCommand):
+    help = "Move issues, receipts and payments dated before a month into the compressed document archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", required=True, help="First month kept live (YYYY-MM).")
+        parser.add_argument("--type", dest="doc_types", action="append", choices=sorted(ARCHIVE_SOURCES),
+                            help="Document type to archive (repeatable), defaults to all.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would be archived.")
+
+    def handle(self, *args, **options):
+        try:
+            cutoff = month_bounds(options["before"])[0]
+        except ValueError:
+            raise CommandError("--before must be given as YYYY-MM.")
+        try:
+            result = DocumentArchive.objects.archive(cutoff, options["doc_types"], dry_run=options["dry_run"])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        verb = "Would archive" if options["dry_run"] else "Archived"
+        for doc_type, counts in result.items():
+            self.stdout.write(f"{verb} {counts['documents']} {doc_type}(s) into {counts['archives']} archive row(s).")
+        self.stdout.write(self.style.SUCCESS("Done."))
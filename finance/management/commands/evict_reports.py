@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from finance.models import Report
+
+
+class Command(BaseCommand):
+    help = "Delete cached reports that have been superseded by a newer build of the same report."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grace", type=int, help="Keep superseded reports younger than this many seconds.")
+
+    def handle(self, *args, **options):
+        grace = timedelta(seconds=options["grace"]) if options["grace"] is not None else None
+        deleted = Report.objects.evict_stale(grace)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} row(s) of stale reports."))
@@ -0,0 +1,54 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.imports import FORMATS
+from finance.models import Payment
+
+
+class Command(BaseCommand):
+    help = "Import a bank file of payments (CSV, JSON or JSON lines) and decrease agency debts in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input file, or - for stdin.")
+        parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension.")
+        parser.add_argument("--user-id", type=int, help="Collector user id for rows that have none.")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--dry-run", action="store_true", help="Validate only, write nothing.")
+        parser.add_argument("--errors", help="Write the per-row error report to this CSV file.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or path.rsplit(".", 1)[-1].lower()
+        if fmt not in FORMATS:
+            raise CommandError(f"Cannot infer the format of {path}, use --format.")
+
+        stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        try:
+            report = Payment.objects.import_stream(
+                stream, fmt,
+                user_id=options["user_id"],
+                batch_size=options["batch_size"],
+                dry_run=options["dry_run"],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        if options["errors"] and report["errors"]:
+            with open(options["errors"], "w", newline="", encoding="utf-8") as out:
+                writer = csv.writer(out)
+                writer.writerow(["row", "field", "error"])
+                for entry in report["errors"]:
+                    for field, message in entry["errors"].items():
+                        writer.writerow([entry["row"], field, message])
+
+        seconds = sum(timings["total"] for timings in report["timings"])
+        verb = "Validated" if options["dry_run"] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {report['imported']} payment(s), {len(report['errors'])} row(s) rejected, "
+            f"{len(report['timings'])} batch(es) posted in {seconds:.3f}s."
+        ))
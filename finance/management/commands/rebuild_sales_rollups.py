@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.managers import month_bounds
+from finance.models import SalesRollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily sales rollup for a month range from the issue table, or compact pending deltas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="first_month", help="First month (YYYY-MM).")
+        parser.add_argument("--to", dest="last_month", help="Last month (YYYY-MM), defaults to --from.")
+        parser.add_argument("--compact", action="store_true", help="Fold pending deltas into one row per day.")
+
+    def handle(self, *args, **options):
+        if options["compact"]:
+            rows = SalesRollup.objects.compact()
+            self.stdout.write(self.style.SUCCESS(f"Compacted sales rollups into {rows} row(s)."))
+            return
+
+        first_month = options["first_month"]
+        last_month = options["last_month"] or first_month
+        if not first_month:
+            raise CommandError("--from is required unless --compact is given.")
+        try:
+            month_bounds(first_month)
+            month_bounds(last_month)
+        except ValueError:
+            raise CommandError("Months must be given as YYYY-MM.")
+        rows = SalesRollup.objects.rebuild(first_month, last_month)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} daily sales row(s) for {first_month}..{last_month}."))
@@ -0,0 +1,55 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from finance.models import ReportJob
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Run queued report jobs on a local thread pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="Number of jobs built concurrently.")
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between polls of an idle queue.")
+        parser.add_argument("--stale-after", type=int, default=300,
+                            help="Requeue running jobs whose heartbeat is older than this many seconds "
+                                 "(keep it well above REPORT_JOB_HEARTBEAT_INTERVAL).")
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit.")
+
+    def handle(self, *args, **options):
+        workers = max(1, options["workers"])
+        running = set()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-worker") as pool:
+            while True:
+                # Take back the jobs of workers that have died; this worker's own jobs keep their heartbeat.
+                requeued = ReportJob.objects.requeue_stale(timezone.now() - timedelta(seconds=options["stale_after"]))
+                if requeued:
+                    self.stdout.write(f"Requeued {requeued} stale job(s).")
+                running = {future for future in running if not future.done()}
+                claimed = ReportJob.objects.claim(workers - len(running)) if len(running) < workers else []
+                for job in claimed:
+                    running.add(pool.submit(self._run, job))
+                if options["once"] and not claimed and not running:
+                    break
+                if not claimed:
+                    time.sleep(options["poll_interval"])
+                close_old_connections()
+
+    def _run(self, job):
+        try:
+            report = ReportJob.objects.execute(job)
+            job.refresh_from_db()
+            logger.info("Report job %s done in %.3fs (waited %.3fs): report #%s",
+                        job.pk, job.run_seconds, job.wait_seconds, report.pk)
+        except Exception:
+            logger.exception("Report job %s failed", job.pk)
+        finally:
+            # Each pool thread has its own connection; do not leak it.
+            connection.close()
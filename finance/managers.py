@@ -1,25 +1,877 @@
 # managers.py
-from django.db import models
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, IntegrityError, connections, models, transaction
+from django.db.models import Count, Exists, Max, OuterRef, Q, Sum
+from django.db.models.functions import TruncMonth
 from django.utils import timezone
+from django.utils.translation import gettext as _
 from django.apps import apps
 
+from .imports import UnreadableRow, read_payment_rows
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentManager(models.Manager):
+    def post_payments(self, payments, locked=None):
+        """
+        Insert a batch of unsaved Payment objects for any number of agencies
+        and decrease their debts in the same transaction, via the batch debt
+        posting of AgencyManager.post_debts (`locked` is passed on to it).
+        Payments are inserted with bulk_create, so the per-payment debt signal
+        does not post them again.
+        """
+        Agency = apps.get_model("agency", "Agency")
+        payments = list(payments)
+        amounts = defaultdict(Decimal)
+        for payment in payments:
+            amounts[payment.agency_id] -= payment.amount_collected
+
+        started = time.perf_counter()
+        with transaction.atomic(using=self.db):
+            result = Agency.objects.db_manager(self.db).post_debts(amounts, locked=locked)
+            inserted_at = time.perf_counter()
+            result["payments"] = self.bulk_create(payments)
+        finished = time.perf_counter()
+        result["timings"]["insert"] = finished - inserted_at
+        result["timings"]["total"] = finished - started
+        return result
+
+    def import_stream(self, stream, fmt, **kwargs):
+        """Import a payment file (see read_payment_rows); errors are reported by source line number."""
+        return self._import(read_payment_rows(stream, fmt), **kwargs)
+
+    def import_rows(self, rows, user_id=None, batch_size=5000, dry_run=False):
+        """
+        Import payment rows (dicts with agency_id, amount_collected,
+        payment_date and optionally user_id) in batches. Each batch loads the
+        debts of all its agencies in one locking query, validates every row in
+        memory against the running balance, and posts the valid payments with
+        post_payments. Invalid rows are reported, never raised.
+        """
+        return self._import(enumerate(rows, start=1), user_id, batch_size, dry_run)
+
+    def _import(self, numbered_rows, user_id=None, batch_size=5000, dry_run=False):
+        report = {"imported": 0, "errors": [], "timings": []}
+        batch = []
+        for row_number, row in numbered_rows:
+            batch.append((row_number, row))
+            if len(batch) >= batch_size:
+                self._import_batch(batch, user_id, dry_run, report)
+                batch = []
+        if batch:
+            self._import_batch(batch, user_id, dry_run, report)
+        return report
+
+    def _import_batch(self, batch, user_id, dry_run, report):
+        Agency = apps.get_model("agency", "Agency")
+        parsed = []
+        for row_number, row in batch:
+            payment, errors = self._parse_row(row, user_id)
+            if errors:
+                report["errors"].append({"row": row_number, "errors": errors})
+            else:
+                parsed.append((row_number, payment))
+        if not parsed:
+            return
+
+        with transaction.atomic(using=self.db):
+            # Locked once here; post_payments reuses these rows instead of locking them again.
+            locked = Agency.objects.db_manager(self.db).lock_debts({payment.agency_id for _, payment in parsed})
+            debts = {agency_id: row[0] for agency_id, row in locked.items()}
+            valid = []
+            for row_number, payment in parsed:
+                remaining = debts.get(payment.agency_id)
+                if remaining is None:
+                    report["errors"].append({"row": row_number, "errors": {"agency_id": _("Agency does not exist.")}})
+                elif payment.amount_collected > remaining:
+                    report["errors"].append({
+                        "row": row_number,
+                        "errors": {"amount_collected": _("Collected amount cannot exceed agency debt.")},
+                    })
+                else:
+                    debts[payment.agency_id] = remaining - payment.amount_collected
+                    valid.append(payment)
+            if valid and not dry_run:
+                report["timings"].append(self.post_payments(valid, locked=locked)["timings"])
+            report["imported"] += len(valid)
+
+    def _parse_row(self, row, user_id):
+        if isinstance(row, UnreadableRow):
+            return None, {"row": _("Row could not be read: %(error)s") % {"error": row.error}}
+        if not isinstance(row, dict):
+            return None, {"row": _("Row must be an object.")}
+        errors = {}
+        values = {"created_at": timezone.now()}
+        try:
+            values["agency_id"] = int(row["agency_id"])
+        except (KeyError, TypeError, ValueError):
+            errors["agency_id"] = _("Agency id must be an integer.")
+        try:
+            amount = Decimal(str(row["amount_collected"]))
+            if not amount.is_finite() or amount <= 0:
+                raise ValueError
+            if amount != amount.quantize(Decimal("0.01")):
+                errors["amount_collected"] = _("Collected amount must have at most 2 decimal places.")
+            else:
+                values["amount_collected"] = amount
+        except (KeyError, InvalidOperation, ValueError):
+            errors["amount_collected"] = _("Collected amount must be a positive number.")
+        try:
+            payment_date = row["payment_date"]
+            values["payment_date"] = payment_date if isinstance(payment_date, date) else date.fromisoformat(payment_date)
+        except (KeyError, TypeError, ValueError):
+            errors["payment_date"] = _("Payment date must be YYYY-MM-DD.")
+        try:
+            values["user_id"] = int(row.get("user_id") or user_id)
+        except (TypeError, ValueError):
+            errors["user_id"] = _("User id is required.")
+        if errors:
+            return None, errors
+        return self.model(**values), None
+
 class ReportManager(models.Manager):
-    def create_debt_report(self, for_date, created_by):
-        DebtSummary = apps.get_model('finance', 'DebtSummary')
-        summary = list(DebtSummary.objects.all().values('agency_id', 'agency_name', 'debt_amount'))
-        return self.create(
-            report_type='debt',
-            report_date=for_date,
-            data=summary,
-            created_by=created_by
-        )
-
-    def create_sales_report(self, for_month, created_by):
-        SalesMonthly = apps.get_model('finance', 'SalesMonthly')
-        sales = list(SalesMonthly.objects.filter(month=for_month).values('month', 'total_sales'))
-        return self.create(
-            report_type='sales',
-            report_date=for_month + "-01",
-            data=sales,
-            created_by=created_by
-        )
\ No newline at end of file
+    SALES_BREAKDOWNS = ('item', 'district', 'agency_type')
+    AGING_BUCKETS = ('current', 'days_31_60', 'days_61_90', 'days_over_90')
+
+    def create_debt_report(self, for_date, created_by, group_by=None, chunk_size=None, compress=None, progress=None,
+                           reuse=True):
+        for_date = for_date if isinstance(for_date, date) else date.fromisoformat(for_date)
+        params = {'group_by': group_by} if group_by else {}
+        version = self._debt_source_version()
+        if reuse:
+            cached = self.cached('debt', for_date, params, version)
+            if cached is not None:
+                return cached
+        if for_date < timezone.localdate():
+            summary = self._debt_rows_as_of(for_date, group_by, chunk_size)
+        elif group_by is None:
+            Agency = apps.get_model('agency', 'Agency')
+            summary = (
+                Agency.objects.order_by('agency_id').values('agency_id', 'agency_name', 'debt_amount')
+                .iterator(chunk_size=self._chunk_size(chunk_size))
+            )
+        else:
+            summary = self._debt_rollup_rows(group_by)
+        return self._create_report('debt', for_date, summary, created_by, chunk_size, compress, progress,
+                                   params=params, source_version=version)
+
+    def _debt_rows_as_of(self, for_date, group_by, chunk_size):
+        """The debt report rows for a past date, from the debt snapshots (see DebtSnapshotManager)."""
+        Agency = apps.get_model('agency', 'Agency')
+        DebtSnapshot = apps.get_model('agency', 'DebtSnapshot')
+        chunk_size = self._chunk_size(chunk_size)
+        if group_by is None:
+            rows = DebtSnapshot.objects.balances(
+                Agency.objects.order_by('agency_id'), for_date, fields=('agency_name',), chunk_size=chunk_size
+            )
+            return (
+                {'agency_id': agency_id, 'agency_name': name, 'debt_amount': balance}
+                for agency_id, balance, name in rows
+            )
+        fields = {'district': ('district_id', 'district__district_name'),
+                  'agency_type': ('agency_type_id', 'agency_type__type_name')}
+        if group_by not in fields:
+            raise ValueError(f"Unsupported debt report grouping: {group_by}")
+        groups = {}
+        rows = DebtSnapshot.objects.balances(Agency.objects.order_by(), for_date, fields=fields[group_by],
+                                             chunk_size=chunk_size)
+        for agency_id, balance, scope_id, name in rows:
+            group = groups.setdefault(scope_id, {
+                group_by + '_id': scope_id, 'name': name, 'agency_count': 0, 'debtor_count': 0,
+                'total_debt': Decimal(0),
+            })
+            group['agency_count'] += 1
+            group['debtor_count'] += balance > 0
+            group['total_debt'] += balance
+        return [groups[scope_id] for scope_id in sorted(groups)]
+
+    def _debt_rollup_rows(self, group_by):
+        DebtRollup = apps.get_model('agency', 'DebtRollup')
+        names = {
+            DebtRollup.DISTRICT: ('District', 'district_name'),
+            DebtRollup.AGENCY_TYPE: ('AgencyType', 'type_name'),
+        }
+        if group_by not in names:
+            raise ValueError(f"Unsupported debt report grouping: {group_by}")
+        model_name, name_field = names[group_by]
+        labels = dict(apps.get_model('agency', model_name).objects.values_list('pk', name_field))
+        return [
+            {
+                group_by + '_id': row['scope_id'],
+                'name': labels.get(row['scope_id']),
+                'agency_count': row['agency_count'],
+                'debtor_count': row['debtor_count'],
+                'total_debt': row['total_debt'],
+            }
+            for row in DebtRollup.objects.totals(group_by)
+        ]
+
+    def create_sales_report(self, for_month, created_by, progress=None, reuse=True, to_month=None, breakdown=None):
+        """
+        Sales of `for_month`, or of every month up to `to_month` inclusive,
+        optionally broken down by item, district or agency type (see
+        sales_table). Without a breakdown the rows keep the original
+        {'month', 'total_sales'} shape.
+        """
+        to_month = to_month or for_month
+        params = {}
+        if to_month != for_month:
+            params['to_month'] = to_month
+        if breakdown:
+            params['breakdown'] = breakdown
+        version = self._sales_source_version(for_month, to_month)
+        if reuse:
+            cached = self.cached('sales', for_month + "-01", params, version)
+            if cached is not None:
+                return cached
+        table = self.sales_table(for_month, to_month, breakdown)
+        columns = table['columns'] if breakdown else ['month', 'total_sales']
+        positions = [table['columns'].index(column) for column in columns]
+        sales = [{column: row[i] for column, i in zip(columns, positions)} for row in table['rows']]
+        return self._create_report('sales', for_month + "-01", sales, created_by, progress=progress,
+                                   params=params, source_version=version)
+
+    def sales_table(self, first_month, last_month, breakdown=None):
+        """
+        Monthly sales for the inclusive month range computed in one grouped
+        query, as {'columns': [...], 'rows': [[...], ...]}. Without a
+        breakdown the daily sales rollup is read; with one, issues (or issue
+        lines for 'item') are grouped by month and the breakdown key, ordered
+        by key then month for year-over-year comparison.
+        """
+        start = month_bounds(first_month)[0]
+        end = month_bounds(last_month)[1]
+        if breakdown is None:
+            SalesRollup = apps.get_model('finance', 'SalesRollup')
+            rows = SalesRollup.objects.monthly(first_month, last_month)
+            return {
+                'columns': ['month', 'total_sales', 'issue_count'],
+                'rows': [[row['month'], row['total_sales'], row['issue_count']] for row in rows],
+            }
+        if breakdown not in self.SALES_BREAKDOWNS:
+            raise ValueError(f"Unsupported sales breakdown: {breakdown}")
+
+        if breakdown == 'item':
+            Issuedetail = apps.get_model('inventory', 'Issuedetail')
+            grouped = (
+                Issuedetail.objects.filter(issue__issue_date__gte=start, issue__issue_date__lt=end)
+                .annotate(period=TruncMonth('issue__issue_date')).order_by('item_id', 'period')
+                .values('item_id', 'period')
+                .annotate(total_sales=Sum('line_total'), quantity=Sum('quantity'), issue_count=Count('issue_id'))
+            )
+            totals = {
+                (row['item_id'], row['period']): [row['total_sales'], row['quantity'], row['issue_count']]
+                for row in grouped
+            }
+            # Lines of archived issues only exist inside the archive payloads.
+            DocumentArchive = apps.get_model('finance', 'DocumentArchive')
+            for document in DocumentArchive.objects.db_manager(self.db).archived('issue', start, end):
+                for line in document['details']:
+                    entry = totals.setdefault((line['item_id'], document['date'].replace(day=1)), [Decimal(0), 0, 0])
+                    entry[0] += line['line_total']
+                    entry[1] += line['quantity']
+                    entry[2] += 1
+            return {
+                'columns': ['item_id', 'month', 'total_sales', 'quantity', 'issue_count'],
+                'rows': [
+                    [item_id, period.strftime('%Y-%m'), *entry]
+                    for (item_id, period), entry in sorted(totals.items())
+                ],
+            }
+
+        # Issue.agency_id is not a foreign key, so the agency join is written out.
+        # Archived months are read from their per-agency summaries.
+        Issue = apps.get_model('inventory', 'Issue')
+        Agency = apps.get_model('agency', 'Agency')
+        DocumentArchive = apps.get_model('finance', 'DocumentArchive')
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        key = quote(breakdown + '_id')
+        sql = (
+            f"SELECT a.{key}, i.month, SUM(i.total_amount), SUM(i.issue_count) FROM ("
+            f"  SELECT agency_id, date_trunc('month', issue_date)::date AS month, total_amount, 1 AS issue_count"
+            f"  FROM {quote(Issue._meta.db_table)} WHERE issue_date >= %(start)s AND issue_date < %(end)s"
+            f"  UNION ALL"
+            f"  SELECT agency_id, month, total_amount, document_count FROM {quote(DocumentArchive._meta.db_table)}"
+            f"  WHERE doc_type = 'issue' AND month >= %(start)s AND month < %(end)s"
+            f") i JOIN {quote(Agency._meta.db_table)} a ON a.agency_id = i.agency_id "
+            f"GROUP BY 1, 2 ORDER BY 1, 2"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {'start': start, 'end': end})
+            rows = cursor.fetchall()
+        return {
+            'columns': [breakdown + '_id', 'month', 'total_sales', 'issue_count'],
+            'rows': [[scope_id, period.strftime('%Y-%m'), total, count] for scope_id, period, total, count in rows],
+        }
+
+    def create_aging_report(self, as_of, created_by, progress=None, reuse=True):
+        version = self._debt_source_version()
+        if reuse:
+            cached = self.cached('aging', as_of, {}, version)
+            if cached is not None:
+                return cached
+        return self._create_report('aging', as_of, self.aging_rows(as_of), created_by, progress=progress,
+                                   source_version=version)
+
+    def aging_rows(self, as_of, fetch_size=2000):
+        """
+        Yield each indebted agency's outstanding issue amounts by age on
+        `as_of`. Payments are allocated to the oldest issues first (FIFO):
+        a window SUM gives every issue's running total per agency, and an
+        issue is open for whatever part of it the agency's total payments
+        have not covered. Uses the (agency_id, issue_date) and
+        (agency_id, payment_date) indexes. Archived documents count by their
+        per-agency monthly summaries, each dated by its last document.
+        """
+        Issue = apps.get_model('inventory', 'Issue')
+        Payment = apps.get_model('finance', 'Payment')
+        DocumentArchive = apps.get_model('finance', 'DocumentArchive')
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        archive = quote(DocumentArchive._meta.db_table)
+        sql = (
+            f"WITH paid AS ("
+            f"  SELECT agency_id, SUM(amount) AS paid FROM ("
+            f"    SELECT agency_id, amount_collected AS amount FROM {quote(Payment._meta.db_table)}"
+            f"    WHERE payment_date <= %(as_of)s"
+            f"    UNION ALL"
+            f"    SELECT agency_id, total_amount FROM {archive}"
+            f"    WHERE doc_type = 'payment' AND last_date <= %(as_of)s"
+            f"  ) p GROUP BY agency_id"
+            f"), issues AS ("
+            f"  SELECT agency_id, issue_date, issue_id, total_amount FROM {quote(Issue._meta.db_table)}"
+            f"  WHERE issue_date <= %(as_of)s"
+            f"  UNION ALL"
+            f"  SELECT agency_id, last_date, -archive_id, total_amount FROM {archive}"
+            f"  WHERE doc_type = 'issue' AND last_date <= %(as_of)s"
+            f"), issued AS ("
+            f"  SELECT agency_id, issue_date, total_amount,"
+            f"    SUM(total_amount) OVER (PARTITION BY agency_id ORDER BY issue_date, issue_id) AS running"
+            f"  FROM issues"
+            f"), open_issues AS ("
+            f"  SELECT i.agency_id, %(as_of)s::date - i.issue_date AS age,"
+            f"    LEAST(i.total_amount, GREATEST(i.running - COALESCE(p.paid, 0), 0)) AS outstanding"
+            f"  FROM issued i LEFT JOIN paid p ON p.agency_id = i.agency_id"
+            f") "
+            f"SELECT agency_id,"
+            f"  COALESCE(SUM(outstanding) FILTER (WHERE age <= 30), 0),"
+            f"  COALESCE(SUM(outstanding) FILTER (WHERE age > 30 AND age <= 60), 0),"
+            f"  COALESCE(SUM(outstanding) FILTER (WHERE age > 60 AND age <= 90), 0),"
+            f"  COALESCE(SUM(outstanding) FILTER (WHERE age > 90), 0),"
+            f"  SUM(outstanding) "
+            f"FROM open_issues GROUP BY agency_id HAVING SUM(outstanding) > 0 ORDER BY agency_id"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {'as_of': as_of})
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for agency_id, *buckets, total in rows:
+                    yield {'agency_id': agency_id, **dict(zip(self.AGING_BUCKETS, buckets)), 'total': total}
+
+    def _debt_source_version(self):
+        # Every debt posting, and every agency create/delete/move saved through the ORM (see the Agency
+        # receivers in agency.signals), appends a rollup row, so the latest rollup id changes with the
+        # debt data. Renames and queryset.update() calls do not; REPORT_CACHE_TTL bounds those.
+        Agency = apps.get_model('agency', 'Agency')
+        DebtRollup = apps.get_model('agency', 'DebtRollup')
+        agencies = Agency.objects.order_by().aggregate(count=Count('pk'), last=Max('pk'))
+        rollups = DebtRollup.objects.order_by().aggregate(last=Max('rollup_id'))
+        return f"{agencies['count']}:{agencies['last']}:{rollups['last']}"
+
+    def _sales_source_version(self, first_month, last_month):
+        SalesRollup = apps.get_model('finance', 'SalesRollup')
+        start = month_bounds(first_month)[0]
+        end = month_bounds(last_month)[1]
+        rows = SalesRollup.objects.filter(sales_date__gte=start, sales_date__lt=end).order_by().aggregate(
+            total=Sum('total_sales'), issues=Sum('issue_count'), last=Max('rollup_id'),
+        )
+        return f"{rows['total']}:{rows['issues']}:{rows['last']}"
+
+    def cached(self, report_type, report_date, params, source_version):
+        """The newest report built from the same inputs within REPORT_CACHE_TTL seconds, if any."""
+        ttl = getattr(settings, 'REPORT_CACHE_TTL', 3600)
+        if not ttl:
+            return None
+        return (
+            self.filter(
+                report_type=report_type,
+                report_date=report_date,
+                params_key=json.dumps(params, sort_keys=True),
+                source_version=source_version,
+                created_at__gte=timezone.now() - timedelta(seconds=ttl),
+            )
+            .order_by('-created_at').first()
+        )
+
+    def evict_stale(self, grace=None):
+        """
+        Delete cached reports superseded by a newer one for the same type,
+        date and parameters, once they are older than `grace` (defaults to
+        REPORT_CACHE_GRACE seconds). Reports without a source version are kept.
+        """
+        if grace is None:
+            grace = timedelta(seconds=getattr(settings, 'REPORT_CACHE_GRACE', 86400))
+        newer = self.filter(
+            report_type=OuterRef('report_type'),
+            report_date=OuterRef('report_date'),
+            params_key=OuterRef('params_key'),
+            created_at__gt=OuterRef('created_at'),
+        )
+        stale = self.filter(source_version__isnull=False, created_at__lt=timezone.now() - grace).filter(Exists(newer))
+        deleted, _by_model = stale.delete()
+        return deleted
+
+    def _chunk_size(self, chunk_size=None):
+        return chunk_size or getattr(settings, 'REPORT_CHUNK_SIZE', 1000)
+
+    def _create_report(self, report_type, report_date, rows, created_by, chunk_size=None, compress=None,
+                       progress=None, params=None, source_version=None):
+        """
+        Store `rows` (any iterable, consumed once) as a report. Up to one
+        chunk of rows stays inline in Report.data; larger results are written
+        as ReportChunk rows of at most chunk_size rows each, optionally zlib
+        compressed, and Report.data only keeps their layout. `progress` is
+        called with the number of rows written so far.
+        """
+        chunk_size = self._chunk_size(chunk_size)
+        if compress is None:
+            compress = getattr(settings, 'REPORT_COMPRESS', False)
+        ReportChunk = apps.get_model('finance', 'ReportChunk')
+        rows = iter(rows)
+        chunk = list(islice(rows, chunk_size + 1))
+        if len(chunk) <= chunk_size:
+            report = self.create(
+                report_type=report_type,
+                report_date=report_date,
+                data=chunk,
+                created_by=created_by,
+                created_at=timezone.now(),
+                params_key=json.dumps(params or {}, sort_keys=True),
+                source_version=source_version,
+            )
+            if progress is not None:
+                progress(len(chunk))
+            return report
+
+        with transaction.atomic(using=self.db):
+            report = self.create(
+                report_type=report_type,
+                report_date=report_date,
+                data={'chunked': True},
+                created_by=created_by,
+                created_at=timezone.now(),
+                params_key=json.dumps(params or {}, sort_keys=True),
+                source_version=source_version,
+            )
+            sequence = 0
+            row_count = 0
+            while chunk:
+                current, pending = chunk[:chunk_size], chunk[chunk_size:]
+                ReportChunk.objects.using(self.db).create(report=report, sequence=sequence, **ReportChunk.pack(current, compress))
+                sequence += 1
+                row_count += len(current)
+                if progress is not None:
+                    progress(row_count)
+                chunk = pending + list(islice(rows, chunk_size - len(pending)))
+            report.data = {
+                'chunked': True,
+                'row_count': row_count,
+                'chunk_count': sequence,
+                'chunk_size': chunk_size,
+                'compressed': compress,
+            }
+            report.save(update_fields=['data'])
+        return report
+
+
+class JobHeartbeat(threading.Thread):
+    """
+    Writes a running job's heartbeat_at and progress every
+    REPORT_JOB_HEARTBEAT_INTERVAL seconds, and as soon as progress is
+    reported. It runs in its own thread, hence on its own connection:
+    reports are built inside a transaction, and updates made through the
+    worker's connection would stay invisible to other connections until the
+    job commits.
+    """
+
+    def __init__(self, manager, job_id):
+        super().__init__(name=f"report-job-{job_id}-heartbeat", daemon=True)
+        self.manager = manager
+        self.job_id = job_id
+        self.interval = getattr(settings, 'REPORT_JOB_HEARTBEAT_INTERVAL', 30)
+        self.rows = None
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def progress(self, rows):
+        self.rows = rows
+        self._wake.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+        # A write still waiting on a lock must not hold up the job; it only touches a running job.
+        self.join(self.interval)
+
+    def run(self):
+        try:
+            while True:
+                self._wake.wait(self.interval)
+                self._wake.clear()
+                if self._stopping.is_set():
+                    break
+                values = {'heartbeat_at': timezone.now()}
+                if self.rows is not None:
+                    values['progress'] = self.rows
+                try:
+                    self.manager.filter(pk=self.job_id, status=self.manager.model.RUNNING).update(**values)
+                except DatabaseError:
+                    # The next beat retries; requeue_stale only fires after several missed ones.
+                    logger.warning("Heartbeat of report job %s failed", self.job_id, exc_info=True)
+        finally:
+            connections[self.manager.db].close()
+
+
+class ReportJobManager(models.Manager):
+    """
+    Queue of report builds. enqueue() coalesces requests for the same report
+    into the job already queued or running; workers claim jobs with
+    SKIP LOCKED so any number of them can poll the same queue. A running job
+    is kept alive by its heartbeat (see JobHeartbeat); requeue_stale() only
+    takes back jobs whose heartbeat has stopped.
+    """
+
+    def enqueue(self, report_type, report_date, created_by, **params):
+        key = json.dumps(params, sort_keys=True, cls=DjangoJSONEncoder)
+        active = self.filter(
+            report_type=report_type, report_date=report_date, params_key=key,
+            status__in=[self.model.QUEUED, self.model.RUNNING],
+        )
+        job = active.first()
+        if job is not None:
+            return job
+        try:
+            with transaction.atomic(using=self.db):
+                return self.create(
+                    report_type=report_type, report_date=report_date, params=params, params_key=key,
+                    created_by=created_by, created_at=timezone.now(),
+                )
+        except IntegrityError:
+            # Another request queued the same report in the meantime.
+            return active.get()
+
+    def claim(self, limit=1):
+        """Mark up to `limit` queued jobs as running and return them."""
+        with transaction.atomic(using=self.db):
+            jobs = list(
+                self.select_for_update(skip_locked=True).filter(status=self.model.QUEUED)
+                .order_by('created_at', 'job_id')[:limit]
+            )
+            if jobs:
+                now = timezone.now()
+                self.filter(pk__in=[job.pk for job in jobs]).update(
+                    status=self.model.RUNNING, started_at=now, heartbeat_at=now,
+                )
+                for job in jobs:
+                    job.status, job.started_at, job.heartbeat_at = self.model.RUNNING, now, now
+        return jobs
+
+    def requeue_stale(self, older_than):
+        """Put back running jobs whose last heartbeat is older than `older_than`: their worker has died."""
+        stale = Q(heartbeat_at__lt=older_than) | Q(heartbeat_at__isnull=True, started_at__lt=older_than)
+        return self.filter(stale, status=self.model.RUNNING).update(
+            status=self.model.QUEUED, started_at=None, heartbeat_at=None, progress=0,
+        )
+
+    def execute(self, job):
+        Report = apps.get_model('finance', 'Report')
+        heartbeat = JobHeartbeat(self, job.pk)
+        heartbeat.start()
+        progress = heartbeat.progress
+        try:
+            if job.report_type == Report.DEBT:
+                report = Report.objects.create_debt_report(job.report_date, job.created_by, progress=progress, **job.params)
+            elif job.report_type == Report.AGING:
+                report = Report.objects.create_aging_report(job.report_date, job.created_by, progress=progress, **job.params)
+            elif job.report_type == Report.SALES:
+                report = Report.objects.create_sales_report(
+                    job.report_date.strftime('%Y-%m'), job.created_by, progress=progress, **job.params
+                )
+            else:
+                raise ValueError(f"Unsupported report type: {job.report_type}")
+        except Exception as exc:
+            heartbeat.stop()
+            job.status, job.error = self.model.FAILED, f"{type(exc).__name__}: {exc}"
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'error', 'finished_at'])
+            raise
+        heartbeat.stop()
+        job.status, job.report, job.finished_at = self.model.DONE, report, timezone.now()
+        job.progress = heartbeat.rows or 0
+        job.save(update_fields=['status', 'report', 'finished_at', 'progress'])
+        return report
+
+
+def month_bounds(month):
+    """'YYYY-MM' -> (first day of the month, first day of the next month)."""
+    year, month = (int(part) for part in month.split("-"))
+    start = date(year, month, 1)
+    end = date(year + month // 12, month % 12 + 1, 1)
+    return start, end
+
+
+class SalesRollupManager(models.Manager):
+    """
+    Daily sales kept as append-only delta rows, written as issues are posted
+    so that no posting waits on a shared per-day row. compact() folds them
+    to one row per day; monthly() reads at most ~31 rows per month.
+    """
+
+    def record(self, entries):
+        """Append [(sales_date, amount_delta, issue_count_delta), ...] with a single insert."""
+        now = timezone.now()
+        return self.bulk_create([
+            self.model(sales_date=sales_date, total_sales=amount, issue_count=count, created_at=now)
+            for sales_date, amount, count in entries
+            if amount or count
+        ])
+
+    def daily(self, start, end):
+        return list(
+            self.filter(sales_date__gte=start, sales_date__lt=end).order_by("sales_date")
+            .values("sales_date").annotate(total_sales=Sum("total_sales"), issue_count=Sum("issue_count"))
+        )
+
+    def monthly(self, first_month, last_month):
+        """Sales per 'YYYY-MM' month for the inclusive month range."""
+        start = month_bounds(first_month)[0]
+        end = month_bounds(last_month)[1]
+        rows = (
+            self.filter(sales_date__gte=start, sales_date__lt=end)
+            .annotate(period=TruncMonth("sales_date")).order_by("period")
+            .values("period").annotate(total_sales=Sum("total_sales"), issue_count=Sum("issue_count"))
+        )
+        return [
+            {"month": row["period"].strftime("%Y-%m"), "total_sales": row["total_sales"], "issue_count": row["issue_count"]}
+            for row in rows
+        ]
+
+    def compact(self):
+        """Fold every delta row into one row per day in a single statement."""
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        sql = (
+            f"WITH folded AS (DELETE FROM {table} RETURNING sales_date, total_sales, issue_count) "
+            f"INSERT INTO {table} (sales_date, total_sales, issue_count, created_at) "
+            f"SELECT sales_date, SUM(total_sales), SUM(issue_count), %s FROM folded GROUP BY sales_date"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [timezone.now()])
+            return cursor.rowcount
+
+    def rebuild(self, first_month, last_month):
+        """Recompute the daily rows of the inclusive month range from the issue table and its archive."""
+        Issue = apps.get_model("inventory", "Issue")
+        start = month_bounds(first_month)[0]
+        end = month_bounds(last_month)[1]
+        connection = connections[self.db]
+        now = timezone.now()
+        with transaction.atomic(using=self.db):
+            # Hold back concurrent postings so none of their deltas is lost or counted twice.
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LOCK TABLE {connection.ops.quote_name(self.model._meta.db_table)} IN EXCLUSIVE MODE")
+            days = (
+                Issue.objects.using(self.db).filter(issue_date__gte=start, issue_date__lt=end)
+                .order_by().values("issue_date").annotate(total=Sum("total_amount"), count=Count("pk"))
+            )
+            totals = defaultdict(lambda: [Decimal(0), 0])
+            for day in days:
+                totals[day["issue_date"]] = [day["total"], day["count"]]
+            # Archived issues are gone from the issue table; their days are read back from the archive.
+            DocumentArchive = apps.get_model("finance", "DocumentArchive")
+            for document in DocumentArchive.objects.db_manager(self.db).archived("issue", start, end):
+                totals[document["date"]][0] += document["amount"]
+                totals[document["date"]][1] += 1
+            rows = [
+                self.model(sales_date=sales_date, total_sales=total, issue_count=count, created_at=now)
+                for sales_date, (total, count) in sorted(totals.items())
+            ]
+            self.filter(sales_date__gte=start, sales_date__lt=end).delete()
+            self.bulk_create(rows)
+        return len(rows)
+
+
+ARCHIVE_SOURCES = {
+    "issue": {"model": ("inventory", "Issue"), "detail": ("inventory", "Issuedetail"),
+              "date": "issue_date", "amount": "total_amount"},
+    "receipt": {"model": ("inventory", "Receipt"), "detail": ("inventory", "Receiptdetail"),
+                "date": "receipt_date", "amount": "total_amount"},
+    "payment": {"model": ("finance", "Payment"), "detail": None,
+                "date": "payment_date", "amount": "amount_collected"},
+}
+ARCHIVE_DETAIL_FIELDS = ("item_id", "quantity", "unit_price", "line_total")
+
+
+class DocumentArchiveManager(models.Manager):
+    """
+    Moves closed documents out of the issue, receipt and payment tables into
+    one compressed row per document type, agency and month, and reads them
+    back: archived() yields archived documents only, read() merges them with
+    the live tables, so callers do not need to know where the cutoff is.
+    """
+
+    def _source(self, doc_type):
+        if doc_type not in ARCHIVE_SOURCES:
+            raise ValueError(f"Unsupported document type: {doc_type}")
+        source = ARCHIVE_SOURCES[doc_type]
+        model = apps.get_model(*source["model"])
+        detail = apps.get_model(*source["detail"]) if source["detail"] else None
+        return model, detail, source["date"], source["amount"]
+
+    def _live_documents(self, doc_type, queryset):
+        """The documents of `queryset` in the archived shape: id, date, agency_id, user_id, amount, created_at, details."""
+        model, detail, date_field, amount_field = self._source(doc_type)
+        pk = model._meta.pk.attname
+        documents = [
+            {"id": row[pk], "date": row[date_field], "agency_id": row["agency_id"], "user_id": row["user_id"],
+             "amount": row[amount_field], "created_at": row["created_at"]}
+            for row in queryset.order_by(date_field, pk).values(pk, date_field, "agency_id", "user_id",
+                                                                 amount_field, "created_at")
+        ]
+        if detail is not None:
+            parent = model._meta.model_name
+            lines = defaultdict(list)
+            details = (
+                detail.objects.using(self.db).filter(**{f"{parent}__in": queryset.order_by().values(pk)})
+                .order_by(f"{parent}_id", "item_id").values(f"{parent}_id", *ARCHIVE_DETAIL_FIELDS)
+            )
+            for line in details:
+                lines[line.pop(f"{parent}_id")].append(line)
+            for document in documents:
+                document["details"] = lines[document["id"]]
+        return documents
+
+    def archive(self, cutoff, doc_types=None, dry_run=False):
+        """
+        Archive every document dated before `cutoff`, the first day of a past
+        or the current month, one month per transaction. Rows are deleted with
+        plain DELETE statements so no delete signal reverses the stock, debt
+        or sales the documents once posted. Returns {doc_type: {'documents': n,
+        'archives': n}}.
+        """
+        if cutoff.day != 1 or cutoff > timezone.localdate().replace(day=1):
+            raise ValueError(_("The archive cutoff must be the first day of a month that has started."))
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        result = {}
+        for doc_type in doc_types or ARCHIVE_SOURCES:
+            model, detail, date_field, amount_field = self._source(doc_type)
+            months = (
+                model.objects.using(self.db).filter(**{f"{date_field}__lt": cutoff})
+                .annotate(period=TruncMonth(date_field)).order_by("period")
+                .values_list("period", flat=True).distinct()
+            )
+            counts = {"documents": 0, "archives": 0}
+            for month in list(months):
+                following = month_bounds(f"{month:%Y-%m}")[1]
+                with transaction.atomic(using=self.db):
+                    queryset = model.objects.using(self.db).filter(
+                        **{f"{date_field}__gte": month, f"{date_field}__lt": following}
+                    )
+                    # Lock the month's documents so none is edited between being copied and deleted.
+                    list(queryset.select_for_update().order_by().values_list("pk", flat=True))
+                    by_agency = defaultdict(list)
+                    for document in self._live_documents(doc_type, queryset):
+                        by_agency[document["agency_id"]].append(document)
+                    counts["documents"] += sum(len(documents) for documents in by_agency.values())
+                    counts["archives"] += len(by_agency)
+                    if dry_run:
+                        continue
+                    now = timezone.now()
+                    self.bulk_create([
+                        self.model(
+                            doc_type=doc_type, agency_id=agency_id, month=month,
+                            first_date=documents[0]["date"], last_date=documents[-1]["date"],
+                            document_count=len(documents),
+                            total_amount=sum((document["amount"] for document in documents), Decimal(0)),
+                            payload=self.model.pack(documents), created_at=now,
+                        )
+                        for agency_id, documents in by_agency.items()
+                    ])
+                    ids = [document["id"] for documents in by_agency.values() for document in documents]
+                    with connection.cursor() as cursor:
+                        for start in range(0, len(ids), 1000):
+                            chunk = ids[start:start + 1000]
+                            placeholders = ", ".join(["%s"] * len(chunk))
+                            if detail is not None:
+                                cursor.execute(
+                                    f"DELETE FROM {quote(detail._meta.db_table)} "
+                                    f"WHERE {quote(model._meta.pk.column)} IN ({placeholders})",
+                                    chunk,
+                                )
+                            cursor.execute(
+                                f"DELETE FROM {quote(model._meta.db_table)} "
+                                f"WHERE {quote(model._meta.pk.column)} IN ({placeholders})",
+                                chunk,
+                            )
+            result[doc_type] = counts
+        return result
+
+    def overlapping(self, doc_type, start=None, end=None, agency_id=None):
+        """Archive rows that may hold documents dated in [start, end)."""
+        queryset = self.filter(doc_type=doc_type)
+        if start is not None:
+            queryset = queryset.filter(last_date__gte=start)
+        if end is not None:
+            queryset = queryset.filter(first_date__lt=end)
+        if agency_id is not None:
+            queryset = queryset.filter(agency_id=agency_id)
+        return queryset.order_by("month", "agency_id", "archive_id")
+
+    def archived(self, doc_type, start=None, end=None, agency_id=None):
+        """Yield the archived documents dated in [start, end), decompressing only the rows that overlap it."""
+        for archive in self.overlapping(doc_type, start, end, agency_id).iterator():
+            for document in archive.documents():
+                if (start is None or document["date"] >= start) and (end is None or document["date"] < end):
+                    yield document
+
+    def read(self, doc_type, start=None, end=None, agency_id=None):
+        """Live and archived documents dated in [start, end), ordered by date and id."""
+        model, _detail, date_field, _amount = self._source(doc_type)
+        queryset = model.objects.using(self.db).all()
+        if start is not None:
+            queryset = queryset.filter(**{f"{date_field}__gte": start})
+        if end is not None:
+            queryset = queryset.filter(**{f"{date_field}__lt": end})
+        if agency_id is not None:
+            queryset = queryset.filter(agency_id=agency_id)
+        documents = self._live_documents(doc_type, queryset)
+        documents.extend(self.archived(doc_type, start, end, agency_id))
+        return sorted(documents, key=lambda document: (document["date"], document["id"]))
+
+    def total_before(self, doc_type, agency_id, before):
+        """Sum of the agency's archived document amounts dated before `before`."""
+        archives = self.overlapping(doc_type, end=before, agency_id=agency_id)
+        whole = archives.filter(last_date__lt=before).aggregate(total=Sum("total_amount"))["total"] or Decimal(0)
+        # Only an archive whose month straddles `before` has to be opened.
+        partial = sum(
+            (document["amount"] for archive in archives.filter(last_date__gte=before)
+             for document in archive.documents() if document["date"] < before),
+            Decimal(0),
+        )
+        return whole + partial
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:45
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("finance", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="report",
+            name="data",
+            field=models.JSONField(
+                db_column="data", encoder=django.core.serializers.json.DjangoJSONEncoder
+            ),
+        ),
+    ]
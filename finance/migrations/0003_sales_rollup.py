@@ -0,0 +1,48 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("finance", "0002_report_data_encoder"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SalesRollup",
+            fields=[
+                (
+                    "rollup_id",
+                    models.BigAutoField(
+                        db_column="rollup_id", primary_key=True, serialize=False
+                    ),
+                ),
+                ("sales_date", models.DateField(db_column="sales_date")),
+                (
+                    "total_sales",
+                    models.DecimalField(
+                        db_column="total_sales",
+                        decimal_places=2,
+                        default=0,
+                        max_digits=18,
+                    ),
+                ),
+                (
+                    "issue_count",
+                    models.IntegerField(db_column="issue_count", default=0),
+                ),
+                ("created_at", models.DateTimeField(db_column="created_at")),
+            ],
+            options={
+                "db_table": "salesrollup",
+                "ordering": ["sales_date"],
+                "indexes": [
+                    models.Index(
+                        fields=["sales_date"], name="salesrollup_sales_d_778aa8_idx"
+                    )
+                ],
+            },
+        ),
+    ]
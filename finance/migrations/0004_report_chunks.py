@@ -0,0 +1,59 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:47
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("finance", "0003_sales_rollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReportChunk",
+            fields=[
+                (
+                    "chunk_id",
+                    models.BigAutoField(
+                        db_column="chunk_id", primary_key=True, serialize=False
+                    ),
+                ),
+                ("sequence", models.IntegerField(db_column="sequence")),
+                ("row_count", models.IntegerField(db_column="row_count")),
+                (
+                    "data",
+                    models.JSONField(
+                        blank=True,
+                        db_column="data",
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                        null=True,
+                    ),
+                ),
+                (
+                    "payload",
+                    models.BinaryField(blank=True, db_column="payload", null=True),
+                ),
+                (
+                    "report",
+                    models.ForeignKey(
+                        db_column="report_id",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chunks",
+                        to="finance.report",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "reportchunk",
+                "ordering": ["report", "sequence"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("report", "sequence"), name="unique_report_chunk"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:47
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("finance", "0004_report_chunks"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReportJob",
+            fields=[
+                (
+                    "job_id",
+                    models.AutoField(
+                        db_column="job_id", primary_key=True, serialize=False
+                    ),
+                ),
+                (
+                    "report_type",
+                    models.CharField(
+                        choices=[("sales", "Sales"), ("debt", "Debt")],
+                        db_column="report_type",
+                        max_length=50,
+                    ),
+                ),
+                ("report_date", models.DateField(db_column="report_date")),
+                (
+                    "params",
+                    models.JSONField(
+                        db_column="params",
+                        default=dict,
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                    ),
+                ),
+                (
+                    "params_key",
+                    models.CharField(
+                        db_column="params_key", default="{}", max_length=255
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        db_column="status",
+                        default="queued",
+                        max_length=20,
+                    ),
+                ),
+                ("progress", models.IntegerField(db_column="progress", default=0)),
+                ("error", models.TextField(blank=True, db_column="error", null=True)),
+                ("created_by", models.IntegerField(db_column="created_by")),
+                ("created_at", models.DateTimeField(db_column="created_at")),
+                (
+                    "started_at",
+                    models.DateTimeField(blank=True, db_column="started_at", null=True),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        blank=True, db_column="finished_at", null=True
+                    ),
+                ),
+                (
+                    "report",
+                    models.ForeignKey(
+                        blank=True,
+                        db_column="report_id",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="jobs",
+                        to="finance.report",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "reportjob",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "created_at"],
+                        name="reportjob_status_6a72dc_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("status__in", ["queued", "running"])),
+                        fields=("report_type", "report_date", "params_key"),
+                        name="unique_active_report_job",
+                    )
+                ],
+            },
+        ),
+    ]
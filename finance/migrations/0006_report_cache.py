@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("finance", "0005_report_jobs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="report",
+            name="params_key",
+            field=models.CharField(
+                db_column="params_key", default="{}", max_length=255
+            ),
+        ),
+        migrations.AddField(
+            model_name="report",
+            name="source_version",
+            field=models.CharField(
+                blank=True, db_column="source_version", max_length=128, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="report",
+            index=models.Index(
+                fields=["report_type", "report_date", "params_key", "source_version"],
+                name="report_report__a374c0_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("finance", "0006_report_cache"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="report",
+            name="report_type",
+            field=models.CharField(
+                choices=[("sales", "Sales"), ("debt", "Debt"), ("aging", "Debt aging")],
+                db_column="report_type",
+                max_length=50,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="reportjob",
+            name="report_type",
+            field=models.CharField(
+                choices=[("sales", "Sales"), ("debt", "Debt"), ("aging", "Debt aging")],
+                db_column="report_type",
+                max_length=50,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["agency_id", "payment_date"], name="payment_agency__b47634_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:50
+
+from django.db import migrations, models
+
+from agency_management.partitioning import convert_to_partitioned
+
+
+def partition_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table in ("payment",):
+        convert_to_partitioned(table, using=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("finance", "0007_aging_report"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["payment_date"], name="payment_payment_904250_idx"
+            ),
+        ),
+        migrations.RunPython(partition_tables, migrations.RunPython.noop),
+    ]
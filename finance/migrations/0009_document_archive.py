@@ -0,0 +1,63 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("finance", "0008_partition_payment"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DocumentArchive",
+            fields=[
+                (
+                    "archive_id",
+                    models.BigAutoField(
+                        db_column="archive_id", primary_key=True, serialize=False
+                    ),
+                ),
+                (
+                    "doc_type",
+                    models.CharField(
+                        choices=[
+                            ("issue", "Issue"),
+                            ("receipt", "Receipt"),
+                            ("payment", "Payment"),
+                        ],
+                        db_column="doc_type",
+                        max_length=10,
+                    ),
+                ),
+                ("agency_id", models.IntegerField(db_column="agency_id")),
+                ("month", models.DateField(db_column="month")),
+                ("first_date", models.DateField(db_column="first_date")),
+                ("last_date", models.DateField(db_column="last_date")),
+                ("document_count", models.IntegerField(db_column="document_count")),
+                (
+                    "total_amount",
+                    models.DecimalField(
+                        db_column="total_amount", decimal_places=2, max_digits=18
+                    ),
+                ),
+                ("payload", models.BinaryField(db_column="payload")),
+                ("created_at", models.DateTimeField(db_column="created_at")),
+            ],
+            options={
+                "db_table": "documentarchive",
+                "ordering": ["month", "agency_id"],
+                "indexes": [
+                    models.Index(
+                        fields=["doc_type", "agency_id", "month"],
+                        name="documentarc_doc_typ_15273e_idx",
+                    ),
+                    models.Index(
+                        fields=["doc_type", "month"],
+                        name="documentarc_doc_typ_b94d47_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
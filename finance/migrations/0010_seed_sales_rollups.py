@@ -0,0 +1,49 @@
+# Generated by Django 5.2.3 on 2026-10-16 23:14
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+
+def seed_sales_rollups(apps, schema_editor):
+    # The rollup only receives issues posted from the moment it exists; start it from the issue table.
+    # Written against the historical models so later manager changes cannot break it. Archived issues
+    # only keep per-agency monthly summaries here, so they are counted on the first day of their month.
+    alias = schema_editor.connection.alias
+    Issue = apps.get_model("inventory", "Issue")
+    DocumentArchive = apps.get_model("finance", "DocumentArchive")
+    SalesRollup = apps.get_model("finance", "SalesRollup")
+    totals = defaultdict(lambda: [Decimal(0), 0])
+    days = Issue.objects.using(alias).order_by().values("issue_date").annotate(
+        total=Sum("total_amount"), count=Count("pk")
+    )
+    for day in days:
+        totals[day["issue_date"]][0] += day["total"]
+        totals[day["issue_date"]][1] += day["count"]
+    months = DocumentArchive.objects.using(alias).filter(doc_type="issue").order_by().values("month").annotate(
+        total=Sum("total_amount"), count=Sum("document_count")
+    )
+    for month in months:
+        totals[month["month"]][0] += month["total"]
+        totals[month["month"]][1] += month["count"]
+    now = timezone.now()
+    SalesRollup.objects.using(alias).all().delete()
+    SalesRollup.objects.using(alias).bulk_create([
+        SalesRollup(sales_date=sales_date, total_sales=total, issue_count=count, created_at=now)
+        for sales_date, (total, count) in sorted(totals.items())
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("finance", "0009_document_archive"),
+        ("inventory", "0004_partition_documents"),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_sales_rollups, migrations.RunPython.noop),
+    ]
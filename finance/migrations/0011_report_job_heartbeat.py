@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-16 23:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("finance", "0010_seed_sales_rollups"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reportjob",
+            name="heartbeat_at",
+            field=models.DateTimeField(blank=True, db_column="heartbeat_at", null=True),
+        ),
+    ]
@@ -5,10 +5,16 @@
 #   * Make sure each ForeignKey and OneToOneField has `on_delete` set to the desired behavior
 #   * Remove `managed = False` lines if you wish to allow Django to create, modify, and delete the table
 # Feel free to rename the models, but don't rename db_table values or field names.
+import json
+import zlib
+from decimal import Decimal
+
 from django.db import models
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_date, parse_datetime
 from django.utils.translation import gettext_lazy as _
-from .managers import ReportManager
+from .managers import DocumentArchiveManager, PaymentManager, ReportJobManager, ReportManager, SalesRollupManager
 
 
 class Payment(models.Model):
@@ -19,12 +25,16 @@ class Payment(models.Model):
     amount_collected = models.DecimalField(max_digits=15, decimal_places=2, db_column="amount_collected")
     created_at = models.DateTimeField(null=True, blank=True, db_column="created_at")
 
+    objects = PaymentManager()
+
     class Meta:
         db_table = "payment"
         ordering = ["-payment_date"]
         indexes = [
             models.Index(fields=["agency_id"]),
             models.Index(fields=["user_id"]),
+            models.Index(fields=["agency_id", "payment_date"]),
+            models.Index(fields=["payment_date"]),
         ]
 
     def clean(self):
@@ -43,17 +53,21 @@ class Payment(models.Model):
 class Report(models.Model):
     SALES = 'sales'
     DEBT = 'debt'
+    AGING = 'aging'
     REPORT_TYPE_CHOICES = [
         (SALES, 'Sales'),
         (DEBT, 'Debt'),
+        (AGING, 'Debt aging'),
     ]
 
     report_id = models.AutoField(primary_key=True, db_column="report_id")
     report_type = models.CharField(max_length=50, choices=REPORT_TYPE_CHOICES, db_column="report_type")
     report_date = models.DateField(db_column="report_date")
-    data = models.JSONField(db_column="data")
+    data = models.JSONField(db_column="data", encoder=DjangoJSONEncoder)
     created_by = models.IntegerField(db_column="created_by")
     created_at = models.DateTimeField(null=True, blank=True, db_column="created_at")
+    params_key = models.CharField(max_length=255, default="{}", db_column="params_key")
+    source_version = models.CharField(max_length=128, null=True, blank=True, db_column="source_version")
 
     objects = ReportManager()
 
@@ -63,12 +77,134 @@ class Report(models.Model):
         indexes = [
             models.Index(fields=["report_type"]),
             models.Index(fields=["created_by"]),
+            models.Index(fields=["report_type", "report_date", "params_key", "source_version"]),
         ]
 
+    @property
+    def is_chunked(self):
+        return isinstance(self.data, dict) and self.data.get('chunked', False)
+
+    @property
+    def row_count(self):
+        return self.data['row_count'] if self.is_chunked else len(self.data)
+
+    def iter_rows(self):
+        """Yield the report rows, loading at most one chunk at a time."""
+        if not self.is_chunked:
+            yield from self.data
+            return
+        for chunk in self.chunks.order_by('sequence').iterator(chunk_size=1):
+            yield from chunk.rows()
+
+    def page(self, number, page_size=100):
+        """Rows of the 1-based page `number`, reading only the chunks that overlap it."""
+        start = (number - 1) * page_size
+        if not self.is_chunked:
+            return self.data[start:start + page_size]
+        chunk_size = self.data['chunk_size']
+        first, last = start // chunk_size, (start + page_size - 1) // chunk_size
+        rows = []
+        for chunk in self.chunks.filter(sequence__gte=first, sequence__lte=last).order_by('sequence'):
+            rows.extend(chunk.rows())
+        offset = start - first * chunk_size
+        return rows[offset:offset + page_size]
+
     def __str__(self):
         return f"Report #{self.report_id} - {self.report_type} ({self.report_date})"
 
 
+class ReportChunk(models.Model):
+    chunk_id = models.BigAutoField(primary_key=True, db_column="chunk_id")
+    report = models.ForeignKey(Report, on_delete=models.CASCADE, db_column="report_id", related_name="chunks")
+    sequence = models.IntegerField(db_column="sequence")
+    row_count = models.IntegerField(db_column="row_count")
+    data = models.JSONField(null=True, blank=True, db_column="data", encoder=DjangoJSONEncoder)
+    payload = models.BinaryField(null=True, blank=True, db_column="payload")
+
+    class Meta:
+        db_table = "reportchunk"
+        ordering = ["report", "sequence"]
+        constraints = [
+            models.UniqueConstraint(fields=["report", "sequence"], name="unique_report_chunk")
+        ]
+
+    @staticmethod
+    def pack(rows, compress=False):
+        if compress:
+            payload = zlib.compress(json.dumps(rows, cls=DjangoJSONEncoder).encode())
+            return {'row_count': len(rows), 'payload': payload}
+        return {'row_count': len(rows), 'data': rows}
+
+    def rows(self):
+        if self.payload is not None:
+            return json.loads(zlib.decompress(bytes(self.payload)))
+        return self.data
+
+    def __str__(self):
+        return f"ReportChunk #{self.sequence} of report {self.report_id}"
+
+
+class ReportJob(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    job_id = models.AutoField(primary_key=True, db_column="job_id")
+    report_type = models.CharField(max_length=50, choices=Report.REPORT_TYPE_CHOICES, db_column="report_type")
+    report_date = models.DateField(db_column="report_date")
+    params = models.JSONField(default=dict, db_column="params", encoder=DjangoJSONEncoder)
+    params_key = models.CharField(max_length=255, default="{}", db_column="params_key")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED, db_column="status")
+    progress = models.IntegerField(default=0, db_column="progress")
+    report = models.ForeignKey(
+        Report, on_delete=models.SET_NULL, null=True, blank=True, db_column="report_id", related_name="jobs"
+    )
+    error = models.TextField(null=True, blank=True, db_column="error")
+    created_by = models.IntegerField(db_column="created_by")
+    created_at = models.DateTimeField(db_column="created_at")
+    started_at = models.DateTimeField(null=True, blank=True, db_column="started_at")
+    heartbeat_at = models.DateTimeField(null=True, blank=True, db_column="heartbeat_at")
+    finished_at = models.DateTimeField(null=True, blank=True, db_column="finished_at")
+
+    objects = ReportJobManager()
+
+    class Meta:
+        db_table = "reportjob"
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["report_type", "report_date", "params_key"],
+                condition=models.Q(status__in=["queued", "running"]),
+                name="unique_active_report_job",
+            )
+        ]
+
+    @property
+    def wait_seconds(self):
+        if self.started_at is None:
+            return None
+        return (self.started_at - self.created_at).total_seconds()
+
+    @property
+    def run_seconds(self):
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return (self.finished_at - self.started_at).total_seconds()
+
+    def __str__(self):
+        return f"ReportJob #{self.job_id} - {self.report_type} ({self.report_date}) {self.status}"
+
+
 class DebtSummary(models.Model):
     agency_id = models.IntegerField(db_column="agency_id", primary_key=True)
     agency_name = models.CharField(max_length=255, db_column="agency_name")
@@ -87,3 +223,78 @@ class SalesMonthly(models.Model):
         managed = False
         db_table = "v_sales_monthly"
 
+
+class SalesRollup(models.Model):
+    rollup_id = models.BigAutoField(primary_key=True, db_column="rollup_id")
+    sales_date = models.DateField(db_column="sales_date")
+    total_sales = models.DecimalField(max_digits=18, decimal_places=2, default=0, db_column="total_sales")
+    issue_count = models.IntegerField(default=0, db_column="issue_count")
+    created_at = models.DateTimeField(db_column="created_at")
+
+    objects = SalesRollupManager()
+
+    class Meta:
+        db_table = "salesrollup"
+        ordering = ["sales_date"]
+        indexes = [
+            models.Index(fields=["sales_date"]),
+        ]
+
+    def __str__(self):
+        return f"Sales {self.sales_date}: {self.total_sales}"
+
+
+class DocumentArchive(models.Model):
+    """
+    Archived issues, receipts or payments of one agency and month: the
+    documents themselves, zlib-compressed JSON with their detail lines, plus
+    the summary totals balances and sales reports keep reading.
+    """
+    ISSUE = 'issue'
+    RECEIPT = 'receipt'
+    PAYMENT = 'payment'
+    DOC_TYPE_CHOICES = [
+        (ISSUE, 'Issue'),
+        (RECEIPT, 'Receipt'),
+        (PAYMENT, 'Payment'),
+    ]
+
+    archive_id = models.BigAutoField(primary_key=True, db_column="archive_id")
+    doc_type = models.CharField(max_length=10, choices=DOC_TYPE_CHOICES, db_column="doc_type")
+    agency_id = models.IntegerField(db_column="agency_id")
+    month = models.DateField(db_column="month")
+    first_date = models.DateField(db_column="first_date")
+    last_date = models.DateField(db_column="last_date")
+    document_count = models.IntegerField(db_column="document_count")
+    total_amount = models.DecimalField(max_digits=18, decimal_places=2, db_column="total_amount")
+    payload = models.BinaryField(db_column="payload")
+    created_at = models.DateTimeField(db_column="created_at")
+
+    objects = DocumentArchiveManager()
+
+    class Meta:
+        db_table = "documentarchive"
+        ordering = ["month", "agency_id"]
+        indexes = [
+            models.Index(fields=["doc_type", "agency_id", "month"]),
+            models.Index(fields=["doc_type", "month"]),
+        ]
+
+    @staticmethod
+    def pack(documents):
+        return zlib.compress(json.dumps(documents, cls=DjangoJSONEncoder).encode())
+
+    def documents(self):
+        documents = json.loads(zlib.decompress(bytes(self.payload)))
+        for document in documents:
+            document['date'] = parse_date(document['date'])
+            document['amount'] = Decimal(document['amount'])
+            if document['created_at']:
+                document['created_at'] = parse_datetime(document['created_at'])
+            for line in document.get('details', ()):
+                line['unit_price'] = Decimal(line['unit_price'])
+                line['line_total'] = Decimal(line['line_total'])
+        return documents
+
+    def __str__(self):
+        return f"{self.get_doc_type_display()} archive of agency {self.agency_id} for {self.month:%Y-%m}"
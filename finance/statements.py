@@ -0,0 +1,126 @@
+# statements.py
+import heapq
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.apps import apps
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.utils.translation import gettext as _
+
+CURSOR_SALT = "finance.statement"
+STATEMENT_MAX_LIMIT = 500
+ISSUE, PAYMENT = 0, 1
+ENTRY_TYPES = {ISSUE: "issue", PAYMENT: "payment"}
+
+
+def opening_balance(agency_id, before, using="default"):
+    """The agency's debt at the end of the day before `before` (see DebtSnapshotManager.debt_as_of)."""
+    DebtSnapshot = apps.get_model("agency", "DebtSnapshot")
+    balances = DebtSnapshot.objects.db_manager(using).debt_as_of([agency_id], before - timedelta(days=1))
+    return balances.get(agency_id, Decimal(0))
+
+
+def _archived_entries(agency_id, after, date_to, using):
+    """Archived statement entries after the `after` key, as sorted (date, kind, id, amount) tuples."""
+    archives = apps.get_model("finance", "DocumentArchive").objects.db_manager(using)
+    entries = []
+    for doc_type, kind, sign in (("issue", ISSUE, 1), ("payment", PAYMENT, -1)):
+        for document in archives.archived(doc_type, after[0], date_to + timedelta(days=1), agency_id):
+            key = (document["date"], kind, document["id"])
+            if key > after:
+                entries.append((*key, document["amount"] * sign))
+    return sorted(entries)
+
+
+def agency_statement(agency_id, date_from, date_to, cursor=None, limit=50, using="default"):
+    """
+    One page of an agency's statement: its issues (debit) and payments
+    (credit) between date_from and date_to, merged in SQL and ordered by
+    (date, issues before payments, document id), each with the running
+    balance. Pages are addressed by a signed keyset cursor that also carries
+    the balance reached so far, so a later page starts from that checkpoint
+    instead of re-summing the history before it. The cursor is bound to the
+    agency and date range it was issued for; any other cursor is rejected.
+    `limit` must be between 1 and STATEMENT_MAX_LIMIT.
+    """
+    if not 1 <= limit <= STATEMENT_MAX_LIMIT:
+        raise ValueError(f"Statement page size must be between 1 and {STATEMENT_MAX_LIMIT}, got {limit}.")
+    scope = {"agency_id": agency_id, "from": date_from.isoformat(), "to": date_to.isoformat()}
+    if cursor:
+        try:
+            position = signing.loads(cursor, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            raise ValidationError({"cursor": _("Invalid statement cursor.")})
+        if {key: position.get(key) for key in scope} != scope:
+            raise ValidationError({"cursor": _("The cursor belongs to another statement.")})
+        after = (date.fromisoformat(position["date"]), position["kind"], position["id"])
+        balance = Decimal(position["balance"])
+    else:
+        after = (date_from, -1, 0)
+        balance = opening_balance(agency_id, date_from, using)
+
+    Issue = apps.get_model("inventory", "Issue")
+    Payment = apps.get_model("finance", "Payment")
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    sql = (
+        f"WITH entries AS ("
+        f"  SELECT issue_date AS entry_date, {ISSUE} AS kind, issue_id AS doc_id, total_amount AS amount"
+        f"  FROM {quote(Issue._meta.db_table)}"
+        f"  WHERE agency_id = %(agency_id)s AND issue_date <= %(date_to)s"
+        f"    AND (issue_date, {ISSUE}, issue_id) > (%(after_date)s, %(after_kind)s, %(after_id)s)"
+        f"  UNION ALL"
+        f"  SELECT payment_date, {PAYMENT}, payment_id, -amount_collected"
+        f"  FROM {quote(Payment._meta.db_table)}"
+        f"  WHERE agency_id = %(agency_id)s AND payment_date <= %(date_to)s"
+        f"    AND (payment_date, {PAYMENT}, payment_id) > (%(after_date)s, %(after_kind)s, %(after_id)s)"
+        f") "
+        f"SELECT entry_date, kind, doc_id, amount,"
+        f"  SUM(amount) OVER (ORDER BY entry_date, kind, doc_id ROWS UNBOUNDED PRECEDING) "
+        f"FROM entries ORDER BY entry_date, kind, doc_id LIMIT %(limit)s"
+    )
+    params = {
+        "agency_id": agency_id,
+        "date_to": date_to,
+        "after_date": after[0],
+        "after_kind": after[1],
+        "after_id": after[2],
+        "limit": limit + 1,
+    }
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        fetched = db_cursor.fetchall()
+    archived = _archived_entries(agency_id, after, date_to, using)
+    if archived:
+        # Archived entries have no row to run the window over; merge them in and re-run the sum here.
+        merged = list(heapq.merge(archived, [row[:4] for row in fetched]))[:limit + 1]
+        fetched = [(*entry, running) for entry, running in zip(merged, accumulate(entry[3] for entry in merged))]
+
+    rows = []
+    for entry_date, kind, doc_id, amount, running in fetched[:limit]:
+        rows.append({
+            "date": entry_date,
+            "type": ENTRY_TYPES[kind],
+            "document_id": doc_id,
+            "debit": amount if kind == ISSUE else Decimal(0),
+            "credit": -amount if kind == PAYMENT else Decimal(0),
+            "balance": balance + running,
+        })
+
+    next_cursor = None
+    if len(fetched) > limit:
+        last_date, last_kind, last_id = fetched[limit - 1][:3]
+        next_cursor = signing.dumps(
+            {**scope, "date": last_date.isoformat(), "kind": last_kind, "id": last_id,
+             "balance": str(rows[-1]["balance"])},
+            salt=CURSOR_SALT,
+        )
+    return {
+        "agency_id": agency_id,
+        "opening_balance": balance if not cursor else None,
+        "rows": rows,
+        "next_cursor": next_cursor,
+    }
@@ -1,3 +1,504 @@
-from django.test import TestCase
+import importlib
+import io
+import threading
+import time
+import unittest
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.db import connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from agency.managers import AgencyManager
+from agency.models import Agency, AgencyType, District
+from inventory.models import Issue, Issuedetail, Item, Unit
+from .managers import JobHeartbeat, ReportManager
+from .models import DocumentArchive, Payment, Report, ReportJob, SalesRollup
+from .statements import STATEMENT_MAX_LIMIT, agency_statement, opening_balance
+
+
+def create_agency(name="Đại lý A", debt_amount=0, agency_type=None, district=None):
+    agency_type = agency_type or AgencyType.objects.create(type_name=f"Loại {name}", max_debt=Decimal("100000"))
+    district = district or District.objects.create(district_name=f"Quận {name}", max_agencies=10)
+    return Agency.objects.create(
+        agency_name=name, agency_type=agency_type, district=district, phone_number="0900000000",
+        address="1 Lê Lợi", reception_date=date(2025, 1, 1), debt_amount=debt_amount,
+    )
+
+
+class PaymentImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.agency = create_agency(debt_amount=Decimal("100"))
+
+    def test_invalid_rows_are_reported_and_valid_ones_posted(self):
+        rows = [
+            {"agency_id": self.agency.pk, "amount_collected": "30", "payment_date": "2025-02-01"},
+            ["not", "an", "object"],
+            {"agency_id": self.agency.pk, "amount_collected": "1.005", "payment_date": "2025-02-01"},
+            {"agency_id": self.agency.pk, "amount_collected": "80", "payment_date": "2025-02-02"},
+            {"agency_id": self.agency.pk, "amount_collected": "70", "payment_date": "2025-02-03"},
+        ]
+        report = Payment.objects.import_rows(rows, user_id=1)
+
+        self.assertEqual(report["imported"], 2)
+        self.assertEqual(
+            {error["row"]: set(error["errors"]) for error in report["errors"]},
+            {2: {"row"}, 3: {"amount_collected"}, 4: {"amount_collected"}},
+        )
+        self.assertEqual(Agency.objects.get(pk=self.agency.pk).debt_amount, 0)
+        self.assertEqual(Payment.objects.count(), 2)
+
+    def test_batch_locks_its_agencies_once(self):
+        rows = [{"agency_id": self.agency.pk, "amount_collected": "10", "payment_date": "2025-02-01"}] * 3
+        with mock.patch.object(AgencyManager, "lock_debts", autospec=True,
+                               side_effect=AgencyManager.lock_debts) as lock_debts:
+            report = Payment.objects.import_rows(rows, user_id=1)
+        self.assertEqual(report["imported"], 3)
+        self.assertEqual(lock_debts.call_count, 1)
+
+    def test_unreadable_lines_are_reported_with_their_line_number(self):
+        stream = io.StringIO(
+            f'{{"agency_id": {self.agency.pk}, "amount_collected": "10", "payment_date": "2025-02-01"}}\n'
+            "\n"
+            '{"agency_id": 1, "amount_collected": \n'
+            "[1, 2]\n"
+            f'{{"agency_id": {self.agency.pk}, "amount_collected": "20", "payment_date": "2025-02-02"}}\n'
+        )
+        report = Payment.objects.import_stream(stream, "jsonl", user_id=1, batch_size=1)
+
+        self.assertEqual(report["imported"], 2)
+        self.assertEqual([(error["row"], list(error["errors"])) for error in report["errors"]],
+                         [(3, ["row"]), (4, ["row"])])
+        self.assertEqual(Agency.objects.get(pk=self.agency.pk).debt_amount, Decimal("70"))
+
+    def test_csv_errors_use_file_line_numbers(self):
+        stream = io.StringIO(
+            "agency_id,amount_collected,payment_date\n"
+            f"{self.agency.pk},10,2025-02-01\n"
+            f"{self.agency.pk},abc,2025-02-01\n"
+        )
+        report = Payment.objects.import_stream(stream, "csv", user_id=1)
+        self.assertEqual(report["imported"], 1)
+        self.assertEqual([error["row"] for error in report["errors"]], [3])
+
+    def test_json_document_must_be_a_list(self):
+        for document in ('{"agency_id": 1, "amount_collected": "10"}', "[{", ""):
+            with self.subTest(document=document), self.assertRaises(ValueError):
+                Payment.objects.import_stream(io.StringIO(document), "json", user_id=1)
+        self.assertFalse(Payment.objects.exists())
+
+        report = Payment.objects.import_stream(io.StringIO('[1, {"agency_id": "x"}]'), "json", user_id=1)
+        self.assertEqual([error["row"] for error in report["errors"]], [1, 2])
+
+    def test_dry_run_writes_nothing(self):
+        rows = [{"agency_id": self.agency.pk, "amount_collected": "10", "payment_date": "2025-02-01"}]
+        report = Payment.objects.import_rows(rows, user_id=1, dry_run=True)
+        self.assertEqual(report["imported"], 1)
+        self.assertFalse(Payment.objects.exists())
+        self.assertEqual(Agency.objects.get(pk=self.agency.pk).debt_amount, Decimal("100"))
+
+
+class SalesRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.agency = create_agency()
+        unit = Unit.objects.create(unit_name="Thùng")
+        cls.item = Item.objects.create(item_name="Nước", unit=unit, price=Decimal("10.00"), stock_quantity=1000)
+
+    def post_sales(self):
+        Issue.objects.post_issue(self.agency.pk, 1, [{"item_id": self.item.pk, "quantity": 2}], date(2025, 1, 10))
+        Issue.objects.post_issue(self.agency.pk, 1, [{"item_id": self.item.pk, "quantity": 3}], date(2025, 2, 5))
+        issue = Issue.objects.create(issue_date=date(2025, 2, 6), agency_id=self.agency.pk, user_id=1, total_amount=0)
+        Issuedetail.objects.create(
+            issue=issue, item=self.item, quantity=1, unit_price=Decimal("10.00"), line_total=Decimal("10.00")
+        )
+
+    def test_posted_and_saved_issues_feed_the_rollup(self):
+        self.post_sales()
+        self.assertEqual(SalesRollup.objects.monthly("2025-01", "2025-02"), [
+            {"month": "2025-01", "total_sales": Decimal("20.00"), "issue_count": 1},
+            {"month": "2025-02", "total_sales": Decimal("40.00"), "issue_count": 2},
+        ])
+
+    def test_seed_migration_backfills_past_months(self):
+        self.post_sales()
+        SalesRollup.objects.all().delete()
+        migration = importlib.import_module("finance.migrations.0010_seed_sales_rollups")
+        # Run against the models as they were when the migration was written.
+        loader = MigrationExecutor(connection).loader
+        state = loader.project_state(("finance", "0010_seed_sales_rollups"), at_end=False)
+        migration.seed_sales_rollups(state.apps, connection.schema_editor())
+
+        report = Report.objects.create_sales_report("2025-02", 1, reuse=False)
+        self.assertEqual(report.data, [{"month": "2025-02", "total_sales": Decimal("40.00")}])
+
+
+class SalesReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = create_agency("Đại lý A")
+        cls.second = create_agency("Đại lý B")
+        unit = Unit.objects.create(unit_name="Thùng")
+        cls.water = Item.objects.create(item_name="Nước", unit=unit, price=Decimal("10.00"), stock_quantity=1000)
+        cls.rice = Item.objects.create(item_name="Gạo", unit=unit, price=Decimal("25.00"), stock_quantity=1000)
+        for agency, lines, issue_date in (
+            (cls.first, [(cls.water, 2)], date(2025, 1, 10)),
+            (cls.second, [(cls.water, 1), (cls.rice, 2)], date(2025, 1, 20)),
+            (cls.first, [(cls.rice, 1)], date(2025, 3, 5)),
+            (cls.second, [(cls.water, 4)], date(2025, 4, 1)),
+        ):
+            items = [{"item_id": item.pk, "quantity": quantity} for item, quantity in lines]
+            Issue.objects.post_issue(agency.pk, 1, items, issue_date)
+
+    def test_single_month_keeps_its_row_shape(self):
+        report = Report.objects.create_sales_report("2025-01", 1, reuse=False)
+        self.assertEqual(report.data, [{"month": "2025-01", "total_sales": Decimal("80.00")}])
+
+    def test_month_range_has_a_row_per_month_with_sales(self):
+        report = Report.objects.create_sales_report("2025-01", 1, reuse=False, to_month="2025-03")
+        self.assertEqual(report.data, [
+            {"month": "2025-01", "total_sales": Decimal("80.00")},
+            {"month": "2025-03", "total_sales": Decimal("25.00")},
+        ])
+        self.assertEqual(report.params_key, '{"to_month": "2025-03"}')
+
+    def test_item_breakdown(self):
+        report = Report.objects.create_sales_report("2025-01", 1, reuse=False, to_month="2025-03", breakdown="item")
+        self.assertEqual(report.data, [
+            {"item_id": self.water.pk, "month": "2025-01", "total_sales": Decimal("30.00"), "quantity": 3,
+             "issue_count": 2},
+            {"item_id": self.rice.pk, "month": "2025-01", "total_sales": Decimal("50.00"), "quantity": 2,
+             "issue_count": 1},
+            {"item_id": self.rice.pk, "month": "2025-03", "total_sales": Decimal("25.00"), "quantity": 1,
+             "issue_count": 1},
+        ])
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "the agency breakdowns use date_trunc")
+    def test_agency_breakdowns(self):
+        for breakdown, first_key, second_key in (
+            ("district", self.first.district_id, self.second.district_id),
+            ("agency_type", self.first.agency_type_id, self.second.agency_type_id),
+        ):
+            with self.subTest(breakdown=breakdown):
+                table = Report.objects.sales_table("2025-01", "2025-04", breakdown)
+                self.assertEqual(table["columns"], [breakdown + "_id", "month", "total_sales", "issue_count"])
+                self.assertEqual(table["rows"], [
+                    [first_key, "2025-01", Decimal("20.00"), 1],
+                    [first_key, "2025-03", Decimal("25.00"), 1],
+                    [second_key, "2025-01", Decimal("60.00"), 1],
+                    [second_key, "2025-04", Decimal("40.00"), 1],
+                ])
+
+    def test_unknown_breakdown_is_rejected(self):
+        with self.assertRaises(ValueError):
+            Report.objects.create_sales_report("2025-01", 1, reuse=False, breakdown="agency")
+        self.assertFalse(Report.objects.exists())
+
+
+class ReportJobTests(TestCase):
+    def test_requeue_takes_back_only_jobs_without_a_recent_heartbeat(self):
+        now = timezone.now()
+        dead = ReportJob.objects.create(report_type=Report.DEBT, report_date=date(2025, 1, 31), params_key="dead",
+                                        created_by=1, created_at=now, status=ReportJob.RUNNING,
+                                        started_at=now - timedelta(hours=2), heartbeat_at=now - timedelta(minutes=10))
+        alive = ReportJob.objects.create(report_type=Report.DEBT, report_date=date(2025, 1, 31), params_key="alive",
+                                         created_by=1, created_at=now, status=ReportJob.RUNNING,
+                                         started_at=now - timedelta(hours=2), heartbeat_at=now)
+
+        self.assertEqual(ReportJob.objects.requeue_stale(now - timedelta(minutes=5)), 1)
+        self.assertEqual(ReportJob.objects.get(pk=dead.pk).status, ReportJob.QUEUED)
+        self.assertEqual(ReportJob.objects.get(pk=alive.pk).status, ReportJob.RUNNING)
+
+    def test_claim_starts_the_heartbeat(self):
+        ReportJob.objects.enqueue(Report.DEBT, date(2025, 1, 31), 1)
+        job, = ReportJob.objects.claim()
+        self.assertEqual(job.status, ReportJob.RUNNING)
+        self.assertIsNotNone(ReportJob.objects.get(pk=job.pk).heartbeat_at)
+
+
+@override_settings(REPORT_CHUNK_SIZE=3)
+class ChunkedReportTests(TestCase):
+    rows = [{"agency_id": number, "debt_amount": Decimal(number)} for number in range(1, 9)]
+
+    def create_report(self, rows, compress):
+        written = []
+        report = Report.objects._create_report(Report.DEBT, date(2025, 1, 31), rows, 1, compress=compress,
+                                               progress=written.append)
+        return Report.objects.get(pk=report.pk), written
+
+    def test_results_up_to_one_chunk_stay_inline(self):
+        report, written = self.create_report(iter(self.rows[:3]), compress=True)
+
+        self.assertFalse(report.is_chunked)
+        self.assertEqual(report.chunks.count(), 0)
+        self.assertEqual(report.row_count, 3)
+        self.assertEqual(written, [3])
+        self.assertEqual(report.page(2, page_size=2), [{"agency_id": 3, "debt_amount": "3"}])
+
+    def test_larger_results_are_split_into_chunks(self):
+        for compress in (False, True):
+            with self.subTest(compress=compress):
+                report, written = self.create_report(iter(self.rows), compress)
+
+                self.assertTrue(report.is_chunked)
+                self.assertEqual(report.data, {"chunked": True, "row_count": 8, "chunk_count": 3, "chunk_size": 3,
+                                               "compressed": compress})
+                self.assertEqual(list(report.chunks.values_list("row_count", flat=True)), [3, 3, 2])
+                self.assertEqual(report.chunks.filter(payload__isnull=compress).count(), 0)
+                self.assertEqual(written, [3, 6, 8])
+                self.assertEqual([row["agency_id"] for row in report.iter_rows()], list(range(1, 9)))
+
+    def test_pages_span_chunk_boundaries(self):
+        for compress in (False, True):
+            with self.subTest(compress=compress):
+                report, _written = self.create_report(self.rows, compress)
+
+                self.assertEqual([row["agency_id"] for row in report.page(1, page_size=4)], [1, 2, 3, 4])
+                self.assertEqual([row["agency_id"] for row in report.page(2, page_size=4)], [5, 6, 7, 8])
+                self.assertEqual([row["agency_id"] for row in report.page(2, page_size=5)], [6, 7, 8])
+                self.assertEqual([row["agency_id"] for row in report.page(3, page_size=3)], [7, 8])
+                self.assertEqual(report.page(3, page_size=4), [])
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "needs concurrent connections")
+class JobHeartbeatTests(TransactionTestCase):
+    @override_settings(REPORT_JOB_HEARTBEAT_INTERVAL=60)
+    def test_progress_is_visible_before_the_report_commits(self):
+        ReportJob.objects.enqueue(Report.DEBT, date(2025, 1, 31), 1)
+        job, = ReportJob.objects.claim()
+        seen = []
+
+        def observe():
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline and not seen:
+                if ReportJob.objects.get(pk=job.pk).progress == 500:
+                    seen.append(True)
+                time.sleep(0.05)
+            connections["default"].close()
+
+        heartbeat = JobHeartbeat(ReportJob.objects, job.pk)
+        heartbeat.start()
+        with transaction.atomic():
+            heartbeat.progress(500)
+            observer = threading.Thread(target=observe)
+            observer.start()
+            observer.join()
+        heartbeat.stop()
+        self.assertEqual(seen, [True])
+
+
+class ReportReuseTests(TestCase):
+    def test_agency_district_move_invalidates_grouped_debt_reports(self):
+        agency = create_agency(debt_amount=Decimal("100"))
+        other = District.objects.create(district_name="Quận 9", max_agencies=10)
+        today = timezone.localdate()
+        first = Report.objects.create_debt_report(today, 1, group_by="district")
+        self.assertEqual(Report.objects.create_debt_report(today, 1, group_by="district").pk, first.pk)
+
+        agency = Agency.objects.get(pk=agency.pk)
+        agency.district = other
+        agency.save()
+        second = Report.objects.create_debt_report(today, 1, group_by="district")
+        self.assertNotEqual(second.pk, first.pk)
+        self.assertEqual([(row["district_id"], row["agency_count"]) for row in second.data if row["agency_count"]],
+                         [(other.pk, 1)])
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "the aging query is PostgreSQL SQL")
+class AgingReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.agency = create_agency()
+        cls.settled = create_agency(name="Đại lý B", agency_type=cls.agency.agency_type, district=cls.agency.district)
+        for issue_date, total in ((date(2025, 1, 1), "100"), (date(2025, 3, 1), "50"), (date(2025, 4, 20), "30")):
+            Issue.objects.create(issue_date=issue_date, agency_id=cls.agency.pk, user_id=1, total_amount=Decimal(total))
+        Issue.objects.create(issue_date=date(2025, 1, 1), agency_id=cls.settled.pk, user_id=1, total_amount=Decimal("40"))
+        Payment.objects.create(payment_date=date(2025, 4, 1), agency_id=cls.agency.pk, user_id=1,
+                               amount_collected=Decimal("120"))
+        Payment.objects.create(payment_date=date(2025, 2, 1), agency_id=cls.settled.pk, user_id=1,
+                               amount_collected=Decimal("40"))
+
+    def test_payments_settle_the_oldest_issues_first(self):
+        rows = list(Report.objects.aging_rows(date(2025, 4, 30)))
+        self.assertEqual(rows, [{
+            "agency_id": self.agency.pk, "current": Decimal("30"), "days_31_60": Decimal("30"),
+            "days_61_90": 0, "days_over_90": 0, "total": Decimal("60"),
+        }])
+
+    def test_later_documents_are_ignored(self):
+        rows = list(Report.objects.aging_rows(date(2025, 3, 15)))
+        self.assertEqual(rows, [{
+            "agency_id": self.agency.pk, "current": Decimal("50"), "days_31_60": 0,
+            "days_61_90": Decimal("100"), "days_over_90": 0, "total": Decimal("150"),
+        }])
+
+
+class StatementTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.agency = create_agency()
+        cls.other = create_agency(name="Đại lý B", agency_type=cls.agency.agency_type, district=cls.agency.district)
+        for day in range(1, 6):
+            Issue.objects.create(issue_date=date(2025, 1, day), agency_id=cls.agency.pk, user_id=1,
+                                 total_amount=Decimal("10"))
+        Payment.objects.create(payment_date=date(2025, 1, 3), agency_id=cls.agency.pk, user_id=1,
+                               amount_collected=Decimal("5"))
+
+    def statement(self, **kwargs):
+        return agency_statement(self.agency.pk, date(2025, 1, 1), date(2025, 1, 31), **kwargs)
+
+    def test_pages_chain_with_a_running_balance(self):
+        first = self.statement(limit=3)
+        second = self.statement(limit=3, cursor=first["next_cursor"])
+
+        self.assertEqual(first["opening_balance"], 0)
+        self.assertIsNone(second["next_cursor"])
+        rows = first["rows"] + second["rows"]
+        self.assertEqual([(row["type"], row["date"].day) for row in rows],
+                         [("issue", 1), ("issue", 2), ("issue", 3), ("payment", 3), ("issue", 4), ("issue", 5)])
+        self.assertEqual([row["balance"] for row in rows], [10, 20, 30, 25, 35, 45])
+        self.assertEqual(rows, self.statement(limit=10)["rows"])
+
+    def test_cursor_is_bound_to_its_statement(self):
+        cursor = self.statement(limit=3)["next_cursor"]
+        for agency_id, date_from, date_to in (
+            (self.other.pk, date(2025, 1, 1), date(2025, 1, 31)),
+            (self.agency.pk, date(2024, 12, 1), date(2025, 1, 31)),
+            (self.agency.pk, date(2025, 1, 1), date(2025, 1, 4)),
+        ):
+            with self.subTest(agency_id=agency_id, date_from=date_from, date_to=date_to):
+                with self.assertRaises(ValidationError):
+                    agency_statement(agency_id, date_from, date_to, cursor=cursor)
+
+    def test_tampered_cursor_is_rejected(self):
+        cursor = self.statement(limit=3)["next_cursor"]
+        with self.assertRaises(ValidationError):
+            self.statement(cursor=cursor[:-1] + ("A" if cursor[-1] != "A" else "B"))
+
+    def test_page_size_is_bounded(self):
+        for limit in (0, -1, STATEMENT_MAX_LIMIT + 1):
+            with self.subTest(limit=limit), self.assertRaises(ValueError):
+                self.statement(limit=limit)
+        self.assertEqual(len(self.statement(limit=1)["rows"]), 1)
+        self.assertEqual(len(self.statement(limit=STATEMENT_MAX_LIMIT)["rows"]), 6)
+
+
+class DebtAsOfTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.agency = create_agency(debt_amount=Decimal("100"))
+        Issue.objects.create(issue_date=date(2025, 2, 5), agency_id=cls.agency.pk, user_id=1, total_amount=Decimal("30"))
+        Payment.objects.create(payment_date=date(2025, 3, 3), agency_id=cls.agency.pk, user_id=1,
+                               amount_collected=Decimal("20"))
+
+    def test_past_debt_report_accepts_an_iso_date(self):
+        report = Report.objects.create_debt_report("2025-02-28", 1)
+        self.assertEqual(report.report_date, date(2025, 2, 28))
+        self.assertEqual([(row["agency_id"], row["debt_amount"]) for row in report.data],
+                         [(self.agency.pk, Decimal("130"))])
+
+    def test_opening_balance_is_the_debt_at_the_end_of_the_previous_day(self):
+        # The debt the agency started with counts, not only the documents dated before.
+        self.assertEqual(opening_balance(self.agency.pk, date(2025, 2, 5)), Decimal("100"))
+        self.assertEqual(opening_balance(self.agency.pk, date(2025, 2, 6)), Decimal("130"))
+        statement = agency_statement(self.agency.pk, date(2025, 3, 1), date(2025, 3, 31))
+        self.assertEqual(statement["opening_balance"], Decimal("130"))
+        self.assertEqual([row["balance"] for row in statement["rows"]], [Decimal("110")])
+
+
+class DocumentArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.agency = create_agency()
+        cls.other = create_agency(name="Đại lý B")
+        unit = Unit.objects.create(unit_name="Thùng")
+        cls.water = Item.objects.create(item_name="Nước", unit=unit, price=Decimal("10.00"), stock_quantity=1000)
+        cls.rice = Item.objects.create(item_name="Gạo", unit=unit, price=Decimal("25.00"), stock_quantity=1000)
+        for agency, lines, issue_date in (
+            (cls.agency, [(cls.water, 2)], date(2025, 1, 10)),
+            (cls.other, [(cls.water, 1), (cls.rice, 2)], date(2025, 1, 10)),
+            (cls.agency, [(cls.rice, 4)], date(2025, 1, 25)),
+            (cls.agency, [(cls.water, 3)], date(2025, 2, 5)),
+        ):
+            items = [{"item_id": item.pk, "quantity": quantity} for item, quantity in lines]
+            Issue.objects.post_issue(agency.pk, 1, items, issue_date)
+        for agency, payment_date, amount in ((cls.agency, date(2025, 1, 20), "15"), (cls.agency, date(2025, 2, 8), "40")):
+            Payment.objects.create(payment_date=payment_date, agency_id=agency.pk, user_id=1,
+                                   amount_collected=Decimal(amount))
+
+    def archive(self, **kwargs):
+        return DocumentArchive.objects.archive(date(2025, 2, 1), **kwargs)
+
+    def read_issues(self):
+        # The archive keeps created_at to the millisecond, as DjangoJSONEncoder writes it.
+        return [
+            {**document, "created_at": document["created_at"].replace(microsecond=document["created_at"].microsecond
+                                                                       // 1000 * 1000)}
+            for document in DocumentArchive.objects.read("issue", agency_id=self.agency.pk)
+        ]
+
+    def test_closed_months_move_into_one_archive_per_agency(self):
+        documents = self.read_issues()
+
+        self.assertEqual(self.archive(doc_types=["issue", "payment"]), {
+            "issue": {"documents": 3, "archives": 2},
+            "payment": {"documents": 1, "archives": 1},
+        })
+        self.assertEqual(list(Issue.objects.values_list("issue_date", flat=True)), [date(2025, 2, 5)])
+        self.assertEqual(list(Payment.objects.values_list("payment_date", flat=True)), [date(2025, 2, 8)])
+        self.assertEqual(Issuedetail.objects.count(), 1)
+        self.assertEqual(self.read_issues(), documents)
+        self.assertEqual([document["amount"] for document in DocumentArchive.objects.archived("issue")],
+                         [Decimal("20.00"), Decimal("100.00"), Decimal("60.00")])
+        self.assertEqual(DocumentArchive.objects.total_before("issue", self.agency.pk, date(2025, 1, 25)),
+                         Decimal("20.00"))
+        self.assertEqual(DocumentArchive.objects.total_before("issue", self.agency.pk, date(2025, 2, 1)),
+                         Decimal("120.00"))
+        # Nothing the documents posted is taken back.
+        self.assertEqual(Agency.objects.get(pk=self.agency.pk).debt_amount, Decimal("95.00"))
+        self.assertEqual(Item.objects.get(pk=self.rice.pk).stock_quantity, 994)
+
+    def test_dry_run_only_counts(self):
+        self.assertEqual(self.archive(doc_types=["issue"], dry_run=True), {"issue": {"documents": 3, "archives": 2}})
+        self.assertFalse(DocumentArchive.objects.exists())
+        self.assertEqual(Issue.objects.count(), 4)
+
+    def test_cutoff_must_start_a_month_that_has_started(self):
+        next_month = (timezone.localdate().replace(day=28) + timedelta(days=4)).replace(day=1)
+        for cutoff in (date(2025, 2, 2), next_month):
+            with self.subTest(cutoff=cutoff), self.assertRaises(ValueError):
+                DocumentArchive.objects.archive(cutoff)
+
+    def test_statements_and_sales_read_the_same_after_archiving(self):
+        breakdowns = ReportManager.SALES_BREAKDOWNS if connection.vendor == "postgresql" else ("item",)
+
+        def snapshot():
+            SalesRollup.objects.rebuild("2025-01", "2025-02")
+            return {
+                "statement": agency_statement(self.agency.pk, date(2025, 1, 1), date(2025, 2, 28), limit=10),
+                "pages": [agency_statement(self.agency.pk, date(2025, 1, 1), date(2025, 2, 28), limit=2)["rows"]],
+                "rollup": list(SalesRollup.objects.order_by("sales_date").values_list("sales_date", "total_sales",
+                                                                                      "issue_count")),
+                "sales": Report.objects.sales_table("2025-01", "2025-02"),
+                **{breakdown: Report.objects.sales_table("2025-01", "2025-02", breakdown) for breakdown in breakdowns},
+            }
+
+        before = snapshot()
+        self.archive()
+        after = snapshot()
+
+        for key in before:
+            with self.subTest(key=key):
+                self.assertEqual(after[key], before[key])
+        self.assertEqual([row["balance"] for row in after["statement"]["rows"]], [20, 5, 105, 135, 95])
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "the aging query is PostgreSQL SQL")
+    def test_aging_reads_the_same_after_archiving(self):
+        before = list(Report.objects.aging_rows(date(2025, 3, 31)))
+        self.archive()
+        self.assertEqual(list(Report.objects.aging_rows(date(2025, 3, 31))), before)
@@ -0,0 +1,95 @@
+# locks.py
+import random
+import threading
+import time
+from collections import Counter
+
+from django.apps import apps
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+
+class LockStats:
+    """Process-wide counters for item row-lock contention."""
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._mutex:
+            self.acquired = 0
+            self.retries = 0
+            self.failures = 0
+            self.wait_seconds = 0.0
+            self.item_retries = Counter()
+            self.item_wait_seconds = Counter()
+
+    def record(self, item_ids, waited, retries, failed=False):
+        with self._mutex:
+            if failed:
+                self.failures += 1
+            else:
+                self.acquired += 1
+            self.retries += retries
+            self.wait_seconds += waited
+            for item_id in item_ids:
+                if retries:
+                    self.item_retries[item_id] += retries
+                self.item_wait_seconds[item_id] += waited
+
+    def snapshot(self, top=10):
+        with self._mutex:
+            return {
+                "acquired": self.acquired,
+                "retries": self.retries,
+                "failures": self.failures,
+                "wait_seconds": self.wait_seconds,
+                "hot_items_by_retries": self.item_retries.most_common(top),
+                "hot_items_by_wait": self.item_wait_seconds.most_common(top),
+            }
+
+
+lock_stats = LockStats()
+
+
+def lock_items(item_ids, using=None, nowait=None, retries=None, retry_delay=None):
+    """
+    Lock the given Item rows with a single SELECT ... FOR UPDATE ordered by
+    item_id and return them as {item_id: item}. Every poster takes its locks
+    in the same order, so concurrent documents sharing items queue up instead
+    of deadlocking. With nowait, a busy row aborts the attempt immediately and
+    it is retried with jittered backoff up to `retries` times.
+
+    Must be called inside a transaction.
+    """
+    Item = apps.get_model("inventory", "Item")
+    item_ids = sorted(set(item_ids))
+    if nowait is None:
+        nowait = getattr(settings, "INVENTORY_LOCK_NOWAIT", False)
+    if retries is None:
+        retries = getattr(settings, "INVENTORY_LOCK_RETRIES", 3)
+    if retry_delay is None:
+        retry_delay = getattr(settings, "INVENTORY_LOCK_RETRY_DELAY", 0.05)
+
+    queryset = (
+        Item.objects.db_manager(using).select_for_update(nowait=nowait)
+        .filter(pk__in=item_ids).order_by("item_id")
+        .only("item_id", "price", "stock_quantity")
+    )
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        try:
+            # Savepoint per attempt: a NOWAIT failure must not poison the caller's transaction.
+            with transaction.atomic(using=using):
+                items = {item.pk: item for item in queryset.all()}
+        except OperationalError:
+            if not nowait or attempt >= retries:
+                lock_stats.record(item_ids, time.monotonic() - started, attempt, failed=True)
+                raise
+            attempt += 1
+            time.sleep(retry_delay * (2 ** (attempt - 1)) * (0.5 + random.random()))
+            continue
+        lock_stats.record(item_ids, time.monotonic() - started, attempt)
+        return items
@@ -0,0 +1,25 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.models import StockSnapshot
+
+
+class Command(BaseCommand):
+    help = "Write the end-of-day stock snapshot of every item (run daily after midnight)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="Snapshot date (YYYY-MM-DD), defaults to yesterday.")
+
+    def handle(self, *args, **options):
+        day = None
+        if options["date"]:
+            try:
+                day = date.fromisoformat(options["date"])
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['date']}")
+        try:
+            written = StockSnapshot.objects.take(day)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} stock snapshot(s)."))
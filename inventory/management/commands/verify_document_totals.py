@@ -0,0 +1,42 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.models import Issue, Receipt
+
+
+class Command(BaseCommand):
+    help = "Compare receipt/issue total_amount against their detail lines and optionally rebuild them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", help="First document date (YYYY-MM-DD).")
+        parser.add_argument("--to", dest="end", help="Last document date (YYYY-MM-DD).")
+        parser.add_argument("--type", choices=["receipt", "issue", "all"], default="all")
+        parser.add_argument("--rebuild", action="store_true", help="Rewrite totals that have drifted.")
+        parser.add_argument("--show", type=int, default=20, help="Number of drifted documents to list.")
+
+    def handle(self, *args, **options):
+        start = self._parse_date(options["start"])
+        end = self._parse_date(options["end"])
+        models = {"receipt": [Receipt], "issue": [Issue], "all": [Receipt, Issue]}[options["type"]]
+
+        for model in models:
+            name = model._meta.model_name
+            drifted = model.objects.drifted(start, end)
+            count = drifted.count()
+            self.stdout.write(f"{name}: {count} document(s) with drifted totals")
+            for document in drifted.order_by("pk")[: options["show"]]:
+                self.stdout.write(
+                    f"  #{document.pk}: stored {document.total_amount}, computed {document.computed_total}"
+                )
+            if options["rebuild"] and count:
+                updated = model.objects.rebuild_totals(start, end)
+                self.stdout.write(self.style.SUCCESS(f"{name}: rebuilt {updated} total(s)"))
+
+    def _parse_date(self, value):
+        if value is None:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"Invalid date: {value}")
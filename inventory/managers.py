@@ -1,9 +1,270 @@
 # managers.py
-from django.db import models
+from datetime import datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .locks import lock_items
+
 
 class ItemQuerySet(models.QuerySet):
     def low_stock(self, threshold=10):
         return self.filter(stock_quantity__lte=threshold, stock_quantity__gt=0)
 
     def out_of_stock(self):
-        return self.filter(stock_quantity=0)
\ No newline at end of file
+        return self.filter(stock_quantity=0)
+
+
+def _normalize_lines(lines):
+    normalized = {}
+    for line in lines:
+        try:
+            item_id = int(line["item_id"])
+            quantity = int(line["quantity"])
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError("Mỗi dòng phải có item_id và quantity là số nguyên.")
+        if quantity < 1:
+            raise ValidationError("Số lượng phải lớn hơn 0.")
+        if item_id in normalized:
+            raise ValidationError(f"Mặt hàng #{item_id} bị lặp trong chứng từ.")
+        unit_price = line.get("unit_price")
+        if unit_price is not None:
+            # bulk_create skips the model validators, so MinValueValidator(0.01) is enforced here.
+            try:
+                unit_price = Decimal(str(unit_price))
+            except InvalidOperation:
+                raise ValidationError(f"Đơn giá của mặt hàng #{item_id} không hợp lệ.")
+            if not unit_price.is_finite() or unit_price <= 0:
+                raise ValidationError(f"Đơn giá của mặt hàng #{item_id} phải lớn hơn 0.")
+            if unit_price != unit_price.quantize(Decimal("0.01")):
+                raise ValidationError(f"Đơn giá của mặt hàng #{item_id} có tối đa 2 chữ số thập phân.")
+        normalized[item_id] = (quantity, unit_price)
+    if not normalized:
+        raise ValidationError("Chứng từ phải có ít nhất một dòng.")
+    return normalized
+
+
+class DocumentManager(models.Manager):
+    """
+    Posts a whole receipt/issue with a fixed number of queries: one ordered
+    locking read of the items (see locks.lock_items), one header insert, one
+    bulk insert each for the details and the stock movements, and one
+    set-based stock update; issues also post their total to the sales
+    rollup and the agency debt.
+    Header and details are written with bulk_create, so the per-row stock,
+    total and debt signals do not fire for documents posted here.
+    """
+    detail_model_name = None
+    date_field = None
+    stock_sign = 0
+    debt_sign = 0
+    records_sales = False
+
+    def _post(self, agency_id, user_id, lines, doc_date=None):
+        Item = apps.get_model("inventory", "Item")
+        Detail = apps.get_model("inventory", self.detail_model_name)
+        normalized = _normalize_lines(lines)
+
+        with transaction.atomic(using=self.db):
+            items = lock_items(normalized, using=self.db)
+            missing = sorted(set(normalized) - set(items))
+            if missing:
+                raise ValidationError(f"Mặt hàng không tồn tại: {missing}")
+            if self.stock_sign < 0:
+                short = [
+                    item_id for item_id, (quantity, _) in normalized.items()
+                    if items[item_id].stock_quantity < quantity
+                ]
+                if short:
+                    raise ValidationError(f"Không đủ hàng trong kho để xuất: {short}")
+
+            rows = []
+            total = 0
+            for item_id, (quantity, unit_price) in normalized.items():
+                if unit_price is None:
+                    unit_price = items[item_id].price
+                line_total = unit_price * quantity
+                total += line_total
+                rows.append({"item_id": item_id, "quantity": quantity, "unit_price": unit_price, "line_total": line_total})
+
+            document = self.model(
+                agency_id=agency_id,
+                user_id=user_id,
+                total_amount=total,
+                created_at=timezone.now(),
+                **{self.date_field: doc_date or timezone.localdate()},
+            )
+            self.bulk_create([document])
+            parent = self.model._meta.model_name
+            Detail.objects.using(self.db).bulk_create([Detail(**{parent: document}, **row) for row in rows])
+            apps.get_model("inventory", "StockMovement").objects.db_manager(self.db).record(
+                parent, document.pk,
+                {item_id: quantity * self.stock_sign for item_id, (quantity, _) in normalized.items()},
+            )
+
+            delta = Case(
+                *[When(pk=item_id, then=Value(quantity)) for item_id, (quantity, _) in normalized.items()],
+                output_field=models.IntegerField(),
+            )
+            Item.objects.using(self.db).filter(pk__in=normalized).update(
+                stock_quantity=F("stock_quantity") + delta * self.stock_sign
+            )
+            if self.records_sales:
+                apps.get_model("finance", "SalesRollup").objects.db_manager(self.db).record(
+                    [(getattr(document, self.date_field), total, 1)]
+                )
+            if self.debt_sign:
+                # Posted last so the agency row is locked for as short as possible.
+                apps.get_model("agency", "Agency").objects.db_manager(self.db).post_debt(
+                    agency_id, total * self.debt_sign
+                )
+        return document
+
+    def computed_total(self):
+        """Expression summing a document's detail line totals, for use in annotate()/update()."""
+        Detail = apps.get_model("inventory", self.detail_model_name)
+        parent = self.model._meta.model_name
+        line_sum = (
+            Detail.objects.filter(**{parent: OuterRef("pk")})
+            .order_by().values(parent).annotate(total=Sum("line_total")).values("total")
+        )
+        return Coalesce(
+            Subquery(line_sum), Value(0),
+            output_field=DecimalField(max_digits=18, decimal_places=2),
+        )
+
+    def in_period(self, start=None, end=None):
+        queryset = self.get_queryset()
+        if start is not None:
+            queryset = queryset.filter(**{f"{self.date_field}__gte": start})
+        if end is not None:
+            queryset = queryset.filter(**{f"{self.date_field}__lte": end})
+        return queryset
+
+    def drifted(self, start=None, end=None):
+        """Documents whose stored total_amount no longer matches their details."""
+        return (
+            self.in_period(start, end)
+            .annotate(computed_total=self.computed_total())
+            .exclude(total_amount=F("computed_total"))
+        )
+
+    def rebuild_totals(self, start=None, end=None):
+        """Recompute total_amount for every document in the period with one UPDATE."""
+        return self.in_period(start, end).update(total_amount=self.computed_total())
+
+
+class ReceiptManager(DocumentManager):
+    detail_model_name = "Receiptdetail"
+    date_field = "receipt_date"
+    stock_sign = 1
+
+    def post_receipt(self, agency_id, user_id, lines, receipt_date=None):
+        return self._post(agency_id, user_id, lines, receipt_date)
+
+
+class IssueManager(DocumentManager):
+    detail_model_name = "Issuedetail"
+    date_field = "issue_date"
+    stock_sign = -1
+    debt_sign = 1
+    records_sales = True
+
+    def post_issue(self, agency_id, user_id, lines, issue_date=None):
+        return self._post(agency_id, user_id, lines, issue_date)
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class StockMovementManager(models.Manager):
+    def record(self, source_type, source_id, deltas, moved_at=None):
+        """Append one movement per {item_id: quantity_delta} entry with a single insert."""
+        moved_at = moved_at or timezone.now()
+        return self.bulk_create([
+            self.model(item_id=item_id, quantity_delta=delta, source_type=source_type,
+                       source_id=source_id, moved_at=moved_at)
+            for item_id, delta in deltas.items() if delta
+        ])
+
+    def history(self, item_id, start=None, end=None):
+        queryset = self.filter(item_id=item_id)
+        if start is not None:
+            queryset = queryset.filter(moved_at__gte=start)
+        if end is not None:
+            queryset = queryset.filter(moved_at__lt=end)
+        return queryset.order_by("moved_at", "movement_id")
+
+    def stock_as_of(self, item_id, at):
+        """
+        Stock of an item at `at`: the end of that day for a date, the instant
+        itself for a datetime. Starts from the latest daily snapshot before
+        `at` and adds the movements since, both read from indexes. Without a
+        snapshot the current stock is rolled back by the later movements.
+        """
+        Item = apps.get_model("inventory", "Item")
+        StockSnapshot = apps.get_model("inventory", "StockSnapshot")
+        if isinstance(at, datetime):
+            until = Q(moved_at__lte=at)
+            last_full_day = at.date() - timedelta(days=1)
+        else:
+            until = Q(moved_at__lt=_day_start(at + timedelta(days=1)))
+            last_full_day = at
+
+        snapshot = (
+            StockSnapshot.objects.using(self.db)
+            .filter(item_id=item_id, snapshot_date__lte=last_full_day)
+            .order_by("-snapshot_date").values_list("snapshot_date", "stock_quantity").first()
+        )
+        movements = self.filter(item_id=item_id).order_by()
+        if snapshot is not None:
+            snapshot_date, quantity = snapshot
+            since = movements.filter(until, moved_at__gte=_day_start(snapshot_date + timedelta(days=1)))
+            return quantity + (since.aggregate(total=Sum("quantity_delta"))["total"] or 0)
+
+        current = Item.objects.using(self.db).values_list("stock_quantity", flat=True).get(pk=item_id)
+        later = movements.exclude(until).aggregate(total=Sum("quantity_delta"))["total"] or 0
+        return current - later
+
+
+class StockSnapshotManager(models.Manager):
+    def take(self, day=None, chunk_size=2000):
+        """
+        Write (or overwrite) the end-of-day stock of every item for `day`,
+        which defaults to yesterday. Only finished days can be snapshotted,
+        otherwise later movements of the same day would be lost.
+        """
+        Item = apps.get_model("inventory", "Item")
+        today = timezone.localdate()
+        day = day or today - timedelta(days=1)
+        if day >= today:
+            raise ValueError("Only days that have already ended can be snapshotted.")
+        cutoff = _day_start(day + timedelta(days=1))
+        rows = (
+            Item.objects.using(self.db).order_by()
+            .annotate(later=Coalesce(Sum("movements__quantity_delta", filter=Q(movements__moved_at__gte=cutoff)), 0))
+            .values_list("item_id", "stock_quantity", "later")
+        )
+        written = 0
+        batch = []
+        for item_id, stock_quantity, later in rows.iterator(chunk_size=chunk_size):
+            batch.append(self.model(item_id=item_id, snapshot_date=day, stock_quantity=stock_quantity - later))
+            if len(batch) >= chunk_size:
+                written += self._write(batch)
+                batch = []
+        if batch:
+            written += self._write(batch)
+        return written
+
+    def _write(self, batch):
+        self.bulk_create(
+            batch, update_conflicts=True,
+            unique_fields=["item", "snapshot_date"], update_fields=["stock_quantity"],
+        )
+        return len(batch)
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockMovement",
+            fields=[
+                (
+                    "movement_id",
+                    models.BigAutoField(
+                        db_column="movement_id", primary_key=True, serialize=False
+                    ),
+                ),
+                ("quantity_delta", models.IntegerField(db_column="quantity_delta")),
+                (
+                    "source_type",
+                    models.CharField(
+                        choices=[
+                            ("receipt", "Receipt"),
+                            ("issue", "Issue"),
+                            ("adjustment", "Adjustment"),
+                        ],
+                        db_column="source_type",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "source_id",
+                    models.IntegerField(blank=True, db_column="source_id", null=True),
+                ),
+                ("moved_at", models.DateTimeField(db_column="moved_at")),
+                (
+                    "item",
+                    models.ForeignKey(
+                        db_column="item_id",
+                        on_delete=django.db.models.deletion.RESTRICT,
+                        related_name="movements",
+                        to="inventory.item",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "stockmovement",
+                "ordering": ["item", "moved_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["item", "moved_at"],
+                        name="stockmoveme_item_id_7dc616_idx",
+                    ),
+                    models.Index(
+                        fields=["source_type", "source_id"],
+                        name="stockmoveme_source__1f1c16_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="StockSnapshot",
+            fields=[
+                (
+                    "snapshot_id",
+                    models.BigAutoField(
+                        db_column="snapshot_id", primary_key=True, serialize=False
+                    ),
+                ),
+                ("snapshot_date", models.DateField(db_column="snapshot_date")),
+                ("stock_quantity", models.IntegerField(db_column="stock_quantity")),
+                (
+                    "item",
+                    models.ForeignKey(
+                        db_column="item_id",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="snapshots",
+                        to="inventory.item",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "stocksnapshot",
+                "ordering": ["item", "-snapshot_date"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("item", "snapshot_date"),
+                        name="unique_item_snapshot_date",
+                    )
+                ],
+            },
+        ),
+    ]
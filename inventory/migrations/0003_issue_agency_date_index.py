@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0002_stock_ledger"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="issue",
+            index=models.Index(
+                fields=["agency_id", "issue_date"], name="issue_agency__4e8065_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from agency_management.partitioning import convert_to_partitioned
+
+
+def partition_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table in ("issue", "receipt"):
+        convert_to_partitioned(table, using=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0003_issue_agency_date_index"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="issuedetail",
+            name="issue",
+            field=models.ForeignKey(
+                db_column="issue_id",
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="details",
+                to="inventory.issue",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="receiptdetail",
+            name="receipt",
+            field=models.ForeignKey(
+                db_column="receipt_id",
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="details",
+                to="inventory.receipt",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="issue",
+            index=models.Index(fields=["issue_date"], name="issue_issue_d_e937b7_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="receipt",
+            index=models.Index(
+                fields=["receipt_date"], name="receipt_receipt_d8f478_idx"
+            ),
+        ),
+        migrations.RunPython(partition_tables, migrations.RunPython.noop),
+    ]
@@ -7,7 +7,7 @@
 # Feel free to rename the models, but don't rename db_table values or field names.
 from django.db import models
 from django.core.validators import MinValueValidator
-from .managers import ItemQuerySet
+from .managers import ItemQuerySet, ReceiptManager, IssueManager, StockMovementManager, StockSnapshotManager
 
 
 class Unit(models.Model):
@@ -56,26 +56,51 @@ class Receipt(models.Model):
     total_amount = models.DecimalField(max_digits=18, decimal_places=2, db_column="total_amount")
     created_at = models.DateTimeField(null=True, blank=True, db_column="created_at")
 
+    objects = ReceiptManager()
+
     class Meta:
         db_table = "receipt"
         ordering = ["-receipt_date"]
         indexes = [
             models.Index(fields=["user_id"]),
             models.Index(fields=["agency_id"]),
+            models.Index(fields=["receipt_date"]),
         ]
 
     def __str__(self):
         return f"Receipt #{self.receipt_id}"
 
 
-class Receiptdetail(models.Model):
+class LineTotalTracker:
+    """Remembers the loaded line so signals can post its total and stock deltas."""
+    parent_attname = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_loaded_total()
+        return instance
+
+    def remember_loaded_total(self):
+        self._loaded_line_total = self.__dict__.get("line_total")
+        self._loaded_parent_id = self.__dict__.get(self.parent_attname)
+        self._loaded_item_id = self.__dict__.get("item_id")
+        self._loaded_quantity = self.__dict__.get("quantity")
+
+
+class Receiptdetail(LineTotalTracker, models.Model):
     receipt_detail_id = models.AutoField(primary_key=True, db_column="receipt_detail_id")
-    receipt = models.ForeignKey(Receipt, on_delete=models.CASCADE, db_column="receipt_id", related_name="details")
+    # No database-level constraint: receipt is range-partitioned by receipt_date (see agency_management.partitioning).
+    receipt = models.ForeignKey(
+        Receipt, on_delete=models.CASCADE, db_column="receipt_id", related_name="details", db_constraint=False
+    )
     item = models.ForeignKey(Item, on_delete=models.RESTRICT, db_column="item_id", related_name="receipt_details")
     quantity = models.PositiveIntegerField(db_column="quantity", validators=[MinValueValidator(1)])
     unit_price = models.DecimalField(max_digits=15, decimal_places=2, db_column="unit_price", validators=[MinValueValidator(0.01)])
     line_total = models.DecimalField(max_digits=18, decimal_places=2, db_column="line_total", validators=[MinValueValidator(0.01)])
 
+    parent_attname = "receipt_id"
+
     class Meta:
         db_table = "receiptdetail"
         unique_together = ("receipt", "item")
@@ -97,26 +122,50 @@ class Issue(models.Model):
     total_amount = models.DecimalField(max_digits=18, decimal_places=2, db_column="total_amount")
     created_at = models.DateTimeField(null=True, blank=True, db_column="created_at")
 
+    objects = IssueManager()
+
     class Meta:
         db_table = "issue"
         ordering = ["-issue_date"]
         indexes = [
             models.Index(fields=["agency_id"]),
             models.Index(fields=["user_id"]),
+            models.Index(fields=["agency_id", "issue_date"]),
+            models.Index(fields=["issue_date"]),
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_loaded_sales()
+        return instance
+
+    def remember_loaded_sales(self):
+        # Used by the sales rollup signals to post what a save changed.
+        self._loaded_sales = self.sales_state()
+
+    def sales_state(self):
+        if "issue_date" not in self.__dict__ or "total_amount" not in self.__dict__:
+            return None
+        return (self.issue_date, self.total_amount)
+
     def __str__(self):
         return f"Issue #{self.issue_id}"
 
 
-class Issuedetail(models.Model):
+class Issuedetail(LineTotalTracker, models.Model):
     issue_detail_id = models.AutoField(primary_key=True, db_column="issue_detail_id")
-    issue = models.ForeignKey(Issue, on_delete=models.CASCADE, db_column="issue_id", related_name="details")
+    # No database-level constraint: issue is range-partitioned by issue_date (see agency_management.partitioning).
+    issue = models.ForeignKey(
+        Issue, on_delete=models.CASCADE, db_column="issue_id", related_name="details", db_constraint=False
+    )
     item = models.ForeignKey(Item, on_delete=models.RESTRICT, db_column="item_id", related_name="issue_details")
     quantity = models.PositiveIntegerField(db_column="quantity", validators=[MinValueValidator(1)])
     unit_price = models.DecimalField(max_digits=15, decimal_places=2, db_column="unit_price", validators=[MinValueValidator(0.01)])
     line_total = models.DecimalField(max_digits=18, decimal_places=2, db_column="line_total", validators=[MinValueValidator(0.01)])
 
+    parent_attname = "issue_id"
+
     class Meta:
         db_table = "issuedetail"
         unique_together = ("issue", "item")
@@ -129,3 +178,53 @@ class Issuedetail(models.Model):
     def __str__(self):
         return f"IssueDetail #{self.issue_detail_id}"
 
+
+
+class StockMovement(models.Model):
+    RECEIPT = 'receipt'
+    ISSUE = 'issue'
+    ADJUSTMENT = 'adjustment'
+    SOURCE_TYPE_CHOICES = [
+        (RECEIPT, 'Receipt'),
+        (ISSUE, 'Issue'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+
+    movement_id = models.BigAutoField(primary_key=True, db_column="movement_id")
+    item = models.ForeignKey(Item, on_delete=models.RESTRICT, db_column="item_id", related_name="movements")
+    quantity_delta = models.IntegerField(db_column="quantity_delta")
+    source_type = models.CharField(max_length=20, choices=SOURCE_TYPE_CHOICES, db_column="source_type")
+    source_id = models.IntegerField(null=True, blank=True, db_column="source_id")
+    moved_at = models.DateTimeField(db_column="moved_at")
+
+    objects = StockMovementManager()
+
+    class Meta:
+        db_table = "stockmovement"
+        ordering = ["item", "moved_at"]
+        indexes = [
+            models.Index(fields=["item", "moved_at"]),
+            models.Index(fields=["source_type", "source_id"]),
+        ]
+
+    def __str__(self):
+        return f"StockMovement #{self.movement_id} - Item {self.item_id} ({self.quantity_delta:+d})"
+
+
+class StockSnapshot(models.Model):
+    snapshot_id = models.BigAutoField(primary_key=True, db_column="snapshot_id")
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, db_column="item_id", related_name="snapshots")
+    snapshot_date = models.DateField(db_column="snapshot_date")
+    stock_quantity = models.IntegerField(db_column="stock_quantity")
+
+    objects = StockSnapshotManager()
+
+    class Meta:
+        db_table = "stocksnapshot"
+        ordering = ["item", "-snapshot_date"]
+        constraints = [
+            models.UniqueConstraint(fields=["item", "snapshot_date"], name="unique_item_snapshot_date")
+        ]
+
+    def __str__(self):
+        return f"Item {self.item_id} @ {self.snapshot_date}: {self.stock_quantity}"
@@ -1,44 +1,111 @@
 # signals.py
+from collections import defaultdict
+
+from django.apps import apps
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.core.exceptions import ValidationError
 from django.db import transaction
-from .models import Item, Issuedetail, Receiptdetail, Receipt, Issue
-
-@receiver(post_save, sender=Issuedetail)
-def decrease_stock_on_issue(sender, instance, created, **kwargs):
-    if created:
-        with transaction.atomic():
-            item = Item.objects.select_for_update().get(pk=instance.item_id)
-            if item.stock_quantity < instance.quantity:
-                raise ValidationError("Không đủ hàng trong kho để xuất.")
-            item.stock_quantity -= instance.quantity
-            item.save(update_fields=["stock_quantity"])
-
-@receiver(post_save, sender=Receiptdetail)
-def increase_stock_on_receipt(sender, instance, created, **kwargs):
-    if created:
-        with transaction.atomic():
-            item = Item.objects.select_for_update().get(pk=instance.item_id)
-            item.stock_quantity += instance.quantity
-            item.save(update_fields=["stock_quantity"])
+from django.db.models import F
+from .models import Issuedetail, Receiptdetail, Receipt, Issue, StockMovement
+from .locks import lock_items
+from finance.models import SalesRollup
 
 def update_receipt_total(receipt_id):
-    receipt = Receipt.objects.get(pk=receipt_id)
-    total = receipt.details.aggregate(models.Sum('line_total'))['line_total__sum'] or 0
-    receipt.total_amount = total
-    receipt.save(update_fields=["total_amount"])
+    Receipt.objects.filter(pk=receipt_id).update(total_amount=Receipt.objects.computed_total())
 
 def update_issue_total(issue_id):
-    issue = Issue.objects.get(pk=issue_id)
-    total = issue.details.aggregate(models.Sum('line_total'))['line_total__sum'] or 0
-    issue.total_amount = total
-    issue.save(update_fields=["total_amount"])
+    Issue.objects.filter(pk=issue_id).update(total_amount=Issue.objects.computed_total())
+
+def _post_issue_delta(issue_id, delta):
+    # A line change moves the issue's sales and its agency's debt like the header total.
+    row = Issue.objects.filter(pk=issue_id).values_list("issue_date", "agency_id").first()
+    if row is not None:
+        issue_date, agency_id = row
+        SalesRollup.objects.record([(issue_date, delta, 0)])
+        apps.get_model("agency", "Agency").objects.post_debt(agency_id, delta)
+
+def _apply_stock_delta(instance, created, deleted, stock_sign, source_type):
+    # Move the stock by the quantity change of the line and record it in the ledger.
+    deltas = defaultdict(int)
+    if not created:
+        old_item_id = getattr(instance, "_loaded_item_id", None)
+        old_quantity = getattr(instance, "_loaded_quantity", None)
+        if old_item_id is None or old_quantity is None:
+            # The previous line is unknown (deferred or never loaded), so there is no delta to post.
+            return
+        deltas[old_item_id] -= old_quantity * stock_sign
+    if not deleted:
+        deltas[instance.item_id] += instance.quantity * stock_sign
+    deltas = {item_id: delta for item_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    with transaction.atomic():
+        items = lock_items(deltas)
+        if any(items[item_id].stock_quantity + delta < 0 for item_id, delta in deltas.items()):
+            raise ValidationError("Không đủ hàng trong kho để xuất.")
+        for item_id, delta in deltas.items():
+            items[item_id].stock_quantity += delta
+            items[item_id].save(update_fields=["stock_quantity"])
+        StockMovement.objects.record(source_type, getattr(instance, instance.parent_attname), deltas)
+
+def _apply_line_delta(document_model, instance, created, deleted, rebuild, on_delta=None):
+    # Post the line_total change to the header with an F() update instead of re-aggregating.
+    parent_id = getattr(instance, instance.parent_attname)
+    old_total = getattr(instance, "_loaded_line_total", None)
+    old_parent_id = getattr(instance, "_loaded_parent_id", None) or parent_id
+    deltas = {}
+    if created:
+        deltas[parent_id] = instance.line_total
+    elif old_total is None:
+        # The previous line_total is unknown (deferred or never loaded): rebuild instead.
+        for document_id in {old_parent_id, parent_id}:
+            totals = document_model.objects.filter(pk=document_id).values_list("total_amount", flat=True)
+            before = totals.first()
+            rebuild(document_id)
+            if on_delta is not None and before is not None:
+                on_delta(document_id, totals.first() - before)
+    elif deleted:
+        deltas[old_parent_id] = -old_total
+    else:
+        deltas[old_parent_id] = -old_total
+        deltas[parent_id] = deltas.get(parent_id, 0) + instance.line_total
+    for document_id, delta in deltas.items():
+        if delta:
+            document_model.objects.filter(pk=document_id).update(total_amount=F("total_amount") + delta)
+            if on_delta is not None:
+                on_delta(document_id, delta)
+    if not deleted:
+        instance.remember_loaded_total()
 
 @receiver([post_save, post_delete], sender=Receiptdetail)
 def recalc_receipt_total(sender, instance, **kwargs):
-    update_receipt_total(instance.receipt_id)
+    deleted = kwargs.get("signal") is post_delete
+    _apply_stock_delta(instance, kwargs.get("created", False), deleted, 1, StockMovement.RECEIPT)
+    _apply_line_delta(Receipt, instance, kwargs.get("created", False), deleted, update_receipt_total)
 
 @receiver([post_save, post_delete], sender=Issuedetail)
 def recalc_issue_total(sender, instance, **kwargs):
-    update_issue_total(instance.issue_id)
\ No newline at end of file
+    deleted = kwargs.get("signal") is post_delete
+    _apply_stock_delta(instance, kwargs.get("created", False), deleted, -1, StockMovement.ISSUE)
+    _apply_line_delta(Issue, instance, kwargs.get("created", False), deleted, update_issue_total, _post_issue_delta)
+
+@receiver(post_save, sender=Issue)
+def update_sales_rollup_on_issue_save(sender, instance, created, **kwargs):
+    new_state = instance.sales_state()
+    old_state = None if created else getattr(instance, "_loaded_sales", None)
+    if created and new_state is not None:
+        SalesRollup.objects.record([(new_state[0], new_state[1], 1)])
+    elif old_state is not None and new_state is not None and old_state != new_state:
+        SalesRollup.objects.record([
+            (old_state[0], -old_state[1], -1),
+            (new_state[0], new_state[1], 1),
+        ])
+    instance.remember_loaded_sales()
+
+@receiver(post_delete, sender=Issue)
+def update_sales_rollup_on_issue_delete(sender, instance, **kwargs):
+    # The deleted details have already taken their line totals back out of the rollup.
+    if "issue_date" in instance.__dict__:
+        SalesRollup.objects.record([(instance.issue_date, 0, -1)])
+
@@ -1,3 +1,219 @@
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.db import OperationalError, connection, transaction
+from django.db.models.query import QuerySet
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from agency.models import Agency, AgencyType, District
+from .locks import lock_items, lock_stats
+from .models import Issue, Issuedetail, Item, Receipt, StockMovement, StockSnapshot, Unit
+
+
+def create_agency():
+    agency_type = AgencyType.objects.create(type_name="Loại 1", max_debt=Decimal("100000"))
+    district = District.objects.create(district_name="Quận 1", max_agencies=10)
+    return Agency.objects.create(
+        agency_name="Đại lý A", agency_type=agency_type, district=district, phone_number="0900000000",
+        address="1 Lê Lợi", reception_date=date(2025, 1, 1), debt_amount=0,
+    )
+
+
+class DocumentPostingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.agency = create_agency()
+        unit = Unit.objects.create(unit_name="Thùng")
+        cls.item = Item.objects.create(item_name="Nước", unit=unit, price=Decimal("10.00"), stock_quantity=100)
+
+    def test_post_issue_updates_stock_total_debt_and_ledger(self):
+        issue = Issue.objects.post_issue(self.agency.pk, 1, [{"item_id": self.item.pk, "quantity": 3}])
+
+        self.assertEqual(issue.total_amount, Decimal("30.00"))
+        self.assertEqual(Item.objects.get(pk=self.item.pk).stock_quantity, 97)
+        self.assertEqual(Agency.objects.get(pk=self.agency.pk).debt_amount, Decimal("30.00"))
+        movement = StockMovement.objects.get(source_type=StockMovement.ISSUE, source_id=issue.pk)
+        self.assertEqual(movement.quantity_delta, -3)
+
+    def test_post_receipt_uses_given_unit_price(self):
+        receipt = Receipt.objects.post_receipt(
+            self.agency.pk, 1, [{"item_id": self.item.pk, "quantity": 5, "unit_price": "7.50"}]
+        )
+
+        self.assertEqual(receipt.total_amount, Decimal("37.50"))
+        self.assertEqual(Item.objects.get(pk=self.item.pk).stock_quantity, 105)
+        self.assertEqual(Agency.objects.get(pk=self.agency.pk).debt_amount, 0)
+
+    def test_rejects_invalid_unit_prices(self):
+        for unit_price in ("abc", "0", "-5", "NaN", "1.005"):
+            with self.subTest(unit_price=unit_price), self.assertRaises(ValidationError):
+                Issue.objects.post_issue(
+                    self.agency.pk, 1, [{"item_id": self.item.pk, "quantity": 1, "unit_price": unit_price}]
+                )
+        self.assertFalse(Issue.objects.exists())
+        self.assertEqual(Agency.objects.get(pk=self.agency.pk).debt_amount, 0)
+
+    def test_rejects_non_numeric_lines(self):
+        with self.assertRaises(ValidationError):
+            Issue.objects.post_issue(self.agency.pk, 1, [{"item_id": "x", "quantity": 1}])
+
+    def test_rejects_issue_beyond_stock(self):
+        with self.assertRaises(ValidationError):
+            Issue.objects.post_issue(self.agency.pk, 1, [{"item_id": self.item.pk, "quantity": 101}])
+        self.assertEqual(Item.objects.get(pk=self.item.pk).stock_quantity, 100)
+        self.assertFalse(Issuedetail.objects.exists())
+
+
+class DetailSignalTests(TestCase):
+    """Details saved one by one (admin, shell) go through the inventory signals."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agency = create_agency()
+        unit = Unit.objects.create(unit_name="Thùng")
+        cls.item = Item.objects.create(item_name="Nước", unit=unit, price=Decimal("10.00"), stock_quantity=100)
+
+    def setUp(self):
+        self.issue = Issue.objects.create(issue_date=date(2025, 3, 1), agency_id=self.agency.pk, user_id=1, total_amount=0)
+
+    def test_new_detail_posts_header_total_stock_and_ledger(self):
+        Issuedetail.objects.create(
+            issue=self.issue, item=self.item, quantity=4, unit_price=Decimal("10.00"), line_total=Decimal("40.00")
+        )
+
+        self.assertEqual(Issue.objects.get(pk=self.issue.pk).total_amount, Decimal("40.00"))
+        self.assertEqual(Item.objects.get(pk=self.item.pk).stock_quantity, 96)
+        movement = StockMovement.objects.get(source_type=StockMovement.ISSUE, source_id=self.issue.pk)
+        self.assertEqual(movement.quantity_delta, -4)
+
+    def test_edited_and_deleted_details_post_their_delta(self):
+        Issuedetail.objects.create(
+            issue=self.issue, item=self.item, quantity=4, unit_price=Decimal("10.00"), line_total=Decimal("40.00")
+        )
+        detail = Issuedetail.objects.get(issue=self.issue)
+        detail.unit_price, detail.line_total = Decimal("12.50"), Decimal("50.00")
+        detail.save()
+        self.assertEqual(Issue.objects.get(pk=self.issue.pk).total_amount, Decimal("50.00"))
+
+        detail.delete()
+        self.assertEqual(Issue.objects.get(pk=self.issue.pk).total_amount, 0)
+        self.assertFalse(Issue.objects.drifted().exists())
+
+
+class StockLedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.agency = create_agency()
+        unit = Unit.objects.create(unit_name="Thùng")
+        cls.item = Item.objects.create(item_name="Nước", unit=unit, price=Decimal("10.00"), stock_quantity=100)
+        cls.other = Item.objects.create(item_name="Bánh", unit=unit, price=Decimal("5.00"), stock_quantity=50)
+
+    def assertLedgerMatchesStock(self):
+        for item in Item.objects.all():
+            self.assertEqual(StockMovement.objects.stock_as_of(item.pk, timezone.now()), item.stock_quantity)
+
+    def test_detail_edits_are_recorded_in_the_ledger(self):
+        StockSnapshot.objects.create(item=self.item, snapshot_date=date(2025, 1, 1), stock_quantity=100)
+        StockSnapshot.objects.create(item=self.other, snapshot_date=date(2025, 1, 1), stock_quantity=50)
+        issue = Issue.objects.create(issue_date=date(2025, 3, 1), agency_id=self.agency.pk, user_id=1, total_amount=0)
+        Issuedetail.objects.create(
+            issue=issue, item=self.item, quantity=4, unit_price=Decimal("10.00"), line_total=Decimal("40.00")
+        )
+        detail = Issuedetail.objects.get(issue=issue)
+
+        detail.quantity, detail.line_total = 6, Decimal("60.00")
+        detail.save()
+        self.assertEqual(Item.objects.get(pk=self.item.pk).stock_quantity, 94)
+        self.assertLedgerMatchesStock()
+
+        detail.item, detail.quantity, detail.line_total = self.other, 2, Decimal("10.00")
+        detail.save()
+        self.assertEqual(Item.objects.get(pk=self.item.pk).stock_quantity, 100)
+        self.assertEqual(Item.objects.get(pk=self.other.pk).stock_quantity, 48)
+        self.assertLedgerMatchesStock()
+
+        detail.delete()
+        self.assertEqual(Item.objects.get(pk=self.other.pk).stock_quantity, 50)
+        self.assertLedgerMatchesStock()
+
+    def test_edit_beyond_stock_is_rejected(self):
+        issue = Issue.objects.create(issue_date=date(2025, 3, 1), agency_id=self.agency.pk, user_id=1, total_amount=0)
+        Issuedetail.objects.create(
+            issue=issue, item=self.item, quantity=4, unit_price=Decimal("10.00"), line_total=Decimal("40.00")
+        )
+        detail = Issuedetail.objects.get(issue=issue)
+        detail.quantity = 200
+        with self.assertRaises(ValidationError):
+            detail.save()
+
+
+class LockItemsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        unit = Unit.objects.create(unit_name="Thùng")
+        cls.items = [
+            Item.objects.create(item_name=f"Hàng {i}", unit=unit, price=Decimal("10.00"), stock_quantity=10)
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        lock_stats.reset()
+        self.addCleanup(lock_stats.reset)
+
+    def busy(self, failures):
+        """Patch the lock query to fail `failures` times as a NOWAIT lock on a busy row does."""
+        fetch_all = QuerySet._fetch_all
+        remaining = [failures]
+
+        def fetch(queryset):
+            if queryset._for_write and remaining[0]:
+                remaining[0] -= 1
+                raise OperationalError("could not obtain lock on row")
+            return fetch_all(queryset)
+
+        return mock.patch.object(QuerySet, "_fetch_all", autospec=True, side_effect=fetch)
+
+    def test_locks_each_item_once_in_id_order(self):
+        first, second, third = self.items
+        with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+            items = lock_items([third.pk, first.pk, third.pk])
+
+        self.assertEqual(list(items), [first.pk, third.pk])
+        lock_query = next(query["sql"] for query in queries if "ORDER BY" in query["sql"])
+        self.assertIn(f"IN ({first.pk}, {third.pk})", lock_query)
+        self.assertEqual(lock_stats.snapshot()["acquired"], 1)
+
+    def test_busy_rows_are_retried_with_backoff(self):
+        first, second, _ = self.items
+        with self.busy(2), mock.patch("inventory.locks.time.sleep") as sleep, \
+                mock.patch("inventory.locks.random.random", return_value=0.5), transaction.atomic():
+            items = lock_items([second.pk, first.pk], nowait=True, retries=3, retry_delay=0.1)
+
+        self.assertEqual(list(items), [first.pk, second.pk])
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.1, 0.2])
+        stats = lock_stats.snapshot()
+        self.assertEqual((stats["acquired"], stats["retries"], stats["failures"]), (1, 2, 0))
+        self.assertEqual(dict(stats["hot_items_by_retries"]), {first.pk: 2, second.pk: 2})
+
+    def test_gives_up_after_the_last_retry(self):
+        first = self.items[0]
+        with self.busy(5), mock.patch("inventory.locks.time.sleep") as sleep, transaction.atomic():
+            with self.assertRaises(OperationalError):
+                lock_items([first.pk], nowait=True, retries=2, retry_delay=0)
+            # The failed attempts ran in savepoints, so the transaction is still usable.
+            self.assertTrue(Item.objects.filter(pk=first.pk).exists())
+
+        self.assertEqual(sleep.call_count, 2)
+        stats = lock_stats.snapshot()
+        self.assertEqual((stats["acquired"], stats["retries"], stats["failures"]), (0, 2, 1))
 
-# Create your tests here.
+    def test_without_nowait_a_lock_error_is_not_retried(self):
+        with self.busy(1), mock.patch("inventory.locks.time.sleep") as sleep, transaction.atomic():
+            with self.assertRaises(OperationalError):
+                lock_items([self.items[0].pk], nowait=False)
+        sleep.assert_not_called()
+        self.assertEqual(lock_stats.snapshot()["failures"], 1)
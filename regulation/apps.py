@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RegulationConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "regulation"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,114 @@
+# cache.py
+import logging
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+
+from .schema import spec_for
+
+logger = logging.getLogger(__name__)
+
+
+class RegulationCache:
+    """
+    Process-wide copy of the regulation table, so reading a rule is a dict
+    lookup. Each worker keeps its own copy and checks a cheap version of the
+    table (row count and latest updated_at, which the pre_save hook bumps on
+    every save) at most every REGULATION_CACHE_POLL_INTERVAL seconds, so
+    changes made by other workers show up within that delay. Changes made
+    in this process invalidate it as soon as they commit. The copy is
+    reloaded anyway after REGULATION_CACHE_MAX_AGE seconds, for rows changed
+    without save().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states = {}
+
+    def _settings(self):
+        return (
+            getattr(settings, "REGULATION_CACHE_POLL_INTERVAL", 5),
+            getattr(settings, "REGULATION_CACHE_MAX_AGE", 300),
+        )
+
+    def _read_version(self, using):
+        Regulation = apps.get_model("regulation", "Regulation")
+        version = Regulation._default_manager.db_manager(using).get_queryset().aggregate(
+            count=Count("pk"), updated=Max("updated_at"),
+        )
+        return (version["count"], version["updated"])
+
+    def _load(self, using):
+        Regulation = apps.get_model("regulation", "Regulation")
+        rows = Regulation._default_manager.db_manager(using).get_queryset().values_list(
+            "regulation_key", "regulation_value"
+        )
+        values = {}
+        for key, raw in rows:
+            spec = spec_for(key)
+            if spec is None:
+                values[key] = raw
+                continue
+            try:
+                values[key] = spec.parse(raw)
+            except (ValidationError, ValueError, TypeError) as exc:
+                # A bad stored value must not break every reader; fall back to the declared default.
+                logger.warning("Invalid value %r for regulation %s (%s), using the default %r.",
+                               raw, key, exc, spec.default)
+                values[key] = spec.default
+        return values
+
+    def values(self, using="default"):
+        """{regulation_key: value}, parsed per the regulation schema and reloaded when the table has changed."""
+        poll_interval, max_age = self._settings()
+        now = time.monotonic()
+
+        def fresh(state):
+            return (state is not None and now - state["checked_at"] < poll_interval
+                    and now - state["loaded_at"] < max_age)
+
+        state = self._states.get(using)
+        if fresh(state):
+            return state["values"]
+        with self._lock:
+            state = self._states.get(using)
+            if fresh(state):
+                return state["values"]
+            version = self._read_version(using)
+            if state is None or state["version"] != version or now - state["loaded_at"] >= max_age:
+                state = {"values": self._load(using), "version": version, "loaded_at": now}
+            state["checked_at"] = now
+            self._states[using] = state
+            return state["values"]
+
+    def get(self, key, default=None, using="default"):
+        values = self.values(using)
+        if key in values:
+            return values[key]
+        if default is None and spec_for(key) is not None:
+            return spec_for(key).default
+        return default
+
+    def get_many(self, keys, using="default"):
+        """{key: value} for every key, missing ones falling back to their declared default."""
+        values = self.values(using)
+        result = {}
+        for key in keys:
+            spec = spec_for(key)
+            result[key] = values.get(key, spec.default if spec is not None else None)
+        return result
+
+    def invalidate(self, using=None):
+        """Drop the cached copy of `using` (all databases by default); the next read reloads it."""
+        with self._lock:
+            if using is None:
+                self._states.clear()
+            else:
+                self._states.pop(using, None)
+
+
+regulation_cache = RegulationCache()
@@ -1,14 +1,22 @@
-from django.db import models
-from django.core.exceptions import ObjectDoesNotExist
+from django.db import models, transaction
+
+from .cache import regulation_cache
+from .schema import spec_for
 
 class RegulationManager(models.Manager):
     def get(self, key, default=None):
-        try:
-            return super().get_queryset().get(regulation_key=key).regulation_value
-        except ObjectDoesNotExist:
-            return default
+        """The value of `key`, read from the process-wide regulation cache."""
+        return regulation_cache.get(key, default, using=self.db)
+
+    def get_many(self, keys):
+        """{key: value} for several keys from one read of the regulation cache."""
+        return regulation_cache.get_many(keys, using=self.db)
 
     def set(self, key, value, user=None):
+        spec = spec_for(key)
+        if spec is not None:
+            value = spec.format(value)
+            spec.parse(value)
         obj, created = self.update_or_create(
             regulation_key=key,
             defaults={
@@ -17,4 +25,7 @@ class RegulationManager(models.Manager):
                 'updated_at': None,  # Will be set by signal
             }
         )
-        return obj
\ No newline at end of file
+        # The post_save signal invalidates too; this covers callers running without signals.
+        using = self.db
+        transaction.on_commit(lambda: regulation_cache.invalidate(using), using=using)
+        return obj
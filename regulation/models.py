@@ -9,6 +9,7 @@ from django.db import models
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from .managers import RegulationManager
+from .schema import spec_for
 
 import re
 
@@ -33,6 +34,9 @@ class Regulation(models.Model):
             raise ValidationError({'regulation_key': 'Key must not contain special characters.'})
         if not self.regulation_value or not self.regulation_value.strip():
             raise ValidationError({'regulation_value': 'Value must not be empty.'})
+        spec = spec_for(self.regulation_key)
+        if spec is not None:
+            spec.parse(self.regulation_value)
 
     def __str__(self):
         return f"{self.regulation_key}: {self.regulation_value}"
\ No newline at end of file
@@ -0,0 +1,80 @@
+# schema.py
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+
+TRUE_VALUES = {"1", "true", "yes", "on"}
+FALSE_VALUES = {"0", "false", "no", "off"}
+
+
+def _parse_bool(raw):
+    value = raw.lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(raw)
+
+
+PARSERS = {
+    str: str,
+    int: int,
+    Decimal: Decimal,
+    bool: _parse_bool,
+    date: date.fromisoformat,
+}
+
+
+class RegulationSpec:
+    """Declared type, default and validators of one regulation key."""
+
+    def __init__(self, key, type=str, default=None, validators=(), description=""):
+        if type not in PARSERS:
+            raise ValueError(f"Unsupported regulation type: {type!r}")
+        self.key = key
+        self.type = type
+        self.default = default
+        self.validators = list(validators)
+        self.description = description
+
+    def parse(self, raw):
+        """The typed value of a stored string; raises ValidationError if it does not parse or validate."""
+        try:
+            value = PARSERS[self.type](raw.strip())
+        except (ValueError, InvalidOperation):
+            raise ValidationError(
+                {"regulation_value": f"{self.key} must be a valid {self.type.__name__}, got {raw!r}."}
+            )
+        for validator in self.validators:
+            validator(value)
+        return value
+
+    def format(self, value):
+        """The string stored for a typed value."""
+        if self.type is bool and isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, date):
+            return value.isoformat()
+        return str(value)
+
+
+_registry = {}
+
+
+def register(key, type=str, default=None, validators=(), description=""):
+    """Declare a regulation key. Values of undeclared keys are returned as plain strings."""
+    spec = RegulationSpec(key, type, default, validators, description)
+    _registry[key] = spec
+    # Values already cached were parsed without this declaration.
+    from .cache import regulation_cache
+    regulation_cache.invalidate()
+    return spec
+
+
+def spec_for(key):
+    return _registry.get(key)
+
+
+def registered():
+    return dict(_registry)
@@ -1,9 +1,17 @@
-from django.db.models.signals import pre_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
+from .cache import regulation_cache
 from .models import Regulation
 
 @receiver(pre_save, sender=Regulation)
 def update_regulation_timestamp(sender, instance, **kwargs):
     instance.updated_at = timezone.now()
-    # Optional: Add logging here if needed
\ No newline at end of file
+    # Optional: Add logging here if needed
+
+
+@receiver([post_save, post_delete], sender=Regulation)
+def invalidate_regulation_cache(sender, instance, using, **kwargs):
+    # Other workers notice the new updated_at / row count on their next version poll.
+    transaction.on_commit(lambda: regulation_cache.invalidate(using), using=using)
@@ -1,3 +1,96 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.validators import MinValueValidator
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import schema
+from .cache import regulation_cache
+from .models import Regulation
+
+
+class RegulationCacheTests(TestCase):
+    def setUp(self):
+        # Saves invalidate the cache on commit, which never comes inside a TestCase.
+        regulation_cache.invalidate()
+        self.addCleanup(regulation_cache.invalidate)
+        patcher = mock.patch.dict(schema._registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        schema.register("max_agencies_per_district", int, 4, [MinValueValidator(1)])
+        schema.register("max_items", int, 5, [MinValueValidator(1)])
+        schema.register("max_units", int, 3, [MinValueValidator(1)])
+        schema.register("issue_price_ratio", Decimal, Decimal("1.02"), [MinValueValidator(Decimal(0))])
+        schema.register("payment_limited_to_debt", bool, True)
+
+    def store(self, key, value):
+        Regulation.objects.update_or_create(regulation_key=key, defaults={"regulation_value": value})
+        regulation_cache.invalidate()
+
+    def test_declared_keys_are_typed_and_default_when_missing(self):
+        self.store("max_agencies_per_district", " 6 ")
+        self.store("payment_limited_to_debt", "no")
+        self.assertEqual(
+            Regulation.objects.get_many(["max_agencies_per_district", "payment_limited_to_debt", "issue_price_ratio"]),
+            {"max_agencies_per_district": 6, "payment_limited_to_debt": False, "issue_price_ratio": Decimal("1.02")},
+        )
+
+    def test_invalid_stored_value_falls_back_to_the_default(self):
+        self.store("max_items", "0")
+        self.store("max_units", "ba")
+        with self.assertLogs("regulation.cache", "WARNING") as logs:
+            self.assertEqual(Regulation.objects.get_many(["max_items", "max_units"]), {"max_items": 5, "max_units": 3})
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn("max_units", logs.output[1])
+
+    def test_validator_errors_of_any_kind_fall_back_to_the_default(self):
+        def broken(value):
+            raise TypeError("not comparable")
+
+        schema.register("opening_hours", int, 8, [broken])
+        self.store("opening_hours", "9")
+        with self.assertLogs("regulation.cache", "WARNING"):
+            self.assertEqual(Regulation.objects.get("opening_hours"), 8)
+
+    def test_undeclared_keys_are_plain_strings(self):
+        self.store("opening_hours", "8")
+        self.assertEqual(Regulation.objects.get("opening_hours"), "8")
+        self.assertEqual(Regulation.objects.get_many(["opening_hours", "closing_hours"]),
+                         {"opening_hours": "8", "closing_hours": None})
+
+
+@override_settings(REGULATION_CACHE_POLL_INTERVAL=5, REGULATION_CACHE_MAX_AGE=60)
+class RegulationCachePollTests(TestCase):
+    def setUp(self):
+        regulation_cache.invalidate()
+        self.addCleanup(regulation_cache.invalidate)
+        Regulation.objects.create(regulation_key="opening_hours", regulation_value="8")
+        patcher = mock.patch("regulation.cache.time.monotonic", return_value=1000)
+        self.clock = patcher.start()
+        self.addCleanup(patcher.stop)
+        # Load the copy; from here on the rows are changed the way another worker would, unseen by this process.
+        self.assertEqual(Regulation.objects.get("opening_hours"), "8")
+
+    def read_at(self, now, key="opening_hours"):
+        self.clock.return_value = now
+        return Regulation.objects.get(key)
+
+    def test_a_newer_updated_at_is_picked_up_at_the_next_poll(self):
+        Regulation.objects.filter(pk="opening_hours").update(
+            regulation_value="9", updated_at=timezone.now() + timedelta(seconds=1),
+        )
+        self.assertEqual(self.read_at(1004), "8")
+        self.assertEqual(self.read_at(1005), "9")
+
+    def test_a_changed_row_count_is_picked_up_at_the_next_poll(self):
+        Regulation.objects.bulk_create([Regulation(regulation_key="closing_hours", regulation_value="17")])
+        self.assertIsNone(self.read_at(1004, "closing_hours"))
+        self.assertEqual(self.read_at(1005, "closing_hours"), "17")
+
+    def test_rows_changed_without_a_new_version_are_reloaded_at_the_max_age(self):
+        Regulation.objects.filter(pk="opening_hours").update(regulation_value="9")
+        self.assertEqual(self.read_at(1030), "8")
+        self.assertEqual(self.read_at(1059), "8")
+        self.assertEqual(self.read_at(1060), "9")